@@ -0,0 +1,382 @@
+"""
+Archivo frío del historial
+Las filas de historial más antiguas que ARCHIVO_MESES_CALIENTES se mueven de las tablas
+a archivos Parquet comprimidos con zstd en disco (en PostgreSQL también las particiones
+que se archivan con `particiones.py archivar`). Un índice JSON registra el rango de
+fechas de cada archivo para leer solo los que se cruzan con la consulta:
+
+    <ARCHIVO_DIRECTORIO>/indice.json
+    <ARCHIVO_DIRECTORIO>/<tabla>/<tabla>_<desde>_<hasta>.parquet
+
+Las filas se escriben por lotes en un archivo `.pendiente` que recién se publica (se
+renombra y se agrega al índice) después del commit que las borra de la tabla.
+
+    python archivo_historial.py archivar [--meses 12]
+    python archivo_historial.py consultar registros_salidas [--desde 2023-01-01] [--filtro motivo_salida=Venta]
+
+pyarrow se importa recién al escribir o leer un archivo Parquet: la mayoría de los workers
+nunca lo necesita y es de las importaciones más lentas del arranque.
+"""
+import argparse
+import json
+import os
+import threading
+from datetime import date, datetime
+from typing import Dict, List, Optional
+from sqlalchemy import select, delete, func, Integer, Float, DateTime
+from sqlalchemy.orm import Session
+
+from models import HistorialDescuentoMateriaPrima, RegistroSalida, MovimientoMateriaPrima, MovimientoProducto
+
+MESES_CALIENTES = int(os.getenv("ARCHIVO_MESES_CALIENTES", "12"))
+DIRECTORIO = os.getenv("ARCHIVO_DIRECTORIO", "archivo_historial")
+INTERVALO_ARCHIVO = int(os.getenv("ARCHIVO_INTERVALO_SEGUNDOS", "86400"))
+FILAS_POR_LOTE = 50000
+PENDIENTE = ".pendiente"
+
+# Tabla -> (modelo, columna de fecha)
+TABLAS = {
+    "historial_descuentos_materias_primas": (HistorialDescuentoMateriaPrima, "fecha_descuento"),
+    "registros_salidas": (RegistroSalida, "created_at"),
+    "movimientos_materia_prima": (MovimientoMateriaPrima, "created_at"),
+    "movimientos_productos": (MovimientoProducto, "created_at"),
+}
+# Las que la tarea periódica archiva por antigüedad; las de movimientos llegan al archivo
+# solo al archivar sus particiones
+TABLAS_VENTANA = ("historial_descuentos_materias_primas", "registros_salidas")
+
+_candado_indice = threading.Lock()
+
+def _ruta_indice() -> str:
+    return os.path.join(DIRECTORIO, "indice.json")
+
+def leer_indice() -> Dict[str, List[Dict]]:
+    try:
+        with open(_ruta_indice(), encoding="utf-8") as archivo:
+            return json.load(archivo)
+    except FileNotFoundError:
+        return {}
+
+def _escribir_indice(indice: Dict[str, List[Dict]]):
+    os.makedirs(DIRECTORIO, exist_ok=True)
+    temporal = _ruta_indice() + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as archivo:
+        json.dump(indice, archivo, indent=2)
+    os.replace(temporal, _ruta_indice())
+
+def _esquema(modelo) -> "pa.Schema":
+    """Esquema Arrow a partir de las columnas del modelo"""
+    import pyarrow as pa
+
+    campos = []
+    for columna in modelo.__table__.columns:
+        if isinstance(columna.type, Integer):
+            tipo = pa.int64()
+        elif isinstance(columna.type, Float):
+            tipo = pa.float64()
+        elif isinstance(columna.type, DateTime):
+            tipo = pa.timestamp("us")
+        else:
+            tipo = pa.string()
+        campos.append(pa.field(columna.name, tipo))
+    return pa.schema(campos)
+
+def _valor(valor):
+    # Los Enum (p. ej. motivo_salida) se guardan por su valor
+    return getattr(valor, "value", valor)
+
+def fecha_corte(meses: int = MESES_CALIENTES, hoy: Optional[date] = None) -> datetime:
+    """Primer día del mes que queda `meses` meses atrás: lo anterior se archiva"""
+    hoy = hoy or date.today()
+    total = hoy.year * 12 + hoy.month - 1 - meses
+    return datetime(total // 12, total % 12 + 1, 1)
+
+def _ruta_archivo(tabla: str, desde: datetime, hasta: datetime) -> str:
+    return os.path.join(DIRECTORIO, tabla, f"{tabla}_{desde:%Y%m%d%H%M%S}_{hasta:%Y%m%d%H%M%S}.parquet")
+
+def exportar(resultado, tabla: str) -> Optional[str]:
+    """
+    Escribir por lotes de FILAS_POR_LOTE las filas de `resultado` (consulta con yield_per,
+    columnas de la tabla) en un archivo Parquet pendiente, sin tener todas en memoria.
+    Retorna la ruta del archivo pendiente (None si no hubo filas); se publica con `publicar`
+    después del commit que las quita de la base de datos.
+    """
+    modelo, columna_fecha = TABLAS[tabla]
+    escritor = None
+    desde = hasta = None
+    carpeta = os.path.join(DIRECTORIO, tabla)
+    temporal = os.path.join(carpeta, f"escribiendo_{os.getpid()}.tmp")
+    try:
+        for lote in resultado.partitions(FILAS_POR_LOTE):
+            if escritor is None:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                esquema = _esquema(modelo)
+                os.makedirs(carpeta, exist_ok=True)
+                escritor = pq.ParquetWriter(temporal, esquema, compression="zstd")
+            columnas = {nombre: [_valor(f._mapping[nombre]) for f in lote] for nombre in esquema.names}
+            escritor.write_table(pa.Table.from_pydict(columnas, schema=esquema), row_group_size=FILAS_POR_LOTE)
+            fechas = [f for f in columnas[columna_fecha] if f is not None]
+            if fechas:
+                desde = min(fechas) if desde is None else min(desde, min(fechas))
+                hasta = max(fechas) if hasta is None else max(hasta, max(fechas))
+    except Exception:
+        if escritor is not None:
+            escritor.close()
+            os.remove(temporal)
+        raise
+    if escritor is None:
+        return None
+    escritor.close()
+    ahora = datetime.utcnow()
+    pendiente = _ruta_archivo(tabla, desde or ahora, hasta or ahora) + PENDIENTE
+    os.replace(temporal, pendiente)
+    return pendiente
+
+def _entrada(tabla: str, ruta: str) -> Dict:
+    """Entrada del índice de un archivo publicado (filas y rango de fechas leídos del archivo)"""
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    _, columna_fecha = TABLAS[tabla]
+    fechas = pq.read_table(ruta, columns=[columna_fecha])[columna_fecha]
+    rango = pc.min_max(fechas).as_py()
+    return {
+        "archivo": os.path.relpath(ruta, DIRECTORIO),
+        "desde": rango["min"].isoformat(),
+        "hasta": rango["max"].isoformat(),
+        "filas": len(fechas),
+    }
+
+def _indexar(tabla: str, ruta: str):
+    with _candado_indice:
+        indice = leer_indice()
+        entradas = indice.setdefault(tabla, [])
+        if not any(e["archivo"] == os.path.relpath(ruta, DIRECTORIO) for e in entradas):
+            entradas.append(_entrada(tabla, ruta))
+            _escribir_indice(indice)
+
+def publicar(tabla: str, pendiente: str):
+    """Pasar un archivo pendiente a definitivo y registrarlo en el índice"""
+    ruta = pendiente[:-len(PENDIENTE)]
+    os.replace(pendiente, ruta)
+    _indexar(tabla, ruta)
+
+def recuperar(db: Session, tabla: str):
+    """
+    Terminar lo que dejó a medias un archivado interrumpido: un archivo pendiente se publica
+    si sus filas ya no están en la tabla (el commit ocurrió) y se descarta si siguen ahí; un
+    archivo definitivo que no está en el índice se registra y uno a medio escribir se borra
+    """
+    carpeta = os.path.join(DIRECTORIO, tabla)
+    if not os.path.isdir(carpeta):
+        return
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    modelo, _ = TABLAS[tabla]
+    indexados = {e["archivo"] for e in leer_indice().get(tabla, [])}
+    for nombre in sorted(os.listdir(carpeta)):
+        ruta = os.path.join(carpeta, nombre)
+        if nombre.endswith(PENDIENTE):
+            ultimo_id = pc.max(pq.read_table(ruta, columns=["id"])["id"]).as_py()
+            if db.execute(select(modelo.id).where(modelo.id == ultimo_id)).first() is not None:
+                os.remove(ruta)
+            else:
+                publicar(tabla, ruta)
+        elif nombre.endswith(".parquet") and os.path.relpath(ruta, DIRECTORIO) not in indexados:
+            _indexar(tabla, ruta)
+        elif nombre.endswith(".tmp"):
+            os.remove(ruta)
+
+def archivar_tabla(db: Session, tabla: str, corte: datetime) -> int:
+    """
+    Mover a un archivo Parquet las filas de `tabla` anteriores a `corte`.
+    Las filas se leen y escriben por lotes; el archivo queda pendiente hasta que el DELETE
+    hace commit y solo entonces se publica en el índice (un corte a mitad de camino lo
+    resuelve `recuperar` en la siguiente ejecución).
+    """
+    recuperar(db, tabla)
+    modelo, columna_fecha = TABLAS[tabla]
+    columna = getattr(modelo, columna_fecha)
+    ultimo_id = db.execute(select(func.max(modelo.id)).where(columna < corte)).scalar()
+    if ultimo_id is None:
+        return 0
+    # Las filas nuevas tienen fecha actual: el mismo filtro con el último id lee y borra las mismas filas
+    filtro = (columna < corte, modelo.id <= ultimo_id)
+    resultado = db.execute(
+        select(*modelo.__table__.columns).where(*filtro).order_by(modelo.id),
+        execution_options={"yield_per": FILAS_POR_LOTE}
+    )
+    pendiente = exportar(resultado, tabla)
+    if pendiente is None:
+        return 0
+    try:
+        borradas = db.execute(delete(modelo).where(*filtro)).rowcount
+        db.commit()
+    except Exception:
+        db.rollback()
+        os.remove(pendiente)
+        raise
+    publicar(tabla, pendiente)
+    return borradas
+
+def archivar_historial(db: Session, meses: int = MESES_CALIENTES) -> int:
+    """Tarea periódica: archivar en todas las tablas las filas fuera de la ventana caliente"""
+    corte = fecha_corte(meses)
+    return sum(archivar_tabla(db, tabla, corte) for tabla in TABLAS_VENTANA)
+
+def leer_archivo(
+    tabla: str,
+    fecha_inicio: Optional[datetime] = None,
+    fecha_fin: Optional[datetime] = None,
+    filtros: Optional[Dict[str, object]] = None,
+    desde: int = 0,
+    limite: Optional[int] = None
+) -> List[Dict]:
+    """
+    Filas archivadas de `tabla` en el rango de fechas y con los filtros de igualdad dados,
+    de la más reciente a la más antigua, saltando `desde` y hasta `limite` filas.
+    Solo se abren los archivos cuyo rango en el índice se cruza con la consulta, del más
+    reciente al más antiguo, y se dejan de abrir cuando la página ya está completa.
+    """
+    _, columna_fecha = TABLAS[tabla]
+    archivos = sorted(
+        (
+            entrada for entrada in leer_indice().get(tabla, [])
+            if (fecha_fin is None or datetime.fromisoformat(entrada["desde"]) <= fecha_fin)
+            and (fecha_inicio is None or datetime.fromisoformat(entrada["hasta"]) >= fecha_inicio)
+        ),
+        key=lambda entrada: entrada["hasta"], reverse=True
+    )
+    if not archivos or limite == 0:
+        return []
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    condiciones = [(columna, "=", valor) for columna, valor in (filtros or {}).items()]
+    if fecha_inicio is not None:
+        condiciones.append((columna_fecha, ">=", pa.scalar(fecha_inicio, pa.timestamp("us"))))
+    if fecha_fin is not None:
+        condiciones.append((columna_fecha, "<=", pa.scalar(fecha_fin, pa.timestamp("us"))))
+
+    leidos, filas, inicio_leido = [], 0, None
+    for entrada in archivos:
+        # Los archivos restantes son anteriores a todo lo leído: no cambian la página
+        if limite is not None and filas >= desde + limite and entrada["hasta"] < inicio_leido:
+            break
+        datos = pq.read_table(os.path.join(DIRECTORIO, entrada["archivo"]), filters=condiciones or None)
+        leidos.append(datos)
+        filas += datos.num_rows
+        inicio_leido = min(inicio_leido or entrada["desde"], entrada["desde"])
+    datos = pa.concat_tables(leidos).sort_by([(columna_fecha, "descending")])
+    return datos.slice(desde, limite).to_pylist()
+
+def completar_pagina(
+    tabla: str,
+    filas: List,
+    contar,
+    skip: int,
+    limit: int,
+    fecha_inicio: Optional[datetime] = None,
+    fecha_fin: Optional[datetime] = None,
+    filtros: Optional[Dict[str, object]] = None
+) -> List:
+    """
+    Completar con filas archivadas (más antiguas que las de la tabla) una página de `filas`
+    leída con offset `skip` y límite `limit`. El archivo solo se lee cuando la tabla no llenó
+    la página, es decir cuando la consulta alcanza fechas anteriores a la ventana caliente;
+    `contar` da el total de filas de la tabla para ubicar la página dentro del archivo.
+    """
+    if len(filas) >= limit:
+        return filas
+    desde = 0 if filas else max(0, skip - contar())
+    return filas + leer_archivo(tabla, fecha_inicio, fecha_fin, filtros, desde, limit - len(filas))
+
+def ultima_fecha_archivada(tabla: str) -> Optional[datetime]:
+    """Fecha más reciente guardada en el archivo de `tabla` (None si no hay archivo)"""
+    fechas = [datetime.fromisoformat(e["hasta"]) for e in leer_indice().get(tabla, [])]
+    return max(fechas) if fechas else None
+
+def sumar_archivo(
+    tabla: str,
+    columna_id: str,
+    columna_cantidad: str,
+    desde: datetime,
+    limites: Dict[int, datetime],
+    columna_tipo: Optional[str] = None
+) -> Dict[int, float]:
+    """
+    Suma de `columna_cantidad` por `columna_id` en las filas archivadas posteriores a `desde`
+    y anteriores al límite de cada item (los items sin límite se ignoran). Con `columna_tipo`
+    (movimientos) las filas de tipo "entrada" suman y las demás restan.
+    """
+    _, columna_fecha = TABLAS[tabla]
+    archivos = [e for e in leer_indice().get(tabla, []) if datetime.fromisoformat(e["hasta"]) > desde]
+    if not limites or not archivos:
+        return {}
+
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    tabla_limites = pa.table({
+        columna_id: pa.array(list(limites), pa.int64()),
+        "limite": pa.array(list(limites.values()), pa.timestamp("us"))
+    })
+    sumas: Dict[int, float] = {}
+    for entrada in archivos:
+        datos = pq.read_table(
+            os.path.join(DIRECTORIO, entrada["archivo"]),
+            columns=[columna_id, columna_cantidad, columna_fecha] + ([columna_tipo] if columna_tipo else []),
+            filters=[(columna_fecha, ">", pa.scalar(desde, pa.timestamp("us")))]
+        )
+        datos = datos.filter(pc.is_valid(datos[columna_id])).join(tabla_limites, columna_id)
+        datos = datos.filter(pc.less(datos[columna_fecha], datos["limite"]))
+        if datos.num_rows == 0:
+            continue
+        if columna_tipo:
+            cantidad = datos[columna_cantidad]
+            datos = datos.set_column(
+                datos.schema.get_field_index(columna_cantidad), columna_cantidad,
+                pc.if_else(pc.equal(datos[columna_tipo], "entrada"), cantidad, pc.negate(cantidad))
+            )
+        agrupado = datos.group_by(columna_id).aggregate([(columna_cantidad, "sum")])
+        for item_id, total in zip(
+            agrupado[columna_id].to_pylist(), agrupado[f"{columna_cantidad}_sum"].to_pylist()
+        ):
+            sumas[item_id] = sumas.get(item_id, 0.0) + total
+    return sumas
+
+def main(argv: Optional[List[str]] = None):
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Archivo frío del historial")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    archivar = comandos.add_parser("archivar", help="Mover al archivo las filas fuera de la ventana caliente")
+    archivar.add_argument("--meses", type=int, default=MESES_CALIENTES)
+    comandos.add_parser("indice", help="Mostrar el índice de archivos")
+    consultar = comandos.add_parser("consultar", help="Leer filas archivadas de una tabla")
+    consultar.add_argument("tabla", choices=list(TABLAS))
+    consultar.add_argument("--desde", type=datetime.fromisoformat)
+    consultar.add_argument("--hasta", type=datetime.fromisoformat)
+    consultar.add_argument("--filtro", action="append", default=[], help="columna=valor")
+    args = parser.parse_args(argv)
+
+    if args.comando == "archivar":
+        db = SessionLocal()
+        try:
+            print(f"Filas archivadas: {archivar_historial(db, args.meses)}")
+        finally:
+            db.close()
+    elif args.comando == "consultar":
+        columnas = TABLAS[args.tabla][0].__table__.columns
+        filtros = {}
+        for filtro in args.filtro:
+            columna, valor = filtro.split("=", 1)
+            tipo = columnas[columna].type
+            filtros[columna] = int(valor) if isinstance(tipo, Integer) else float(valor) if isinstance(tipo, Float) else valor
+        for fila in leer_archivo(args.tabla, args.desde, args.hasta, filtros):
+            print(json.dumps(fila, default=str, ensure_ascii=False))
+    else:
+        print(json.dumps(leer_indice(), indent=2))
+
+if __name__ == "__main__":
+    main()
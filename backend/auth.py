@@ -11,6 +11,7 @@ from dotenv import load_dotenv
 from database import get_db
 from models import User, RoleEnum
 from schemas import TokenData
+import trazas
 
 load_dotenv()
 
@@ -54,7 +55,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        with trazas.span("auth.jwt_decode"):
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
@@ -62,7 +64,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.username == token_data.username).first()
+    with trazas.span("auth.buscar_usuario"):
+        user = db.query(User).filter(User.username == token_data.username).first()
     if user is None:
         raise credentials_exception
     return user
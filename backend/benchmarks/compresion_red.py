@@ -0,0 +1,196 @@
+"""
+Benchmark de compresión sobre un enlace lento
+Levanta la API con uvicorn en un hilo y delante un proxy TCP local que limita el ancho de
+banda de bajada y agrega latencia a cada solicitud (simula la red de planta). Mide bytes
+en el cable (encabezados incluidos) y latencia de punta a punta por codificación, con la
+conexión reutilizada (keep-alive) y con una conexión nueva por solicitud.
+
+    cd backend
+    python benchmarks/compresion_red.py --kbps 1024 --latencia-ms 40 --repeticiones 10
+
+Sin DATABASE_URL usa una base SQLite temporal que se llena con datos sintéticos.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if "DATABASE_URL" not in os.environ:
+    _temporal = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    os.environ["DATABASE_URL"] = f"sqlite:///{_temporal.name}?check_same_thread=false"
+
+import httpx
+import uvicorn
+from sqlalchemy import insert, func, select
+
+import main
+import compresion
+from auth import get_current_active_user
+from database import Base, engine, SessionLocal
+from models import (
+    User, RoleEnum, MateriaPrima, Gasto, Producto, MovimientoMateriaPrima, HistorialDescuentoMateriaPrima
+)
+
+PUERTO_API = 8791
+PUERTO_PROXY = 8792
+
+def poblar(filas: int) -> int:
+    """Datos sintéticos; retorna el id de la materia prima con historial"""
+    Base.metadata.create_all(bind=engine)
+    ahora = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        if db.execute(select(func.count()).select_from(MateriaPrima)).scalar() == 0:
+            db.execute(insert(MateriaPrima), [{
+                "codigo": f"BENCH-MP-{i}", "nombre": f"Materia prima {i}", "descripcion": "Sintética",
+                "unidad_medida": "g", "cantidad_actual": i * 1.5, "cantidad_minima": 10.0,
+                "lote": f"L-{i % 97}", "proveedor": f"Proveedor {i % 13}", "ubicacion": f"Bodega {i % 5}",
+                "tipo_inventario": "BPE - Magistrales", "created_at": ahora, "updated_at": ahora,
+            } for i in range(filas)])
+            db.execute(insert(Gasto), [{
+                "concepto": f"Gasto {i}", "descripcion": "Sintético", "categoria": "servicios",
+                "monto": 1000.0 + i, "fecha_gasto": ahora - timedelta(hours=i), "orden_produccion": f"OP-{i}",
+                "created_at": ahora, "updated_at": ahora,
+            } for i in range(filas)])
+            db.execute(insert(Producto), [{
+                "codigo": "BENCH-P", "nombre": "Producto", "unidad_negocio": "Droguería",
+                "created_at": ahora, "updated_at": ahora,
+            }])
+            materia_id = db.execute(select(func.min(MateriaPrima.id))).scalar()
+            producto_id = db.execute(select(Producto.id)).scalar()
+            db.execute(insert(MovimientoMateriaPrima), [{
+                "materia_prima_id": materia_id, "tipo": "entrada" if i % 3 else "salida",
+                "cantidad": 1.0 + i % 7, "motivo": f"Movimiento {i}", "created_at": ahora - timedelta(minutes=i),
+            } for i in range(filas)])
+            db.execute(insert(HistorialDescuentoMateriaPrima), [{
+                "materia_prima_id": materia_id, "producto_id": producto_id, "producto_nombre": "Producto",
+                "cantidad_descontada": 0.5 + i % 5, "concentracion": 2.0, "volumen_producido": 100.0,
+                "unidad_volumen": "mL", "fecha_produccion": ahora - timedelta(days=i % 60),
+                "fecha_descuento": ahora - timedelta(minutes=i),
+            } for i in range(filas)])
+            db.commit()
+        return db.execute(select(func.min(MateriaPrima.id))).scalar()
+    finally:
+        db.close()
+
+class Proxy:
+    """Proxy TCP con ancho de banda de bajada limitado y latencia por solicitud"""
+    def __init__(self, bytes_por_segundo: float, latencia: float):
+        self.bytes_por_segundo = bytes_por_segundo
+        self.latencia = latencia
+        self.bytes_bajada = 0
+
+    async def _copiar(self, origen, destino, bajada: bool):
+        try:
+            while True:
+                datos = await origen.read(16384)
+                if not datos:
+                    break
+                if bajada:
+                    self.bytes_bajada += len(datos)
+                    await asyncio.sleep(len(datos) / self.bytes_por_segundo)
+                else:
+                    await asyncio.sleep(self.latencia)
+                destino.write(datos)
+                await destino.drain()
+        except ConnectionError:
+            pass
+        finally:
+            destino.close()
+
+    async def _conexion(self, lector_cliente, escritor_cliente):
+        lector_api, escritor_api = await asyncio.open_connection("127.0.0.1", PUERTO_API)
+        await asyncio.gather(
+            self._copiar(lector_cliente, escritor_api, False),
+            self._copiar(lector_api, escritor_cliente, True),
+        )
+
+    def iniciar(self):
+        listo = threading.Event()
+
+        def correr():
+            async def servir():
+                servidor = await asyncio.start_server(self._conexion, "127.0.0.1", PUERTO_PROXY)
+                listo.set()
+                async with servidor:
+                    await servidor.serve_forever()
+            asyncio.run(servir())
+
+        threading.Thread(target=correr, daemon=True).start()
+        listo.wait()
+
+def iniciar_api():
+    servidor = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=PUERTO_API, log_level="warning"))
+    threading.Thread(target=servidor.run, daemon=True).start()
+    while not servidor.started:
+        time.sleep(0.05)
+    return servidor
+
+def medir(proxy: Proxy, ruta: str, codificacion: str, repeticiones: int, reutilizar: bool):
+    encabezados = {"Accept-Encoding": codificacion}
+    url = f"http://127.0.0.1:{PUERTO_PROXY}{ruta}"
+    tiempos = []
+    cliente = httpx.Client(timeout=120) if reutilizar else None
+    try:
+        if cliente is not None:
+            cliente.get(url, headers=encabezados).raise_for_status()  # abrir la conexión
+        proxy.bytes_bajada = 0
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            if cliente is not None:
+                respuesta = cliente.get(url, headers=encabezados)
+            else:
+                with httpx.Client(timeout=120) as nuevo:
+                    respuesta = nuevo.get(url, headers=encabezados)
+            respuesta.read()
+            tiempos.append(time.perf_counter() - inicio)
+    finally:
+        if cliente is not None:
+            cliente.close()
+    time.sleep(0.05)
+    return proxy.bytes_bajada / repeticiones, statistics.mean(tiempos) * 1000, respuesta
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="Bytes en el cable y latencia con y sin compresión")
+    parser.add_argument("--filas", type=int, default=1000)
+    parser.add_argument("--kbps", type=float, default=1024, help="Ancho de banda de bajada en kbit/s")
+    parser.add_argument("--latencia-ms", type=float, default=40, help="Latencia agregada a cada solicitud")
+    parser.add_argument("--repeticiones", type=int, default=10)
+    args = parser.parse_args()
+
+    materia_id = poblar(args.filas)
+    usuario = User(id=0, username="benchmark", email="benchmark@example.com", role=RoleEnum.GERENTE, is_active=True)
+    main.app.dependency_overrides[get_current_active_user] = lambda: usuario
+    iniciar_api()
+    proxy = Proxy(args.kbps * 1000 / 8, args.latencia_ms / 1000)
+    proxy.iniciar()
+
+    rutas = {
+        "materias_primas": f"/api/materias-primas/?limit={args.filas}",
+        "gastos": f"/api/gastos/?limit={args.filas}",
+        "movimientos": f"/api/materias-primas/movimientos/{materia_id}?limit={args.filas}",
+        "historial_descuentos": f"/api/materias-primas/{materia_id}/historial-descuentos",
+    }
+    codificaciones = ["identity"] + list(reversed(compresion.codificaciones_disponibles()))
+    print(f"enlace: {args.kbps:.0f} kbit/s, +{args.latencia_ms:.0f} ms por solicitud")
+    print(f"{'endpoint':<22}{'codificación':<14}{'KB cable':>10}{'ms keep-alive':>15}{'ms conexión nueva':>19}")
+    for nombre, ruta in rutas.items():
+        for codificacion in codificaciones:
+            bytes_cable, ms_reutilizada, respuesta = medir(proxy, ruta, codificacion, args.repeticiones, True)
+            _, ms_nueva, _ = medir(proxy, ruta, codificacion, args.repeticiones, False)
+            recibida = respuesta.headers.get("content-encoding", "identity")
+            print(f"{nombre:<22}{recibida:<14}{bytes_cable / 1024:>10.1f}{ms_reutilizada:>15.1f}{ms_nueva:>19.1f}")
+
+if __name__ == "__main__":
+    try:
+        main_benchmark()
+    finally:
+        if "_temporal" in globals():
+            engine.dispose()
+            os.remove(_temporal.name)
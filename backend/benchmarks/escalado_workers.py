@@ -0,0 +1,156 @@
+"""
+Benchmark de escalado con la cantidad de workers
+Levanta el servidor de producción (gunicorn -c gunicorn.conf.py) con 1, 2, 4... workers y
+lo carga con varios procesos cliente durante unos segundos por endpoint. Reporta
+solicitudes/segundo, latencia p50/p95 y la aceleración respecto de un worker. La mejora
+esperada es casi lineal hasta la cantidad de núcleos (y de conexiones a la base de datos);
+con más workers que núcleos no mejora.
+
+    cd backend
+    python benchmarks/escalado_workers.py --workers 1 2 4 --clientes 16 --segundos 10
+
+Sin DATABASE_URL usa una base SQLite temporal (adecuada para lecturas); para medir
+escrituras concurrentes conviene apuntar a PostgreSQL.
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+DIRECTORIO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DIRECTORIO)
+if "DATABASE_URL" not in os.environ:
+    _temporal = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    os.environ["DATABASE_URL"] = f"sqlite:///{_temporal.name}"
+
+import httpx
+
+PUERTO = 8793
+URL = f"http://127.0.0.1:{PUERTO}"
+ENDPOINTS = {
+    "health": "/health",
+    "materias_primas": "/api/materias-primas/?limit=200",
+    "dashboard": "/api/dashboard/summary",
+}
+
+def preparar(filas: int) -> str:
+    """Esquema, datos sintéticos y un usuario; retorna un token de acceso"""
+    from datetime import datetime
+    from sqlalchemy import insert, func, select
+    from auth import get_password_hash, create_access_token
+    from database import Base, engine, SessionLocal
+    from models import User, RoleEnum, MateriaPrima
+
+    Base.metadata.create_all(bind=engine)
+    ahora = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        if db.execute(select(func.count()).select_from(MateriaPrima)).scalar() == 0:
+            db.execute(insert(MateriaPrima), [{
+                "codigo": f"BENCH-MP-{i}", "nombre": f"Materia prima {i}", "unidad_medida": "g",
+                "cantidad_actual": i * 1.5, "cantidad_minima": 10.0, "ubicacion": f"Bodega {i % 5}",
+                "tipo_inventario": "BPE - Magistrales", "created_at": ahora, "updated_at": ahora,
+            } for i in range(filas)])
+        if db.execute(select(User).where(User.username == "benchmark")).first() is None:
+            db.add(User(
+                username="benchmark", email="benchmark@example.com", full_name="Benchmark",
+                hashed_password=get_password_hash("benchmark"), role=RoleEnum.GERENTE, is_active=True
+            ))
+        db.commit()
+    finally:
+        db.close()
+        engine.dispose()
+    return create_access_token({"sub": "benchmark"})
+
+def iniciar_servidor(servidor: str, workers: int) -> subprocess.Popen:
+    entorno = dict(os.environ, WEB_WORKERS=str(workers), WEB_BIND=f"127.0.0.1:{PUERTO}",
+                   WEB_ACCESS_LOG="", TAREAS_HABILITADAS="false")
+    if servidor == "gunicorn":
+        comando = ["gunicorn", "-c", "gunicorn.conf.py", "main:app"]
+    else:
+        comando = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(PUERTO),
+                   "--workers", str(workers), "--log-level", "warning", "--no-access-log"]
+    proceso = subprocess.Popen(comando, cwd=DIRECTORIO, env=entorno,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    limite = time.time() + 60
+    while time.time() < limite:
+        try:
+            if httpx.get(f"{URL}/ready", timeout=1).status_code == 200:
+                return proceso
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proceso.kill()
+    raise RuntimeError("El servidor no quedó listo")
+
+def _cliente(ruta: str, token: str, segundos: float, resultados):
+    latencias = []
+    errores = 0
+    with httpx.Client(base_url=URL, headers={"Authorization": f"Bearer {token}"}, timeout=30) as cliente:
+        fin = time.perf_counter() + segundos
+        while time.perf_counter() < fin:
+            inicio = time.perf_counter()
+            try:
+                if cliente.get(ruta).status_code != 200:
+                    errores += 1
+            except httpx.HTTPError:
+                errores += 1
+            latencias.append(time.perf_counter() - inicio)
+    resultados.put((latencias, errores))
+
+def cargar(ruta: str, token: str, clientes: int, segundos: float):
+    resultados = multiprocessing.Queue()
+    procesos = [multiprocessing.Process(target=_cliente, args=(ruta, token, segundos, resultados)) for _ in range(clientes)]
+    for proceso in procesos:
+        proceso.start()
+    latencias, errores = [], 0
+    for _ in procesos:
+        parciales, fallidas = resultados.get()
+        latencias.extend(parciales)
+        errores += fallidas
+    for proceso in procesos:
+        proceso.join()
+    latencias.sort()
+    return {
+        "rps": len(latencias) / segundos,
+        "p50": statistics.median(latencias) * 1000,
+        "p95": latencias[int(len(latencias) * 0.95) - 1] * 1000,
+        "errores": errores,
+    }
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="Solicitudes/segundo según la cantidad de workers")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clientes", type=int, default=16, help="Procesos cliente concurrentes")
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--filas", type=int, default=1000)
+    parser.add_argument("--servidor", choices=["gunicorn", "uvicorn"], default="gunicorn")
+    args = parser.parse_args()
+
+    token = preparar(args.filas)
+    print(f"núcleos: {multiprocessing.cpu_count()}, clientes: {args.clientes}, {args.segundos:.0f} s por medición")
+    print(f"{'workers':>8}  {'endpoint':<18}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'x':>7}{'errores':>9}")
+    base = {}
+    for workers in args.workers:
+        proceso = iniciar_servidor(args.servidor, workers)
+        try:
+            for nombre, ruta in ENDPOINTS.items():
+                cargar(ruta, token, args.clientes, 1)  # calentamiento
+                r = cargar(ruta, token, args.clientes, args.segundos)
+                base.setdefault(nombre, r["rps"])
+                print(f"{workers:>8}  {nombre:<18}{r['rps']:>9.0f}{r['p50']:>9.1f}{r['p95']:>9.1f}"
+                      f"{r['rps'] / base[nombre]:>7.2f}{r['errores']:>9}")
+        finally:
+            proceso.terminate()
+            proceso.wait(timeout=60)
+
+if __name__ == "__main__":
+    try:
+        main_benchmark()
+    finally:
+        if "_temporal" in globals():
+            os.remove(_temporal.name)
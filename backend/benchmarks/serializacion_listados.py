@@ -0,0 +1,114 @@
+"""
+Benchmark de serialización de los listados
+Compara filas/segundo de cada listado con la ruta de siempre (response_model de Pydantic
++ json de la biblioteca estándar) y con la ruta orjson (LISTADOS_SERIALIZACION=orjson),
+de punta a punta dentro del proceso (TestClient) y verificando que ambas respuestas son
+iguales.
+
+    cd backend
+    python benchmarks/serializacion_listados.py --filas 1000 --repeticiones 30
+
+Sin DATABASE_URL usa una base SQLite temporal que se llena con datos sintéticos.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if "DATABASE_URL" not in os.environ:
+    _temporal = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    os.environ["DATABASE_URL"] = f"sqlite:///{_temporal.name}"
+
+from fastapi.testclient import TestClient
+from sqlalchemy import insert, func, select
+
+import main
+import listados
+from auth import get_current_active_user
+from database import Base, engine, SessionLocal
+from models import User, RoleEnum, MateriaPrima, ProductoTerminado, Gasto
+
+ENDPOINTS = {
+    "materias_primas": "/api/materias-primas/",
+    "productos_terminados": "/api/productos-terminados/",
+    "gastos": "/api/gastos/",
+}
+
+def poblar(filas: int):
+    """Completar cada tabla hasta `filas` registros sintéticos (insert masivo, sin el ORM)"""
+    Base.metadata.create_all(bind=engine)
+    ahora = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        generadores = {
+            MateriaPrima: lambda i: {
+                "codigo": f"BENCH-MP-{i}", "nombre": f"Materia prima {i}", "descripcion": "Sintética",
+                "unidad_medida": "g", "cantidad_actual": i * 1.5, "cantidad_minima": 10.0,
+                "lote": f"L-{i % 97}", "proveedor": f"Proveedor {i % 13}", "fecha_ingreso": date.today(),
+                "ubicacion": f"Bodega {i % 5}", "tipo_inventario": "BPE - Magistrales",
+                "created_at": ahora, "updated_at": ahora,
+            },
+            ProductoTerminado: lambda i: {
+                "codigo": f"BENCH-PT-{i}", "nombre": f"Producto {i}", "unidad_medida": "ml",
+                "cantidad_actual": float(i % 50), "cantidad_minima": 5.0, "precio_produccion": 1200.0,
+                "precio_venta": 2500.0, "lote": f"PT-{i}", "fecha_produccion": ahora,
+                "fecha_vencimiento": ahora + timedelta(days=i % 365), "ubicacion": f"Bodega {i % 5}",
+                "created_at": ahora, "updated_at": ahora,
+            },
+            Gasto: lambda i: {
+                "concepto": f"Gasto {i}", "descripcion": "Sintético", "categoria": "servicios",
+                "monto": 1000.0 + i, "fecha_gasto": ahora - timedelta(hours=i), "orden_produccion": f"OP-{i}",
+                "comprobante": f"C-{i}", "created_at": ahora, "updated_at": ahora,
+            },
+        }
+        for modelo, generar in generadores.items():
+            existentes = db.execute(select(func.count()).select_from(modelo)).scalar()
+            if existentes < filas:
+                db.execute(insert(modelo), [generar(i) for i in range(existentes, filas)])
+        db.commit()
+    finally:
+        db.close()
+
+def medir(client: TestClient, ruta: str, filas: int, repeticiones: int, modo: str):
+    listados.SERIALIZACION = modo
+    params = {"limit": filas}
+    respuesta = client.get(ruta, params=params)  # calentamiento
+    respuesta.raise_for_status()
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        client.get(ruta, params=params)
+    segundos = (time.perf_counter() - inicio) / repeticiones
+    return respuesta.json(), len(respuesta.content), segundos
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="Filas por segundo de los listados con y sin orjson")
+    parser.add_argument("--filas", type=int, default=1000, help="Tamaño de página (y filas sintéticas por tabla)")
+    parser.add_argument("--repeticiones", type=int, default=30)
+    args = parser.parse_args()
+
+    poblar(args.filas)
+    usuario = User(id=0, username="benchmark", email="benchmark@example.com", role=RoleEnum.GERENTE, is_active=True)
+    main.app.dependency_overrides[get_current_active_user] = lambda: usuario
+    client = TestClient(main.app)
+
+    print(f"{'listado':<22}{'modo':<10}{'ms/página':>11}{'filas/s':>12}{'KB':>8}")
+    for nombre, ruta in ENDPOINTS.items():
+        resultados = {}
+        for modo in ("pydantic", "orjson"):
+            datos, tamano, segundos = medir(client, ruta, args.filas, args.repeticiones, modo)
+            resultados[modo] = (datos, segundos)
+            print(f"{nombre:<22}{modo:<10}{segundos * 1000:>11.2f}{len(datos) / segundos:>12.0f}{tamano / 1024:>8.0f}")
+        antes, despues = resultados["pydantic"], resultados["orjson"]
+        iguales = "misma salida" if antes[0] == despues[0] else "SALIDA DISTINTA"
+        print(f"{'':<22}{'x' + format(antes[1] / despues[1], '.2f'):<10}{iguales:>31}")
+
+if __name__ == "__main__":
+    try:
+        main_benchmark()
+    finally:
+        if "_temporal" in globals():
+            engine.dispose()
+            os.remove(_temporal.name)
@@ -0,0 +1,60 @@
+"""
+Preparación de la base de datos: migraciones, datos semilla y apertura del libro de stock
+Se ejecuta una vez por despliegue, antes de arrancar el servidor (los workers ya no crean
+tablas ni datos al importar main ni al atender solicitudes):
+
+    python bootstrap.py                    # alembic upgrade head + semilla + apertura
+    python bootstrap.py --sin-migraciones  # solo semilla y apertura
+"""
+import argparse
+import os
+import time
+
+from alembic import command
+from alembic.config import Config
+
+from database import SessionLocal
+import catalogo_inventarios
+import libro_stock
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+
+def migrar():
+    configuracion = Config(os.path.join(DIRECTORIO, "alembic.ini"))
+    configuracion.set_main_option("script_location", os.path.join(DIRECTORIO, "migrations"))
+    command.upgrade(configuracion, "head")
+
+def sembrar() -> int:
+    db = SessionLocal()
+    try:
+        return catalogo_inventarios.sembrar(db)
+    finally:
+        db.close()
+
+def abrir_libro() -> int:
+    """Asientos de apertura para los items anteriores al libro de stock"""
+    db = SessionLocal()
+    try:
+        abiertos = libro_stock.abrir_libro(db)
+        db.commit()
+        return abiertos
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Migraciones y datos semilla de la base de datos")
+    parser.add_argument("--sin-migraciones", action="store_true", help="Solo datos semilla y apertura del libro")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    if not args.sin_migraciones:
+        migrar()
+    creados = sembrar()
+    abiertos = abrir_libro()
+    print(
+        f"Base de datos lista: {creados} inventarios creados, {abiertos} items abiertos en el libro "
+        f"({time.perf_counter() - inicio:.1f} s)"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""
+Búsqueda por prefijo y difusa (trigramas) sobre materias primas, productos terminados y productos
+- PostgreSQL: pg_trgm (word_similarity) con índices GIN creados por la migración 0003
+- Otros motores: índice de trigramas en memoria, actualizado en cada worker al hacer
+  commit (los eventos de sesión envían los cambios de los campos buscables por el feed de
+  cambios) y recargado completo periódicamente; lo que llega durante la recarga se reaplica
+
+Puntaje: fracción de los trigramas de la consulta presentes en el campo (como
+word_similarity); las coincidencias por prefijo de código o nombre van primero.
+"""
+import os
+import unicodedata
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import select, func, literal, union_all, or_, event, inspect, Float
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import MateriaPrima, ProductoTerminado, Producto
+import cambios
+
+UMBRAL = float(os.getenv("BUSQUEDA_UMBRAL", "0.3"))
+MOTOR = os.getenv("BUSQUEDA_MOTOR", "auto")  # auto, pg_trgm, memoria
+INTERVALO_RECARGA = int(os.getenv("BUSQUEDA_INTERVALO_SEGUNDOS", "600"))
+
+# Tipo -> (modelo, campos buscables)
+COLECCIONES = {
+    "materia_prima": (MateriaPrima, ("codigo", "nombre", "proveedor", "lote")),
+    "producto_terminado": (ProductoTerminado, ("codigo", "nombre", "lote")),
+    "producto": (Producto, ("codigo", "nombre")),
+}
+CAMPOS_RESULTADO = ("codigo", "nombre", "lote", "proveedor")
+CAMPOS_PREFIJO = ("codigo", "nombre")
+
+def usa_pg_trgm(db: Session) -> bool:
+    if MOTOR == "auto":
+        return db.get_bind().dialect.name == "postgresql"
+    return MOTOR == "pg_trgm"
+
+def normalizar(texto: str) -> str:
+    """Minúsculas y sin tildes"""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+def _palabras(texto: str) -> List[str]:
+    return "".join(c if c.isalnum() else " " for c in normalizar(texto)).split()
+
+def trigramas(texto: str, consulta: bool = False) -> set:
+    """
+    Trigramas al estilo pg_trgm (cada palabra con dos espacios antes y uno después).
+    En una consulta se omite el trigrama final de la última palabra porque
+    puede estar incompleta (búsqueda mientras se escribe).
+    """
+    resultado = set()
+    palabras = _palabras(texto)
+    for i, palabra in enumerate(palabras):
+        relleno = f"  {palabra} "
+        fin = len(relleno) - 2
+        if consulta and i == len(palabras) - 1 and len(palabra) > 1:
+            fin -= 1
+        resultado.update(relleno[j:j + 3] for j in range(fin))
+    return resultado
+
+TIPOS = list(COLECCIONES)
+CAMPOS = sorted({campo for _, campos in COLECCIONES.values() for campo in campos})
+
+LARGO_MARCA = 3
+
+def _marcas_prefijo(texto: str) -> List[str]:
+    """Marcas del inicio del campo (1 a LARGO_MARCA caracteres) para ubicar candidatos por prefijo"""
+    return [f"^{texto[:n]}" for n in range(1, LARGO_MARCA + 1) if len(texto) >= n]
+
+class IndiceTrigramas(cambios.EstadoRecargable):
+    """
+    Cada campo buscable de cada registro es una entrada; los trigramas apuntan a
+    listas compactas (array de int32) de entradas. Una modificación marca las entradas
+    anteriores como inactivas y agrega nuevas; la recarga periódica compacta el índice.
+    """
+    def __init__(self):
+        super().__init__()
+        self._reiniciar()
+
+    def _reiniciar(self):
+        self._publicaciones: Dict[str, array] = {}
+        self._entrada_registro = array("i")
+        self._entrada_tipo = array("b")
+        self._entrada_campo = array("b")
+        self._entrada_longitud = array("i")
+        self._entrada_texto: List[str] = []
+        self._activa = bytearray()
+        self._claves: List[Tuple[str, int]] = []
+        self._registros: List[Dict] = []
+        self._posicion: Dict[Tuple[str, int], int] = {}
+        self._entradas_de: Dict[int, List[int]] = {}
+
+    def _publicar(self, termino: str, entrada: int):
+        publicacion = self._publicaciones.get(termino)
+        if publicacion is None:
+            publicacion = self._publicaciones[termino] = array("i")
+        publicacion.append(entrada)
+
+    def _agregar(self, tipo: str, datos: Dict):
+        clave = (tipo, datos["id"])
+        posicion = self._posicion.get(clave)
+        if posicion is None:
+            posicion = self._posicion[clave] = len(self._claves)
+            self._claves.append(clave)
+            self._registros.append(datos)
+        else:
+            self._registros[posicion] = datos
+            for entrada in self._entradas_de.get(posicion, []):
+                self._activa[entrada] = 0
+
+        entradas = []
+        for campo in COLECCIONES[tipo][1]:
+            valor = datos.get(campo)
+            if not valor:
+                continue
+            texto = normalizar(valor)
+            entrada = len(self._entrada_texto)
+            self._entrada_registro.append(posicion)
+            self._entrada_tipo.append(TIPOS.index(tipo))
+            self._entrada_campo.append(CAMPOS.index(campo))
+            self._entrada_longitud.append(len(valor))
+            self._entrada_texto.append(texto)
+            self._activa.append(1)
+            for trigrama in trigramas(valor):
+                self._publicar(trigrama, entrada)
+            if campo in CAMPOS_PREFIJO:
+                for marca in _marcas_prefijo(texto):
+                    self._publicar(marca, entrada)
+            entradas.append(entrada)
+        self._entradas_de[posicion] = entradas
+
+    def _quitar(self, tipo: str, item_id: int):
+        posicion = self._posicion.get((tipo, item_id))
+        if posicion is None:
+            return
+        for entrada in self._entradas_de.pop(posicion, []):
+            self._activa[entrada] = 0
+
+    def _leer(self, db: Session) -> "IndiceTrigramas":
+        # Solo las estructuras de _reiniciar: el candado y las recargas en curso no se reemplazan
+        nuevo = IndiceTrigramas.__new__(IndiceTrigramas)
+        nuevo._reiniciar()
+        for tipo, (modelo, campos) in COLECCIONES.items():
+            columnas = [modelo.id] + [getattr(modelo, c) for c in CAMPOS_RESULTADO if hasattr(modelo, c)]
+            for fila in db.execute(select(*columnas)):
+                nuevo._agregar(tipo, dict(fila._mapping))
+        return nuevo
+
+    def _reemplazar(self, nuevo: "IndiceTrigramas"):
+        self.__dict__.update(nuevo.__dict__)
+
+    def _aplicar_cambios(self, cambios: Dict[Tuple[str, int], Optional[Dict]]):
+        for (tipo, item_id), datos in cambios.items():
+            if datos is None:
+                self._quitar(tipo, item_id)
+            else:
+                self._agregar(tipo, datos)
+
+    def _tamano(self) -> int:
+        return len(self._claves)
+
+    def _vista(self, termino: str) -> np.ndarray:
+        publicacion = self._publicaciones.get(termino)
+        if publicacion is None:
+            return np.empty(0, dtype=np.int32)
+        return np.frombuffer(publicacion, dtype=np.int32)
+
+    def _candidatas(self, q_trigramas: set, q: str, tipos: Sequence[str]):
+        """
+        Entradas activas de los tipos pedidos con puntaje sobre el umbral y su marca de prefijo.
+        Se ejecuta con el candado tomado: las vistas de numpy sobre los arrays no deben
+        sobrevivir a un append concurrente.
+        """
+        n = len(self._entrada_texto)
+        listas = [self._vista(t) for t in q_trigramas]
+        conteo = np.bincount(np.concatenate(listas), minlength=n) if listas else np.zeros(n, dtype=np.int64)
+        puntaje = conteo / len(q_trigramas)
+        candidatas = np.flatnonzero(puntaje >= UMBRAL)
+
+        permitidos = np.zeros(len(TIPOS), dtype=bool)
+        permitidos[[TIPOS.index(t) for t in tipos]] = True
+        activa = np.frombuffer(self._activa, dtype=np.uint8)[candidatas] == 1
+        tipo = permitidos[np.frombuffer(self._entrada_tipo, dtype=np.int8)[candidatas]]
+        candidatas = candidatas[activa & tipo]
+
+        # Prefijo de código o nombre: la marca cubre hasta LARGO_MARCA caracteres, lo demás se verifica
+        prefijo = np.zeros(n, dtype=bool)
+        con_prefijo = self._vista(_marcas_prefijo(q)[-1])
+        if len(q) > LARGO_MARCA:
+            textos = self._entrada_texto
+            con_prefijo = [e for e in con_prefijo.tolist() if textos[e].startswith(q)]
+        prefijo[con_prefijo] = True
+
+        return (
+            candidatas,
+            puntaje[candidatas],
+            prefijo[candidatas],
+            np.frombuffer(self._entrada_registro, dtype=np.int32)[candidatas],
+            np.frombuffer(self._entrada_campo, dtype=np.int8)[candidatas],
+            np.frombuffer(self._entrada_longitud, dtype=np.int32)[candidatas],
+            len(self._claves),
+            self._claves,
+            self._registros,
+        )
+
+    def buscar(self, consulta: str, tipos: Sequence[str], skip: int, limit: int) -> Tuple[int, List[Dict]]:
+        q_trigramas = trigramas(consulta, consulta=True)
+        q = normalizar(consulta).strip()
+        if not q_trigramas or not tipos:
+            return 0, []
+        with self._candado:
+            candidatas, puntaje, prefijo, registro, campo, longitud, total_registros, claves, registros = \
+                self._candidatas(q_trigramas, q, tipos)
+        if candidatas.size == 0:
+            return 0, []
+
+        # Orden total: prefijo, puntaje, longitud del campo y registro (estable entre páginas)
+        orden = (prefijo + puntaje) * 1e6 - longitud - registro / (total_registros + 1)
+        # Cada registro aporta como mucho len(CAMPOS) entradas: con las mejores
+        # len(CAMPOS) * (skip + limit) entradas se completa la página sin ordenar todo
+        k = min(len(CAMPOS) * (skip + limit), candidatas.size)
+        mejores = np.argpartition(-orden, k - 1)[:k] if k < candidatas.size else np.arange(candidatas.size)
+        mejores = mejores[np.argsort(-orden[mejores])]
+        _, primeras = np.unique(registro[mejores], return_index=True)
+        mejores = mejores[np.sort(primeras)]
+        total = int(np.count_nonzero(np.bincount(registro, minlength=total_registros)))
+
+        resultado = []
+        for i in mejores[skip:skip + limit].tolist():
+            tipo_item, item_id = claves[registro[i]]
+            datos = registros[registro[i]]
+            resultado.append({
+                "tipo_item": tipo_item,
+                "id": item_id,
+                **{c: datos.get(c) for c in CAMPOS_RESULTADO},
+                "campo": CAMPOS[campo[i]],
+                "prefijo": bool(prefijo[i]),
+                "puntaje": float(puntaje[i])
+            })
+        return total, resultado
+
+indice = IndiceTrigramas()
+
+def _buscar_pg_trgm(db: Session, consulta: str, tipos: Sequence[str], skip: int, limit: int) -> Tuple[int, List[Dict]]:
+    """word_similarity y prefijos con ILIKE; ambos usan los índices GIN gin_trgm_ops"""
+    patron = consulta.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    partes = []
+    for tipo in tipos:
+        modelo, campos = COLECCIONES[tipo]
+        columnas = [getattr(modelo, c) for c in campos]
+        puntaje = func.greatest(*[func.coalesce(func.word_similarity(consulta, c), 0) for c in columnas]) \
+            if len(columnas) > 1 else func.coalesce(func.word_similarity(consulta, columnas[0]), 0)
+        prefijo = or_(*[getattr(modelo, c).ilike(patron) for c in CAMPOS_PREFIJO])
+        partes.append(
+            select(
+                literal(tipo).label("tipo_item"),
+                modelo.id.label("id"),
+                *[
+                    (getattr(modelo, c) if hasattr(modelo, c) else literal(None)).label(c)
+                    for c in CAMPOS_RESULTADO
+                ],
+                puntaje.cast(Float).label("puntaje"),
+                prefijo.label("prefijo")
+            ).where(or_(prefijo, *[c.op("%>")(consulta) for c in columnas]))
+        )
+    # El operador %> usa pg_trgm.word_similarity_threshold; se alinea con el umbral configurado
+    db.execute(select(func.set_config("pg_trgm.word_similarity_threshold", str(UMBRAL), True)))
+    coincidencias = union_all(*partes).subquery("coincidencias")
+    total = db.execute(select(func.count()).select_from(coincidencias)).scalar()
+    filas = db.execute(
+        select(coincidencias).order_by(
+            coincidencias.c.prefijo.desc(), coincidencias.c.puntaje.desc(),
+            func.length(coincidencias.c.nombre), coincidencias.c.id
+        ).offset(skip).limit(limit)
+    )
+    return total, [{**dict(fila._mapping), "campo": None} for fila in filas]
+
+def buscar(db: Session, consulta: str, tipos: Optional[Sequence[str]] = None, skip: int = 0, limit: int = 20) -> Dict:
+    tipos = list(tipos or COLECCIONES)
+    if usa_pg_trgm(db):
+        total, items = _buscar_pg_trgm(db, consulta, tipos, skip, limit)
+    else:
+        if not indice.cargado:
+            indice.cargar(db)
+        total, items = indice.buscar(consulta, tipos, skip, limit)
+    return {"consulta": consulta, "total": total, "items": items}
+
+def recargar_indice(db: Session) -> int:
+    """Tarea periódica: recarga completa (y compactación) del índice en memoria"""
+    if usa_pg_trgm(db):
+        return 0
+    return indice.cargar(db)
+
+# Mantenimiento incremental del índice en memoria
+
+CANAL = "busqueda"
+_TIPOS = {modelo: tipo for tipo, (modelo, _) in COLECCIONES.items()}
+
+def _datos(item) -> Dict:
+    return {"id": item.id, **{c: getattr(item, c) for c in CAMPOS_RESULTADO if hasattr(item, c)}}
+
+@event.listens_for(SessionLocal, "after_flush")
+def _registrar_cambios(session: Session, contexto):
+    if usa_pg_trgm(session):
+        return
+    mensajes = []
+    for item in list(session.new) + list(session.dirty):
+        tipo = _TIPOS.get(type(item))
+        if not tipo:
+            continue
+        estado = inspect(item)
+        # Un cambio de existencias no toca el índice: solo se reindexa si cambió un campo buscable
+        if estado.deleted or (item not in session.new and not any(
+            estado.attrs[campo].history.has_changes() for campo in COLECCIONES[tipo][1]
+        )):
+            continue
+        mensajes.append({"tipo_item": tipo, "id": item.id, "datos": _datos(item)})
+    for item in session.deleted:
+        tipo = _TIPOS.get(type(item))
+        if tipo:
+            mensajes.append({"tipo_item": tipo, "id": item.id, "datos": None})
+    cambios.enviar(session, CANAL, mensajes)
+
+def _aplicar_mensaje(mensaje: Dict):
+    indice.aplicar({(mensaje["tipo_item"], mensaje["id"]): mensaje["datos"]})
+
+cambios.escuchar(CANAL, _aplicar_mensaje)
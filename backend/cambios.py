@@ -0,0 +1,304 @@
+"""
+Feed de cambios del inventario
+Cada asiento del libro de stock confirmado se publica como un delta compacto en el canal
+"inventario" del hub de notificaciones:
+
+    {"version": 1234, "tipo_item": "materia_prima", "item_id": 7, "delta": -2.5,
+     "saldo": 40.0, "version_item": 9, "tipo_inventario": "BPE - Magistrales", "origen": "salida"}
+
+`version` es el id del asiento (creciente): el cliente aplica solo versiones mayores a la
+última que conoce y al reconectar pide lo ocurrido desde ella. `version_item` es la versión
+de la fila (control de concurrencia optimista) que el cliente envía al editar el item.
+`tipo_inventario` (None en productos terminados) permite al cliente descartar los items
+nuevos que no pertenecen a la lista filtrada que muestra. Los items eliminados se publican como {"tipo_item", "item_id", "eliminado": true}.
+
+Backends (CAMBIOS_BACKEND):
+- memoria: se publica en el hub del proceso al hacer commit (un solo worker)
+- postgres: se envía con pg_notify dentro de la transacción (PostgreSQL lo entrega solo si
+  hace commit) y cada worker escucha con LISTEN y reparte en su propio hub. Los mensajes de
+  todos los canales de un flush viajan juntos en un solo NOTIFY ([[canal, mensaje], ...]),
+  partido en varios si supera el límite de 8000 bytes de PostgreSQL
+
+El mismo camino sirve a los demás módulos que guardan estado por worker (índices y
+cachés en memoria, avisos de stock bajo): en su after_flush llaman a `enviar(session,
+canal, mensajes)` y registran con `escuchar(canal, funcion)` lo que cada worker hace al
+recibirlos. Los mensajes se entregan en el orden de los commits; con el backend postgres
+el worker que hizo el commit también los recibe por LISTEN (unos milisegundos después).
+"""
+import json
+import os
+import select as selector
+import threading
+from typing import Callable, Dict, List, Optional
+from sqlalchemy import select, func, and_, literal, union_all, event, String
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+
+from database import SessionLocal, engine
+from models import AsientoStock, MateriaPrima, ProductoTerminado
+from notificaciones import hub
+
+CANAL = "inventario"
+BACKEND = os.getenv("CAMBIOS_BACKEND", "memoria")  # memoria, postgres
+CANAL_POSTGRES = os.getenv("CAMBIOS_CANAL_POSTGRES", "inventario_cambios")
+LIMITE_REPLAY = int(os.getenv("CAMBIOS_LIMITE_REPLAY", "1000"))
+LIMITE_NOTIFY = 7900  # PostgreSQL rechaza cargas de NOTIFY de 8000 bytes o más
+
+TIPOS = {MateriaPrima: "materia_prima", ProductoTerminado: "producto_terminado"}
+MODELOS = {tipo: modelo for modelo, tipo in TIPOS.items()}
+
+def usa_postgres() -> bool:
+    return BACKEND == "postgres" and engine.dialect.name == "postgresql"
+
+def _deltas_del_flush(session: Session) -> List[Dict]:
+    """Deltas de los asientos nuevos con el saldo de cada item después del asiento"""
+    saldos = {}
+    versiones = {}
+    inventarios = {}
+    eliminados = []
+    for objeto in list(session.new) + list(session.dirty):
+        tipo = TIPOS.get(type(objeto))
+        if tipo:
+            saldos[(tipo, objeto.id)] = objeto.cantidad_actual
+            versiones[(tipo, objeto.id)] = objeto.version
+            inventarios[(tipo, objeto.id)] = getattr(objeto, "tipo_inventario", None)
+    for objeto in session.deleted:
+        tipo = TIPOS.get(type(objeto))
+        if tipo:
+            eliminados.append({"tipo_item": tipo, "item_id": objeto.id, "eliminado": True})
+
+    asientos = sorted(
+        (a for a in session.new if isinstance(a, AsientoStock)), key=lambda a: a.id
+    )
+    for asiento in asientos:
+        clave = (asiento.tipo_item, asiento.item_id)
+        if clave not in saldos:
+            # Item sin cambios en este flush (p. ej. el asiento de alta de un item ya insertado)
+            objeto = session.identity_map.get(identity_key(MODELOS[asiento.tipo_item], asiento.item_id))
+            if objeto is not None:
+                saldos[clave] = objeto.cantidad_actual
+                versiones[clave] = objeto.version
+                inventarios[clave] = getattr(objeto, "tipo_inventario", None)
+    deltas = []
+    # Hacia atrás: el último asiento de cada item deja el saldo actual
+    for asiento in reversed(asientos):
+        clave = (asiento.tipo_item, asiento.item_id)
+        saldo = saldos.get(clave)
+        deltas.append({
+            "version": asiento.id,
+            "tipo_item": asiento.tipo_item,
+            "item_id": asiento.item_id,
+            "delta": asiento.delta,
+            "saldo": saldo,
+            "version_item": versiones.get(clave),
+            "tipo_inventario": inventarios.get(clave),
+            "origen": asiento.origen,
+        })
+        if saldo is not None:
+            saldos[clave] = saldo - asiento.delta
+    deltas.reverse()
+    return deltas + eliminados
+
+# Difusión a todos los workers
+
+_oyentes: Dict[str, List[Callable[[Dict], None]]] = {}
+
+def escuchar(canal: str, funcion: Callable[[Dict], None]):
+    """Registrar `funcion(mensaje)` para los mensajes de `canal` que reciba este worker"""
+    _oyentes.setdefault(canal, []).append(funcion)
+
+def entregar(canal: str, mensaje: Dict):
+    for funcion in _oyentes.get(canal, ()):
+        try:
+            funcion(mensaje)
+        except Exception as e:
+            print(f"Error aplicando un mensaje de {canal}: {e}")
+
+class EstadoRecargable:
+    """
+    Estado en memoria de un worker que se recarga completo desde la base y se ajusta con los
+    mensajes del feed. Los cambios que llegan mientras la recarga lee la base se guardan y se
+    reaplican sobre el estado nuevo después de reemplazar el anterior: sin esto un commit
+    confirmado durante la lectura se aplicaría al estado viejo y se perdería con el reemplazo.
+    Los mensajes traen los datos completos del item, así que reaplicar uno que la lectura ya
+    vio no cambia nada.
+
+    Las subclases implementan `_leer(db)` (estado nuevo, sin el candado), `_reemplazar(nuevo)`
+    y `_aplicar_cambios(cambios)` (ambos con el candado tomado) y `_tamano()`.
+    """
+    def __init__(self):
+        self._candado = threading.Lock()
+        self._recargas: List[List] = []
+        self.cargado = False
+
+    def cargar(self, db: Session) -> int:
+        """Recarga completa desde la base de datos"""
+        pendientes: List = []
+        with self._candado:
+            self._recargas.append(pendientes)
+        try:
+            nuevo = self._leer(db)
+        except Exception:
+            with self._candado:
+                self._recargas.remove(pendientes)
+            raise
+        with self._candado:
+            self._recargas.remove(pendientes)
+            self._reemplazar(nuevo)
+            for cambios in pendientes:
+                self._aplicar_cambios(cambios)
+            self.cargado = True
+            return self._tamano()
+
+    def aplicar(self, cambios):
+        """Aplicar los cambios de un mensaje (se ignoran antes de la primera carga)"""
+        with self._candado:
+            if not self.cargado and not self._recargas:
+                return
+            for pendientes in self._recargas:
+                pendientes.append(cambios)
+            self._aplicar_cambios(cambios)
+
+_CLAVE_PENDIENTES = "cambios_pendientes"
+_CLAVE_POR_NOTIFICAR = "cambios_por_notificar"
+
+def enviar(session: Session, canal: str, mensajes: List[Dict]):
+    """
+    Difundir `mensajes` (dicts serializables en JSON) a todos los workers si la transacción
+    hace commit. Se llama desde un after_flush.
+    """
+    if not mensajes:
+        return
+    # Con postgres se juntan los del flush y se envían al terminar (_notificar)
+    clave = _CLAVE_POR_NOTIFICAR if usa_postgres() else _CLAVE_PENDIENTES
+    session.info.setdefault(clave, []).extend((canal, mensaje) for mensaje in mensajes)
+
+def _cargas(mensajes: List) -> List[str]:
+    """Lotes JSON [[canal, mensaje], ...] de menos de LIMITE_NOTIFY bytes (un mensaje mayor va solo)"""
+    cargas, lote, tamano = [], [], 2
+    for canal, mensaje in mensajes:
+        # ensure_ascii (por defecto): un carácter es un byte
+        parte = json.dumps([canal, mensaje])
+        if lote and tamano + len(parte) + 1 > LIMITE_NOTIFY:
+            cargas.append("[" + ",".join(lote) + "]")
+            lote, tamano = [], 2
+        lote.append(parte)
+        tamano += len(parte) + 1
+    if lote:
+        cargas.append("[" + ",".join(lote) + "]")
+    return cargas
+
+def publicar(cambio: Dict):
+    hub.publicar(CANAL, cambio, cambio.get("version"))
+
+escuchar(CANAL, publicar)
+
+# Eventos de sesión
+
+@event.listens_for(SessionLocal, "after_flush")
+def _registrar_cambios(session: Session, contexto):
+    enviar(session, CANAL, _deltas_del_flush(session))
+
+@event.listens_for(SessionLocal, "after_flush_postexec")
+def _notificar(session: Session, contexto):
+    """Un NOTIFY por flush con los mensajes de todos los canales (después de todos los after_flush)"""
+    mensajes = session.info.pop(_CLAVE_POR_NOTIFICAR, None)
+    if not mensajes:
+        return
+    # NOTIFY es transaccional: se entrega a los que escuchan solo si hay commit
+    session.connection().execute(
+        select(*(func.pg_notify(CANAL_POSTGRES, carga) for carga in _cargas(mensajes)))
+    )
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publicar_cambios(session: Session):
+    for canal, mensaje in session.info.pop(_CLAVE_PENDIENTES, None) or []:
+        entregar(canal, mensaje)
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _descartar_cambios(session: Session):
+    session.info.pop(_CLAVE_PENDIENTES, None)
+    session.info.pop(_CLAVE_POR_NOTIFICAR, None)
+
+# Escucha de PostgreSQL (LISTEN)
+
+_detener = threading.Event()
+_hilo: Optional[threading.Thread] = None
+
+def _escuchar():
+    while not _detener.is_set():
+        conexion = None
+        try:
+            conexion = engine.raw_connection()
+            dbapi = conexion.driver_connection
+            dbapi.autocommit = True
+            dbapi.cursor().execute(f"LISTEN {CANAL_POSTGRES}")
+            while not _detener.is_set():
+                if selector.select([dbapi], [], [], 5) == ([], [], []):
+                    continue
+                dbapi.poll()
+                while dbapi.notifies:
+                    carga = json.loads(dbapi.notifies.pop(0).payload)
+                    if isinstance(carga, dict):
+                        # Formato anterior (un mensaje por NOTIFY) durante un despliegue gradual
+                        carga = [[carga["canal"], carga["mensaje"]]]
+                    for canal, mensaje in carga:
+                        entregar(canal, mensaje)
+        except Exception as e:
+            print(f"Error escuchando cambios de inventario: {e}")
+            _detener.wait(5)
+        finally:
+            if conexion is not None:
+                conexion.invalidate()
+
+def iniciar():
+    """Arrancar el hilo de LISTEN si el backend es postgres"""
+    global _hilo
+    if not usa_postgres() or _hilo is not None:
+        return
+    _detener.clear()
+    _hilo = threading.Thread(target=_escuchar, name="cambios-listen", daemon=True)
+    _hilo.start()
+
+def detener():
+    global _hilo
+    _detener.set()
+    _hilo = None
+
+# Reenvío al reconectar
+
+def cambios_desde(db: Session, version: int) -> Optional[List[Dict]]:
+    """
+    Último delta de cada item modificado después de `version`, con su saldo actual.
+    None si hay más de LIMITE_REPLAY items: al cliente le conviene recargar todo.
+    """
+    ultimos = select(
+        AsientoStock.tipo_item,
+        AsientoStock.item_id,
+        func.max(AsientoStock.id).label("version")
+    ).where(AsientoStock.id > version).group_by(
+        AsientoStock.tipo_item, AsientoStock.item_id
+    ).subquery("ultimos")
+
+    partes = [
+        select(
+            ultimos.c.version, ultimos.c.tipo_item, ultimos.c.item_id,
+            modelo.cantidad_actual.label("saldo"), modelo.version.label("version_item"),
+            getattr(modelo, "tipo_inventario", literal(None, String)).label("tipo_inventario")
+        ).select_from(ultimos).outerjoin(
+            modelo, and_(ultimos.c.tipo_item == literal(tipo), modelo.id == ultimos.c.item_id)
+        ).where(ultimos.c.tipo_item == tipo)
+        for tipo, modelo in MODELOS.items()
+    ]
+    consulta = union_all(*partes).subquery("cambios")
+    filas = db.execute(select(consulta).order_by(consulta.c.version).limit(LIMITE_REPLAY + 1)).all()
+    if len(filas) > LIMITE_REPLAY:
+        return None
+    return [
+        {**dict(fila._mapping), "origen": "replay"} if fila.saldo is not None
+        else {"version": fila.version, "tipo_item": fila.tipo_item, "item_id": fila.item_id, "eliminado": True}
+        for fila in filas
+    ]
+
+def version_actual(db: Session) -> int:
+    return db.execute(select(func.coalesce(func.max(AsientoStock.id), 0))).scalar()
@@ -0,0 +1,66 @@
+"""
+Routers de carga perezosa
+Los subsistemas que casi no se usan (por ejemplo el chat de IA, que importa el cliente HTTP
+de Deepseek) no se importan al arrancar el worker: se montan en su prefijo y el módulo se
+importa con la primera solicitud que llega a ese prefijo. Así los workers nuevos o
+reciclados quedan listos antes.
+
+- ROUTERS_PEREZOSOS: módulos de `routers` que se cargan así, separados por coma
+  (por defecto "ai"; vacío para importar todo al arrancar)
+
+Los routers montados de esta forma no aparecen en /docs hasta que se cargan; para
+generar la documentación completa se arranca con ROUTERS_PEREZOSOS vacío.
+"""
+import importlib
+import os
+import threading
+import time
+from typing import List, Optional
+
+from fastapi import FastAPI
+from starlette.concurrency import run_in_threadpool
+
+PEREZOSOS = {nombre.strip() for nombre in os.getenv("ROUTERS_PEREZOSOS", "ai").split(",") if nombre.strip()}
+
+class RouterPerezoso:
+    """Aplicación ASGI que importa el router en la primera solicitud y luego la delega"""
+    def __init__(self, padre: FastAPI, modulo: str, tags: Optional[List[str]] = None):
+        self.padre = padre
+        self.modulo = modulo
+        self.tags = tags
+        self._app: Optional[FastAPI] = None
+        self._candado = threading.Lock()
+
+    @property
+    def cargado(self) -> bool:
+        return self._app is not None
+
+    def cargar(self) -> FastAPI:
+        # Las solicitudes simultáneas al prefijo esperan a la misma importación
+        with self._candado:
+            if self._app is not None:
+                return self._app
+            inicio = time.perf_counter()
+            router = importlib.import_module(self.modulo).router
+            app = FastAPI(openapi_url=None)
+            # Los overrides de dependencias del padre (pruebas, benchmarks) valen también aquí
+            app.dependency_overrides = self.padre.dependency_overrides
+            app.exception_handlers.update(self.padre.exception_handlers)
+            app.include_router(router, tags=self.tags)
+            self._app = app
+            print(f"Router {self.modulo} cargado en {(time.perf_counter() - inicio) * 1000:.0f} ms")
+        return self._app
+
+    async def __call__(self, scope, receive, send):
+        app = self._app
+        if app is None:
+            # La importación bloquea: en el threadpool para no detener el event loop
+            app = await run_in_threadpool(self.cargar)
+        await app(scope, receive, send)
+
+def incluir(app: FastAPI, modulo: str, prefix: str, tags: List[str]):
+    """Incluir `routers.<modulo>` en `prefix`: al arrancar o en la primera solicitud según ROUTERS_PEREZOSOS"""
+    if modulo in PEREZOSOS:
+        app.mount(prefix, RouterPerezoso(app, f"routers.{modulo}", tags), name=modulo)
+    else:
+        app.include_router(importlib.import_module(f"routers.{modulo}").router, prefix=prefix, tags=tags)
@@ -0,0 +1,70 @@
+"""
+Catálogo de inventarios (Magistral, Droguería, Brasil) en memoria
+Son pocas filas que casi nunca cambian: se cargan al arrancar y cada lectura solo compara
+la versión de la tabla en versiones_tabla (la misma de los ETags, una lectura por llave
+primaria) con la del catálogo cargado; si otro commit, en cualquier worker, modificó los
+inventarios, se recarga. GET /api/inventarios no consulta la tabla mientras no cambie.
+
+Los inventarios por defecto se crean con `python bootstrap.py`, no en cada solicitud.
+"""
+import threading
+from typing import Dict, List, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Inventario
+import etags
+
+INVENTARIOS_POR_DEFECTO = ("Magistral", "Droguería", "Brasil")
+
+_catalogo: List[Dict] = []
+# Versión de la tabla con la que se cargó el catálogo (None: sin cargar)
+_version: Optional[int] = None
+_candado = threading.Lock()
+
+def sembrar(db: Session) -> int:
+    """Crear los inventarios por defecto que falten; retorna cuántos se crearon"""
+    existentes = set(db.execute(
+        select(Inventario.nombre).where(Inventario.nombre.in_(INVENTARIOS_POR_DEFECTO))
+    ).scalars())
+    nuevos = [
+        Inventario(nombre=nombre, descripcion=f"Inventario {nombre}")
+        for nombre in INVENTARIOS_POR_DEFECTO if nombre not in existentes
+    ]
+    db.add_all(nuevos)
+    db.commit()
+    return len(nuevos)
+
+def _version_actual(db: Session) -> int:
+    return etags.versiones(db, ["inventarios"])[0]
+
+def cargar(db: Session, version: Optional[int] = None) -> int:
+    """Recarga completa del catálogo"""
+    global _catalogo, _version
+    if version is None:
+        # Se lee antes que las filas: un cambio concurrente provoca otra recarga, no un catálogo viejo
+        version = _version_actual(db)
+    filas = db.execute(
+        select(Inventario.id, Inventario.nombre, Inventario.descripcion, Inventario.created_at).order_by(Inventario.id)
+    ).all()
+    with _candado:
+        _catalogo = [dict(fila._mapping) for fila in filas]
+        _version = version
+    return len(filas)
+
+def listar(db: Session) -> List[Dict]:
+    """Inventarios del catálogo, recargado si la tabla cambió desde la última carga"""
+    version = _version_actual(db)
+    if version != _version:
+        cargar(db, version)
+    return _catalogo
+
+def al_iniciar():
+    db = SessionLocal()
+    try:
+        cargar(db)
+    except Exception as e:
+        print(f"Error cargando el catálogo de inventarios: {e}")
+    finally:
+        db.close()
@@ -0,0 +1,141 @@
+"""
+Compresión negociada de respuestas (brotli o gzip según Accept-Encoding)
+- Respuestas completas: se comprimen si superan COMPRESION_MINIMO_BYTES
+- Respuestas por partes (StreamingResponse, exportaciones): se comprimen a medida que
+  llegan y cada parte se vacía al cliente de inmediato, sin esperar el final
+- No se tocan los flujos SSE (text/event-stream), los tipos ya comprimidos ni las
+  respuestas que ya traen Content-Encoding
+
+brotli es opcional: si el paquete no está instalado solo se ofrece gzip.
+"""
+import gzip
+import os
+import zlib
+from typing import List, Optional
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depende del entorno
+    brotli = None
+
+MINIMO_BYTES = int(os.getenv("COMPRESION_MINIMO_BYTES", "1024"))
+NIVEL_GZIP = int(os.getenv("COMPRESION_NIVEL_GZIP", "6"))
+NIVEL_BROTLI = int(os.getenv("COMPRESION_NIVEL_BROTLI", "4"))
+
+TIPOS_COMPRIMIBLES = ("application/json", "text/", "application/javascript", "application/xml")
+TIPOS_EXCLUIDOS = ("text/event-stream",)
+
+def codificaciones_disponibles() -> List[str]:
+    """Codificaciones que ofrece el servidor, en orden de preferencia"""
+    return (["br"] if brotli is not None else []) + ["gzip"]
+
+def negociar(accept_encoding: str) -> Optional[str]:
+    """Mejor codificación aceptada por el cliente (respeta q=0); None si ninguna"""
+    calidades = {}
+    for parte in accept_encoding.split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        nombre = nombre.strip().lower()
+        if not nombre:
+            continue
+        calidad = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith("q="):
+            try:
+                calidad = float(parametros[2:])
+            except ValueError:
+                calidad = 0.0
+        calidades[nombre] = calidad
+    comodin = calidades.get("*", 0.0)
+    candidatas = [
+        (calidades.get(codificacion, comodin), -orden, codificacion)
+        for orden, codificacion in enumerate(codificaciones_disponibles())
+    ]
+    calidad, _, codificacion = max(candidatas)
+    return codificacion if calidad > 0 else None
+
+class _Compresor:
+    """Compresor incremental con vaciado por parte"""
+    def __init__(self, codificacion: str):
+        self.codificacion = codificacion
+        if codificacion == "br":
+            self._br = brotli.Compressor(quality=NIVEL_BROTLI)
+        else:
+            self._gz = zlib.compressobj(NIVEL_GZIP, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def parte(self, datos: bytes) -> bytes:
+        if self.codificacion == "br":
+            return self._br.process(datos) + self._br.flush()
+        return self._gz.compress(datos) + self._gz.flush(zlib.Z_SYNC_FLUSH)
+
+    def final(self) -> bytes:
+        if self.codificacion == "br":
+            return self._br.finish()
+        return self._gz.flush(zlib.Z_FINISH)
+
+def comprimir(codificacion: str, datos: bytes) -> bytes:
+    """Compresión de una respuesta completa"""
+    if codificacion == "br":
+        return brotli.compress(datos, quality=NIVEL_BROTLI)
+    return gzip.compress(datos, compresslevel=NIVEL_GZIP, mtime=0)
+
+def _comprimible(encabezados: Headers) -> bool:
+    if "content-encoding" in encabezados:
+        return False
+    tipo = encabezados.get("content-type", "")
+    return tipo.startswith(TIPOS_COMPRIMIBLES) and not tipo.startswith(TIPOS_EXCLUIDOS)
+
+class CompresionMiddleware:
+    """Middleware ASGI de compresión (se ubica por fuera de los que generan respuestas completas)"""
+    def __init__(self, app, minimo: int = MINIMO_BYTES):
+        self.app = app
+        self.minimo = minimo
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        codificacion = negociar(Headers(scope=scope).get("accept-encoding", ""))
+        if codificacion is None:
+            return await self.app(scope, receive, send)
+
+        inicio = None
+        compresor: Optional[_Compresor] = None
+        directo = False
+
+        async def enviar(mensaje):
+            nonlocal inicio, compresor, directo
+            if mensaje["type"] == "http.response.start":
+                inicio = mensaje
+                return
+            if mensaje["type"] != "http.response.body" or directo:
+                return await send(mensaje)
+
+            cuerpo = mensaje.get("body", b"")
+            mas = mensaje.get("more_body", False)
+            if compresor is None:
+                encabezados = MutableHeaders(raw=inicio["headers"])
+                largo = encabezados.get("content-length")
+                pequena = not mas and len(cuerpo) < self.minimo
+                if not _comprimible(encabezados) or pequena or (largo is not None and int(largo) < self.minimo):
+                    directo = True
+                    await send(inicio)
+                    return await send(mensaje)
+                encabezados["content-encoding"] = codificacion
+                encabezados.add_vary_header("Accept-Encoding")
+                if not mas:
+                    # Respuesta completa en un solo mensaje
+                    cuerpo = comprimir(codificacion, cuerpo)
+                    encabezados["content-length"] = str(len(cuerpo))
+                    await send(inicio)
+                    return await send({"type": "http.response.body", "body": cuerpo})
+                # Por partes: el largo final no se conoce
+                del encabezados["content-length"]
+                compresor = _Compresor(codificacion)
+                await send(inicio)
+
+            datos = compresor.parte(cuerpo) if cuerpo else b""
+            if not mas:
+                datos += compresor.final()
+            await send({"type": "http.response.body", "body": datos, "more_body": mas})
+
+        await self.app(scope, receive, enviar)
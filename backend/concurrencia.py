@@ -0,0 +1,56 @@
+"""
+Control de concurrencia optimista
+MateriaPrima, ProductoTerminado, Producto y Gasto tienen una columna `version` configurada
+como version_id_col: cada UPDATE del ORM se emite como
+
+    UPDATE ... SET ..., version = :nueva WHERE id = :id AND version = :leida
+
+(compare-and-swap en la misma sentencia, sin lecturas adicionales ni bloqueos). Si otra
+transacción cambió la fila entre la lectura y el commit no se actualiza ninguna fila,
+SQLAlchemy lanza StaleDataError y se responde 409.
+
+En los PUT el cliente indica la versión que editó con If-Match (el ETag del detalle, cuya
+última parte es la versión) o con el campo `version` del cuerpo; si no coincide con la
+actual se responde 409 sin escribir.
+
+Los descuentos y movimientos de stock (salidas, movimientos, materiales de empaque) no
+llevan versión del cliente: bloquean la fila con SELECT ... FOR UPDATE antes de leer la
+cantidad, así dos escáneres sobre el mismo item se serializan en vez de responder 409.
+Solo las ediciones con If-Match o `version` pueden terminar en conflicto.
+"""
+from typing import Optional
+from fastapi import HTTPException, Request, status
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm.exc import StaleDataError
+
+MENSAJE_CONFLICTO = "El registro fue modificado por otro usuario; recargue los datos e intente de nuevo"
+
+def version_esperada(if_match: Optional[str], version: Optional[int]) -> Optional[int]:
+    """Versión que el cliente editó: campo `version` del cuerpo o última parte del ETag en If-Match"""
+    if version is not None:
+        return version
+    if not if_match or if_match.strip() == "*":
+        return None
+    opaco = if_match.split(",")[0].strip()
+    if opaco.startswith("W/"):
+        opaco = opaco[2:]
+    try:
+        return int(opaco.strip('"').rsplit(".", 1)[-1])
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="If-Match no corresponde a un ETag de este recurso"
+        )
+
+def comprobar(objeto, esperada: Optional[int]):
+    """409 si el cliente editó una versión distinta a la actual (sin versión no se compara)"""
+    if esperada is not None and esperada != objeto.version:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=MENSAJE_CONFLICTO,
+            headers={"X-Version-Actual": str(objeto.version)}
+        )
+
+async def manejar_conflicto(request: Request, exc: StaleDataError) -> JSONResponse:
+    """Manejador de StaleDataError: la fila cambió entre la lectura y el UPDATE"""
+    return JSONResponse(status_code=status.HTTP_409_CONFLICT, content={"detail": MENSAJE_CONFLICTO})
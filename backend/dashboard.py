@@ -0,0 +1,244 @@
+"""
+Resumen precalculado del dashboard
+- Existencias, stock bajo y valor del inventario: contadores en memoria que se cargan una
+  vez y se ajustan con los cambios de cada commit (eventos de sesión de SQLAlchemy).
+  Una recarga completa periódica corrige lo escrito fuera del ORM; los cambios que llegan
+  mientras se recarga se reaplican sobre los contadores nuevos.
+- Lotes por vencer, gasto del mes y salidas recientes: consultas acotadas por índice que
+  se guardan en caché hasta el siguiente commit que las afecte o hasta DASHBOARD_TTL_SEGUNDOS
+  (dependen de la fecha actual)
+
+Los cambios de cada flush y las secciones que invalidan viajan por el feed de cambios, así
+que cada worker ajusta sus contadores y su caché con los commits de todos.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy import select, func, event, inspect
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import MateriaPrima, ProductoTerminado, Gasto, RegistroSalida
+import vencimientos
+import cambios
+
+INTERVALO_RECARGA = int(os.getenv("DASHBOARD_INTERVALO_SEGUNDOS", "600"))
+TTL_SECCIONES = int(os.getenv("DASHBOARD_TTL_SEGUNDOS", "60"))
+LIMITE_ALERTAS = 10
+LIMITE_SALIDAS = 5
+
+TIPOS = {MateriaPrima: "materia_prima", ProductoTerminado: "producto_terminado"}
+
+Clave = Tuple[str, int]  # (tipo_item, id)
+
+def _aporte(tipo: str, datos: Dict) -> Dict:
+    """Aporte de un item a los contadores"""
+    cantidad = datos["cantidad_actual"] or 0
+    aporte = {
+        "bajo": cantidad <= (datos["cantidad_minima"] or 0),
+        "valor_produccion": 0.0,
+        "valor_venta": 0.0,
+        "alerta": {
+            "tipo_item": tipo,
+            "id": datos["id"],
+            "codigo": datos["codigo"],
+            "nombre": datos["nombre"],
+            "cantidad_actual": cantidad,
+            "cantidad_minima": datos["cantidad_minima"] or 0,
+        },
+    }
+    if tipo == "producto_terminado":
+        aporte["valor_produccion"] = cantidad * (datos["precio_produccion"] or 0)
+        aporte["valor_venta"] = cantidad * (datos["precio_venta"] or 0)
+    return aporte
+
+def _datos(item) -> Dict:
+    datos = {c: getattr(item, c) for c in ("id", "codigo", "nombre", "cantidad_actual", "cantidad_minima")}
+    if isinstance(item, ProductoTerminado):
+        datos["precio_produccion"] = item.precio_produccion
+        datos["precio_venta"] = item.precio_venta
+    return datos
+
+class Contadores(cambios.EstadoRecargable):
+    """Totales por tipo de item y conjunto de items con stock bajo"""
+    def __init__(self):
+        super().__init__()
+        self._aportes: Dict[Clave, Dict] = {}
+        self._totales = {tipo: self._vacio() for tipo in TIPOS.values()}
+        self._bajos: Dict[Clave, Dict] = {}
+
+    @staticmethod
+    def _vacio() -> Dict:
+        return {"total": 0, "stock_bajo": 0, "valor_produccion": 0.0, "valor_venta": 0.0}
+
+    def _sumar(self, clave: Clave, aporte: Dict, signo: int):
+        totales = self._totales[clave[0]]
+        totales["total"] += signo
+        totales["stock_bajo"] += signo * aporte["bajo"]
+        totales["valor_produccion"] += signo * aporte["valor_produccion"]
+        totales["valor_venta"] += signo * aporte["valor_venta"]
+
+    def _aplicar(self, clave: Clave, aporte: Optional[Dict]):
+        anterior = self._aportes.pop(clave, None)
+        if anterior is not None:
+            self._sumar(clave, anterior, -1)
+            self._bajos.pop(clave, None)
+        if aporte is not None:
+            self._aportes[clave] = aporte
+            self._sumar(clave, aporte, 1)
+            if aporte["bajo"]:
+                self._bajos[clave] = aporte["alerta"]
+
+    def _leer(self, db: Session) -> "Contadores":
+        nuevo = Contadores()
+        columnas = {
+            MateriaPrima: [MateriaPrima.id, MateriaPrima.codigo, MateriaPrima.nombre,
+                           MateriaPrima.cantidad_actual, MateriaPrima.cantidad_minima],
+            ProductoTerminado: [ProductoTerminado.id, ProductoTerminado.codigo, ProductoTerminado.nombre,
+                                ProductoTerminado.cantidad_actual, ProductoTerminado.cantidad_minima,
+                                ProductoTerminado.precio_produccion, ProductoTerminado.precio_venta],
+        }
+        for modelo, tipo in TIPOS.items():
+            for fila in db.execute(select(*columnas[modelo])):
+                datos = dict(fila._mapping)
+                nuevo._aplicar((tipo, datos["id"]), _aporte(tipo, datos))
+        return nuevo
+
+    def _reemplazar(self, nuevo: "Contadores"):
+        self._aportes, self._totales, self._bajos = nuevo._aportes, nuevo._totales, nuevo._bajos
+
+    def _aplicar_cambios(self, cambios: Dict[Clave, Optional[Dict]]):
+        """Cambios {clave: datos} o {clave: None} para eliminados"""
+        for clave, datos in cambios.items():
+            self._aplicar(clave, _aporte(clave[0], datos) if datos is not None else None)
+
+    def _tamano(self) -> int:
+        return len(self._aportes)
+
+    def resumen(self) -> Dict:
+        with self._candado:
+            totales = {tipo: dict(valores) for tipo, valores in self._totales.items()}
+            bajos = list(self._bajos.values())
+        # Primero los items más lejos de su mínimo
+        bajos.sort(key=lambda a: (a["cantidad_actual"] / a["cantidad_minima"]) if a["cantidad_minima"] else 0)
+        return {"totales": totales, "alertas_stock_bajo": bajos[:LIMITE_ALERTAS]}
+
+contadores = Contadores()
+
+# Secciones que dependen de la fecha
+
+def _inicio_mes(ahora: datetime) -> datetime:
+    return datetime(ahora.year, ahora.month, 1)
+
+def _vencimientos(db: Session) -> Dict:
+    """Lotes con existencias que vencen dentro del horizonte (rango sobre el índice de fecha_vencimiento)"""
+    ahora = datetime.utcnow()
+    dias = vencimientos.HORIZONTE_DIAS
+    stmt = select(
+        func.count(ProductoTerminado.id).label("lotes"),
+        func.count(ProductoTerminado.id).filter(ProductoTerminado.fecha_vencimiento < ahora).label("vencidos"),
+        func.coalesce(func.sum(vencimientos.valor_en_riesgo), 0).label("valor_en_riesgo"),
+        func.min(ProductoTerminado.fecha_vencimiento).filter(
+            ProductoTerminado.fecha_vencimiento >= ahora
+        ).label("proximo_vencimiento")
+    ).where(
+        ProductoTerminado.fecha_vencimiento <= ahora + timedelta(days=dias),
+        ProductoTerminado.cantidad_actual > 0
+    )
+    return {"dias": dias, **dict(db.execute(stmt).one()._mapping)}
+
+def _gastos(db: Session) -> Dict:
+    inicio = _inicio_mes(datetime.utcnow())
+    total, cantidad = db.execute(
+        select(func.coalesce(func.sum(Gasto.monto), 0), func.count(Gasto.id)).where(Gasto.fecha_gasto >= inicio)
+    ).one()
+    return {"desde": inicio, "total": total, "registros": cantidad}
+
+def _salidas(db: Session) -> List[Dict]:
+    stmt = select(
+        RegistroSalida.id, RegistroSalida.tipo_item, RegistroSalida.codigo_item, RegistroSalida.nombre_item,
+        RegistroSalida.lote, RegistroSalida.cantidad_salida, RegistroSalida.unidad_medida,
+        RegistroSalida.motivo_salida, RegistroSalida.created_at
+    ).order_by(RegistroSalida.created_at.desc()).limit(LIMITE_SALIDAS)
+    return [dict(fila._mapping) for fila in db.execute(stmt)]
+
+SECCIONES: Dict[str, Callable[[Session], object]] = {
+    "vencimientos": _vencimientos,
+    "gasto_mes": _gastos,
+    "salidas_recientes": _salidas,
+}
+# Modelo -> secciones que invalida un commit que lo modifica
+INVALIDA = {
+    ProductoTerminado: ("vencimientos",),
+    Gasto: ("gasto_mes",),
+    RegistroSalida: ("salidas_recientes",),
+}
+
+_cache: Dict[str, Tuple[float, object]] = {}
+_generacion: Dict[str, int] = {nombre: 0 for nombre in SECCIONES}
+_candado_cache = threading.Lock()
+
+def _seccion(db: Session, nombre: str):
+    ahora = time.monotonic()
+    guardada = _cache.get(nombre)
+    if guardada is not None and guardada[0] > ahora:
+        return guardada[1]
+    generacion = _generacion[nombre]
+    valor = SECCIONES[nombre](db)
+    with _candado_cache:
+        # Si un commit la invalidó mientras se calculaba, no se guarda el valor ya viejo
+        if _generacion[nombre] == generacion:
+            _cache[nombre] = (ahora + TTL_SECCIONES, valor)
+    return valor
+
+def invalidar(secciones=None):
+    with _candado_cache:
+        for nombre in (secciones if secciones is not None else list(SECCIONES)):
+            _generacion[nombre] += 1
+            _cache.pop(nombre, None)
+
+def resumen(db: Session) -> Dict:
+    """Resumen completo del dashboard"""
+    if not contadores.cargado:
+        contadores.cargar(db)
+    datos = contadores.resumen()
+    totales = datos["totales"]
+    return {
+        "materias_primas": totales["materia_prima"],
+        "productos_terminados": totales["producto_terminado"],
+        "alertas_stock_bajo": datos["alertas_stock_bajo"],
+        **{nombre: _seccion(db, nombre) for nombre in SECCIONES},
+        "generado_en": datetime.utcnow(),
+    }
+
+def recargar(db: Session) -> int:
+    """Tarea periódica: recarga completa de los contadores y vaciado de la caché"""
+    invalidar()
+    return contadores.cargar(db)
+
+# Mantenimiento incremental con los eventos de sesión
+
+CANAL = "dashboard"
+
+@event.listens_for(SessionLocal, "after_flush")
+def _registrar_cambios(session: Session, contexto):
+    items, secciones = [], set()
+    for objeto in list(session.new) + list(session.dirty) + list(session.deleted):
+        secciones.update(INVALIDA.get(type(objeto), ()))
+        tipo = TIPOS.get(type(objeto))
+        if tipo is None:
+            continue
+        eliminado = objeto in session.deleted or inspect(objeto).deleted
+        items.append([tipo, objeto.id, None if eliminado else _datos(objeto)])
+    if items or secciones:
+        cambios.enviar(session, CANAL, [{"items": items, "secciones": sorted(secciones)}])
+
+def _aplicar_mensaje(mensaje: Dict):
+    if mensaje["items"]:
+        contadores.aplicar({(tipo, item_id): datos for tipo, item_id, datos in mensaje["items"]})
+    if mensaje["secciones"]:
+        invalidar(mensaje["secciones"])
+
+cambios.escuchar(CANAL, _aplicar_mensaje)
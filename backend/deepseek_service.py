@@ -7,6 +7,8 @@ from typing import List, Dict, Optional
 import requests
 from dotenv import load_dotenv
 
+import trazas
+
 load_dotenv()
 
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY", "sk-6837a6c1b9614f39997f1617fb58cbb0")
@@ -104,8 +106,13 @@ async def chat_with_deepseek(
     }
     
     try:
-        response = requests.post(DEEPSEEK_API_URL, json=payload, headers=headers, timeout=30)
-        response.raise_for_status()
+        with trazas.span("deepseek.chat", **{"http.url": DEEPSEEK_API_URL, "mensajes": len(messages)}) as llamada:
+            if llamada is not None:
+                headers["traceparent"] = llamada.traceparent()
+            response = requests.post(DEEPSEEK_API_URL, json=payload, headers=headers, timeout=30)
+            if llamada is not None:
+                llamada.atributos["http.status_code"] = response.status_code
+            response.raise_for_status()
         
         result = response.json()
         assistant_message = result['choices'][0]['message']['content']
@@ -0,0 +1,26 @@
+"""
+Detención ordenada del worker
+El servidor decide terminar por SIGTERM/SIGINT o al reciclar el worker (WEB_MAX_REQUESTS).
+Con gunicorn, el worker de trabajador.py avisa en ese momento, antes de dejar de aceptar
+conexiones:
+
+- `iniciar`: /ready pasa a responder 503 "stopping" (con WEB_ESPERA_DRENADO_SEGUNDOS el
+  worker sigue atendiendo ese tiempo tras el SIGTERM para que el balanceador lo saque)
+- `cerrar_flujos`: termina las conexiones SSE abiertas; el servidor espera a que se cierren
+  todas las conexiones y, sin esto, esperaría hasta el graceful_timeout. Los clientes se
+  reconectan a otro worker y piden lo perdido con ?desde=
+
+Con `uvicorn` directo (desarrollo) solo se marca al ejecutar el evento shutdown.
+"""
+from typing import Dict
+
+from notificaciones import hub
+
+estado: Dict[str, bool] = {"aceptando": True}
+
+def iniciar():
+    estado["aceptando"] = False
+
+def cerrar_flujos():
+    iniciar()
+    hub.cerrar()
@@ -0,0 +1,163 @@
+"""
+ETags débiles y GET condicional
+Cada tabla versionada tiene un contador en versiones_tabla. El flush del ORM registra qué
+tablas cambió la transacción y, después del commit, los contadores se incrementan en una
+transacción corta aparte: la fila del contador no queda bloqueada mientras dura la
+transacción de negocio (todas las escrituras a una tabla se serializarían en ella). Entre el
+commit y el incremento un lector puede recibir datos nuevos con el ETag anterior, lo que
+solo le cuesta una respuesta completa en la siguiente consulta. Con If-None-Match igual a
+la versión actual se responde 304 sin ejecutar la consulta principal ni serializar nada.
+
+Si el incremento falla se reintenta; las tablas que siguen pendientes se reintentan en cada
+lectura de versiones y en el siguiente commit, y mientras haya alguna el worker no responde
+304 ni envía ETags (un cliente con el ETag anterior recibiría datos viejos).
+
+Las escrituras que no pasan por el ORM (p. ej. db.execute(update(...))) deben llamar a
+`marcar_modificadas`.
+"""
+import logging
+import threading
+from typing import Iterable, Optional, Sequence, Set
+from fastapi import Depends, HTTPException, Request, Response, status
+from sqlalchemy import select, update, insert, event
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, get_db
+from models import VersionTabla
+
+TABLAS_VERSIONADAS = ("materias_primas", "productos_terminados", "productos", "inventarios", "gastos")
+INTENTOS = 3
+
+logger = logging.getLogger(__name__)
+
+# Tablas confirmadas cuyo incremento falló en este worker
+_pendientes: Set[str] = set()
+_candado_pendientes = threading.Lock()
+
+def versiones(db: Session, tablas: Sequence[str]) -> list:
+    """Versión actual de cada tabla (0 si nunca se modificó); una lectura por llave primaria"""
+    if _pendientes:
+        _incrementar_pendientes(db.get_bind())
+    actuales = dict(db.execute(
+        select(VersionTabla.tabla, VersionTabla.version).where(VersionTabla.tabla.in_(tablas))
+    ).all())
+    return [actuales.get(tabla, 0) for tabla in tablas]
+
+def etag(*partes) -> str:
+    return 'W/"' + ".".join(str(p) for p in partes) + '"'
+
+def coincide(if_none_match: Optional[str], valor: str) -> bool:
+    """Comparación débil de If-None-Match (lista separada por comas o *)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaco = valor[2:] if valor.startswith("W/") else valor
+    for candidato in if_none_match.split(","):
+        candidato = candidato.strip()
+        if (candidato[2:] if candidato.startswith("W/") else candidato) == opaco:
+            return True
+    return False
+
+def responder(request: Request, response: Response, valor: str) -> Optional[str]:
+    """Agregar el ETag a la respuesta o cortar con 304 si el cliente ya tiene esa versión"""
+    if _pendientes:
+        # Alguna versión no refleja lo confirmado: sin ETag ni 304 hasta que se incremente
+        return None
+    if coincide(request.headers.get("if-none-match"), valor):
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": valor})
+    response.headers["ETag"] = valor
+    return valor
+
+def etag_tablas(*tablas: str):
+    """
+    Dependencia para listados y detalles que dependen de `tablas`. Se declara después de la
+    dependencia de autenticación para no responder 304 a un cliente sin credenciales.
+    Retorna el ETag para las respuestas que se arman a mano (None si no se debe enviar).
+    """
+    def dependencia(request: Request, response: Response, db: Session = Depends(get_db)) -> Optional[str]:
+        partes = versiones(db, tablas)
+        # En un detalle el ETag incluye el recurso (la versión es la de la tabla)
+        recurso = next(iter(request.path_params.values()), None)
+        return responder(request, response, etag(*partes, *([recurso] if recurso is not None else [])))
+    return dependencia
+
+def etag_fila(modelo, *tablas: str):
+    """
+    Dependencia para el detalle de un modelo con columna `version`: el ETag lleva la
+    versión de la fila (su última parte, la que se envía en If-Match al editar) y la de
+    las `tablas` relacionadas que se incluyen en la respuesta.
+    """
+    def dependencia(request: Request, response: Response, db: Session = Depends(get_db)) -> Optional[str]:
+        try:
+            recurso = int(next(iter(request.path_params.values())))
+        except (StopIteration, ValueError):
+            return None
+        version = db.execute(select(modelo.version).where(modelo.id == recurso)).scalar()
+        if version is None:
+            # El endpoint responde 404
+            return None
+        partes = versiones(db, tablas) if tablas else []
+        return responder(request, response, etag(*partes, recurso, version))
+    return dependencia
+
+# Incremento de versiones con los eventos de sesión
+
+_CLAVE_MARCADAS = "etags_tablas_marcadas"
+
+def marcar_modificadas(session: Session, tablas: Iterable[str]):
+    """Registrar `tablas` para incrementar su versión (una vez) cuando la transacción haga commit"""
+    session.info.setdefault(_CLAVE_MARCADAS, set()).update(tablas)
+
+def _incrementar(conexion, tablas: Iterable[str]):
+    """Incrementar la versión de `tablas` en la transacción de `conexion`"""
+    tablas = sorted(set(tablas))
+    resultado = conexion.execute(
+        update(VersionTabla).where(VersionTabla.tabla.in_(tablas)).values(version=VersionTabla.version + 1)
+    )
+    if resultado.rowcount < len(tablas):
+        # Primera modificación de alguna tabla (base creada sin la migración 0007)
+        existentes = set(conexion.execute(
+            select(VersionTabla.tabla).where(VersionTabla.tabla.in_(tablas))
+        ).scalars())
+        conexion.execute(insert(VersionTabla), [{"tabla": t, "version": 1} for t in tablas if t not in existentes])
+
+@event.listens_for(SessionLocal, "after_flush")
+def _registrar_cambios(session: Session, contexto):
+    tablas = set()
+    for objeto in list(session.new) + list(session.deleted):
+        tablas.add(getattr(objeto, "__tablename__", None))
+    for objeto in session.dirty:
+        if session.is_modified(objeto):
+            tablas.add(getattr(objeto, "__tablename__", None))
+    tablas &= set(TABLAS_VERSIONADAS)
+    if tablas:
+        marcar_modificadas(session, tablas)
+
+def _incrementar_pendientes(bind, tablas: Iterable[str] = ()):
+    """Incrementar `tablas` más las pendientes de intentos anteriores; las que fallan quedan pendientes"""
+    with _candado_pendientes:
+        tablas = set(tablas) | _pendientes
+        _pendientes.clear()
+    if not tablas:
+        return
+    for intento in range(1, INTENTOS + 1):
+        try:
+            with bind.begin() as conexion:
+                _incrementar(conexion, tablas)
+            return
+        except Exception:
+            if intento == INTENTOS:
+                logger.exception("No se pudo incrementar la versión de %s; queda pendiente", sorted(tablas))
+    with _candado_pendientes:
+        _pendientes.update(tablas)
+
+@event.listens_for(SessionLocal, "after_commit")
+def _incrementar_confirmadas(session: Session):
+    tablas = session.info.pop(_CLAVE_MARCADAS, None)
+    if tablas or _pendientes:
+        _incrementar_pendientes(session.get_bind(), tablas or ())
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _limpiar(session: Session):
+    session.info.pop(_CLAVE_MARCADAS, None)
@@ -0,0 +1,55 @@
+"""
+Configuración de gunicorn para producción (workers de uvicorn, un proceso por núcleo)
+
+    gunicorn -c gunicorn.conf.py main:app
+
+- WEB_WORKERS: procesos (por defecto uno por núcleo)
+- WEB_PRELOAD: importar la aplicación una vez en el maestro antes de crear los workers
+  (arranque más rápido y memoria compartida). Con preload un HUP no recarga el código:
+  para desplegar se reinicia el contenedor o se usa USR2 + QUIT sobre el maestro viejo
+- WEB_MAX_REQUESTS (+ jitter): reciclar cada worker tras esa cantidad de solicitudes
+- WEB_GRACEFUL_TIMEOUT: segundos que un worker tiene para terminar lo pendiente al
+  reiniciarse. El worker (trabajador.py) pone /ready en 503 apenas recibe el SIGTERM y
+  cierra los flujos SSE para no esperar el plazo completo
+- WEB_ESPERA_DRENADO_SEGUNDOS: tiempo que el worker sigue atendiendo tras el SIGTERM con
+  /ready en 503, para que el balanceador deje de enviarle tráfico (0 = cerrar de inmediato)
+- DB_CONEXIONES_TOTALES: si se indica (y no DB_POOL_SIZE), se reparte entre los workers
+  para no superar max_connections de PostgreSQL
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("WEB_BIND", "0.0.0.0:8000")
+worker_class = "trabajador.TrabajadorUvicorn"
+workers = int(os.getenv("WEB_WORKERS", str(multiprocessing.cpu_count())))
+preload_app = os.getenv("WEB_PRELOAD", "true").lower() == "true"
+
+timeout = int(os.getenv("WEB_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+# Mayor que el keep-alive de nginx hacia la API (60s)
+keepalive = int(os.getenv("WEB_KEEPALIVE", "75"))
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "5000"))
+max_requests_jitter = int(os.getenv("WEB_MAX_REQUESTS_JITTER", "500"))
+
+# Latidos de los workers en memoria (en Docker /tmp puede estar en un disco lento)
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+accesslog = os.getenv("WEB_ACCESS_LOG", "-")
+errorlog = "-"
+
+# Pool de conexiones por worker a partir del total disponible
+_total = os.getenv("DB_CONEXIONES_TOTALES")
+if _total and "DB_POOL_SIZE" not in os.environ:
+    _por_worker = max(int(_total) // workers, 2)
+    os.environ["DB_POOL_SIZE"] = str(max(_por_worker * 2 // 3, 1))
+    os.environ["DB_MAX_OVERFLOW"] = str(_por_worker - int(os.environ["DB_POOL_SIZE"]))
+
+def post_fork(server, worker):
+    # Con preload el engine se creó en el maestro: cada worker descarta las conexiones
+    # heredadas (sin cerrarlas, siguen siendo del maestro) y abre las suyas
+    from database import engine, engine_replica
+    engine.dispose(close=False)
+    if engine_replica is not None:
+        engine_replica.dispose(close=False)
+
+def worker_exit(server, worker):
+    server.log.info("Worker %s detenido", worker.pid)
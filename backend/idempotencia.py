@@ -0,0 +1,218 @@
+"""
+Soporte de Idempotency-Key para solicitudes POST
+Si un cliente reintenta un POST con la misma clave se devuelve la respuesta
+guardada sin volver a ejecutar el endpoint (evita descontar stock dos veces).
+La clave se asocia al usuario del token (claim `sub`), no al token: un reintento con un
+token renovado sigue encontrando la respuesta guardada.
+
+Mientras la solicitud original está en proceso la clave queda reservada por
+IDEMPOTENCIA_PLAZO_EN_PROCESO_SEGUNDOS; si el worker muere antes de guardar la respuesta,
+un reintento posterior al plazo toma la reserva y ejecuta la operación.
+"""
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from jose import JWTError, jwt
+
+from database import SessionLocal
+from models import ClaveIdempotencia
+from auth import SECRET_KEY, ALGORITHM
+
+ENCABEZADO = "idempotency-key"
+TTL_HORAS = int(os.getenv("IDEMPOTENCIA_TTL_HORAS", "24"))
+INTERVALO_PURGA = int(os.getenv("IDEMPOTENCIA_INTERVALO_PURGA_SEGUNDOS", "3600"))
+# Debe superar la duración de la solicitud más lenta: pasado el plazo un reintento la repite
+PLAZO_EN_PROCESO = int(os.getenv("IDEMPOTENCIA_PLAZO_EN_PROCESO_SEGUNDOS", "60"))
+LONGITUD_MAXIMA_CLAVE = 255
+# Respuestas que no se guardan: conflictos de versión y límites transitorios se pueden reintentar
+ESTADOS_REINTENTABLES = (409, 429)
+# Encabezados que no se repiten al reenviar (de la conexión o recalculados)
+ENCABEZADOS_EXCLUIDOS = {
+    b"content-length", b"connection", b"keep-alive", b"transfer-encoding", b"upgrade",
+    b"proxy-authenticate", b"proxy-authorization", b"te", b"trailer", b"date", b"server",
+}
+
+def _sha256(*partes: bytes) -> str:
+    h = hashlib.sha256()
+    for parte in partes:
+        h.update(parte)
+        h.update(b"\0")
+    return h.hexdigest()
+
+def _usuario(autorizacion: bytes) -> bytes:
+    """Usuario (claim `sub`) del token Bearer; vacío si no hay token válido"""
+    esquema, _, token = autorizacion.decode("latin-1").partition(" ")
+    if esquema.lower() != "bearer" or not token:
+        return b""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return b""
+    return str(payload.get("sub") or "").encode()
+
+def _reclamar(clave: str, huella: str) -> Optional[ClaveIdempotencia]:
+    """
+    Buscar la clave con una lectura por llave primaria. Si no existe, expiró o su reserva
+    en proceso venció, se reserva con estado NULL por PLAZO_EN_PROCESO y se retorna None;
+    si existe se retorna el registro.
+    """
+    db = SessionLocal()
+    try:
+        registro = db.get(ClaveIdempotencia, clave)
+        ahora = datetime.utcnow()
+        if registro is not None and registro.expira_en > ahora:
+            db.expunge(registro)
+            return registro
+        if registro is not None:
+            db.delete(registro)
+            db.flush()
+        db.add(ClaveIdempotencia(clave=clave, huella=huella, expira_en=ahora + timedelta(seconds=PLAZO_EN_PROCESO)))
+        try:
+            db.commit()
+        except IntegrityError:
+            # Otra solicitud con la misma clave la reservó primero
+            db.rollback()
+            return ClaveIdempotencia(clave=clave, huella=huella, estado_http=None)
+        return None
+    finally:
+        db.close()
+
+def _guardar(clave: str, estado_http: int, encabezados: List[Tuple[bytes, bytes]], cuerpo: bytes):
+    db = SessionLocal()
+    try:
+        registro = db.get(ClaveIdempotencia, clave)
+        if registro is not None:
+            registro.estado_http = estado_http
+            registro.tipo_contenido = next(
+                (valor.decode("latin-1") for nombre, valor in encabezados if nombre == b"content-type"), None
+            )
+            registro.encabezados = json.dumps(
+                [[nombre.decode("latin-1"), valor.decode("latin-1")] for nombre, valor in encabezados]
+            )
+            registro.cuerpo = cuerpo
+            registro.expira_en = datetime.utcnow() + timedelta(hours=TTL_HORAS)
+            db.commit()
+    finally:
+        db.close()
+
+def _liberar(clave: str):
+    db = SessionLocal()
+    try:
+        db.execute(delete(ClaveIdempotencia).where(ClaveIdempotencia.clave == clave))
+        db.commit()
+    finally:
+        db.close()
+
+def _encabezados_guardados(registro: ClaveIdempotencia) -> List[Tuple[bytes, bytes]]:
+    if registro.encabezados:
+        return [(nombre.encode("latin-1"), valor.encode("latin-1")) for nombre, valor in json.loads(registro.encabezados)]
+    # Claves guardadas antes de la columna encabezados
+    return [(b"content-type", (registro.tipo_contenido or "application/json").encode())]
+
+def purgar_expiradas(db: Session) -> int:
+    """Eliminar las claves vencidas (tarea periódica)"""
+    resultado = db.execute(delete(ClaveIdempotencia).where(ClaveIdempotencia.expira_en < datetime.utcnow()))
+    db.commit()
+    return resultado.rowcount
+
+class IdempotenciaMiddleware:
+    """
+    Middleware ASGI: solo actúa en POST que traen el encabezado Idempotency-Key.
+    Las respuestas 5xx no se guardan para permitir reintentar.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+
+        encabezados = dict(scope["headers"])
+        clave_cliente = encabezados.get(ENCABEZADO.encode())
+        if not clave_cliente:
+            return await self.app(scope, receive, send)
+        if len(clave_cliente) > LONGITUD_MAXIMA_CLAVE:
+            return await JSONResponse(
+                {"detail": "Idempotency-Key demasiado larga"}, status_code=400
+            )(scope, receive, send)
+
+        # Leer el cuerpo completo para calcular su huella y reenviarlo al endpoint
+        cuerpo = b""
+        while True:
+            mensaje = await receive()
+            cuerpo += mensaje.get("body", b"")
+            if not mensaje.get("more_body", False):
+                break
+
+        clave = _sha256(
+            _usuario(encabezados.get(b"authorization", b"")),
+            scope["path"].encode(),
+            clave_cliente
+        )
+        huella = _sha256(cuerpo)
+        existente = await run_in_threadpool(_reclamar, clave, huella)
+
+        if existente is not None:
+            if existente.huella != huella:
+                respuesta = JSONResponse(
+                    {"detail": "La Idempotency-Key ya se usó con un cuerpo diferente"},
+                    status_code=422
+                )
+            elif existente.estado_http is None:
+                respuesta = JSONResponse(
+                    {"detail": "Hay una solicitud en proceso con esta Idempotency-Key"},
+                    status_code=409
+                )
+            else:
+                await send({
+                    "type": "http.response.start",
+                    "status": existente.estado_http,
+                    "headers": _encabezados_guardados(existente) + [
+                        (b"content-length", str(len(existente.cuerpo or b"")).encode()),
+                        (b"idempotent-replayed", b"true"),
+                    ],
+                })
+                await send({"type": "http.response.body", "body": existente.cuerpo or b""})
+                return
+            return await respuesta(scope, receive, send)
+
+        cuerpo_enviado = False
+
+        async def receive_reenviado():
+            nonlocal cuerpo_enviado
+            if not cuerpo_enviado:
+                cuerpo_enviado = True
+                return {"type": "http.request", "body": cuerpo, "more_body": False}
+            return await receive()
+
+        estado = {"codigo": 500, "encabezados": []}
+        partes = []
+
+        async def send_capturado(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado["codigo"] = mensaje["status"]
+                estado["encabezados"] = [
+                    (nombre.lower(), valor) for nombre, valor in mensaje.get("headers", [])
+                    if nombre.lower() not in ENCABEZADOS_EXCLUIDOS
+                ]
+            elif mensaje["type"] == "http.response.body":
+                partes.append(mensaje.get("body", b""))
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive_reenviado, send_capturado)
+        except Exception:
+            await run_in_threadpool(_liberar, clave)
+            raise
+
+        if estado["codigo"] >= 500 or estado["codigo"] in ESTADOS_REINTENTABLES:
+            await run_in_threadpool(_liberar, clave)
+        else:
+            await run_in_threadpool(_guardar, clave, estado["codigo"], estado["encabezados"], b"".join(partes))
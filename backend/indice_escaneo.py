@@ -0,0 +1,169 @@
+"""
+Índice en memoria para el escaneo de códigos y lotes
+Guarda por código y por lote la respuesta JSON ya serializada de cada item
+(materia prima o producto terminado) para responder sin consultar la base de datos.
+Se mantiene al día con los eventos de sesión de SQLAlchemy: las entradas nuevas de cada
+flush se envían por el feed de cambios y cada worker las aplica a su índice cuando la
+transacción hace commit. Una recarga completa periódica cubre las escrituras que no pasan
+por el ORM; los cambios que llegan mientras se recarga se reaplican sobre el índice nuevo.
+"""
+import json
+import os
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import MateriaPrima, ProductoTerminado
+import cambios
+
+INTERVALO_RECARGA = int(os.getenv("INDICE_ESCANEO_INTERVALO_SEGUNDOS", "600"))
+
+Clave = Tuple[str, int]  # (tipo_item, id)
+
+def _json(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+def _entrada(item) -> Tuple[Clave, str, Optional[str], bytes]:
+    """(clave, código, lote, JSON serializado) de un item"""
+    if isinstance(item, MateriaPrima):
+        datos = {
+            "tipo_item": "materia_prima",
+            "id": item.id,
+            "codigo": item.codigo,
+            "nombre": item.nombre,
+            "lote": item.lote,
+            "cantidad_actual": item.cantidad_actual,
+            "unidad_medida": item.unidad_medida,
+            "tipo_inventario": item.tipo_inventario,
+            "ubicacion": item.ubicacion,
+            "fecha_ingreso": item.fecha_ingreso,
+            "fecha_produccion": None,
+            "fecha_vencimiento": None,
+        }
+    else:
+        datos = {
+            "tipo_item": "producto_terminado",
+            "id": item.id,
+            "codigo": item.codigo,
+            "nombre": item.nombre,
+            "lote": item.lote,
+            "cantidad_actual": item.cantidad_actual,
+            "unidad_medida": item.unidad_medida,
+            "tipo_inventario": None,
+            "ubicacion": item.ubicacion,
+            "fecha_ingreso": None,
+            "fecha_produccion": item.fecha_produccion,
+            "fecha_vencimiento": item.fecha_vencimiento,
+        }
+    clave = (datos["tipo_item"], item.id)
+    return clave, item.codigo, item.lote, json.dumps(datos, default=_json, ensure_ascii=False).encode()
+
+class IndiceEscaneo(cambios.EstadoRecargable):
+    """
+    Las lecturas no toman el candado: cada código o lote apunta a una tupla inmutable
+    de claves que se reemplaza completa en cada escritura
+    """
+    def __init__(self):
+        super().__init__()
+        self._entradas: Dict[Clave, Tuple[str, Optional[str], bytes]] = {}
+        self._por_codigo: Dict[str, Tuple[Clave, ...]] = {}
+        self._por_lote: Dict[str, Tuple[Clave, ...]] = {}
+
+    def _leer(self, db: Session):
+        entradas, por_codigo, por_lote = {}, {}, {}
+        for modelo in (MateriaPrima, ProductoTerminado):
+            for item in db.query(modelo).yield_per(1000):
+                clave, codigo, lote, cuerpo = _entrada(item)
+                entradas[clave] = (codigo, lote, cuerpo)
+                por_codigo[codigo] = por_codigo.get(codigo, ()) + (clave,)
+                if lote:
+                    por_lote[lote] = por_lote.get(lote, ()) + (clave,)
+        return entradas, por_codigo, por_lote
+
+    def _reemplazar(self, nuevo):
+        self._entradas, self._por_codigo, self._por_lote = nuevo
+
+    def _tamano(self) -> int:
+        return len(self._entradas)
+
+    def _quitar(self, indice: Dict[str, Tuple[Clave, ...]], valor: Optional[str], clave: Clave):
+        if not valor or valor not in indice:
+            return
+        restantes = tuple(c for c in indice[valor] if c != clave)
+        if restantes:
+            indice[valor] = restantes
+        else:
+            del indice[valor]
+
+    def _aplicar_cambios(self, cambios: Dict[Clave, Optional[Tuple[str, Optional[str], bytes]]]):
+        """Cambios {clave: (código, lote, JSON)} o {clave: None} para eliminados"""
+        for clave, nueva in cambios.items():
+            anterior = self._entradas.get(clave)
+            if anterior is not None:
+                self._quitar(self._por_codigo, anterior[0], clave)
+                self._quitar(self._por_lote, anterior[1], clave)
+            if nueva is None:
+                self._entradas.pop(clave, None)
+                continue
+            codigo, lote, _ = nueva
+            self._entradas[clave] = nueva
+            self._por_codigo[codigo] = self._por_codigo.get(codigo, ()) + (clave,)
+            if lote:
+                self._por_lote[lote] = self._por_lote.get(lote, ()) + (clave,)
+
+    def _cuerpos(self, claves: Iterable[Clave]) -> List[bytes]:
+        entradas = self._entradas
+        return [entrada[2] for entrada in (entradas.get(c) for c in claves) if entrada is not None]
+
+    def buscar(self, valor: str, por: str = "auto") -> List[bytes]:
+        """Items por código, por lote o (auto) por código y si no hay, por lote"""
+        resultado = []
+        if por in ("codigo", "auto"):
+            resultado = self._cuerpos(self._por_codigo.get(valor, ()))
+        if por == "lote" or (por == "auto" and not resultado):
+            resultado = self._cuerpos(self._por_lote.get(valor, ()))
+        return resultado
+
+indice = IndiceEscaneo()
+
+def asegurar_cargado(db: Session):
+    if not indice.cargado:
+        indice.cargar(db)
+
+def recargar_indice(db: Session) -> int:
+    """Tarea periódica: recarga completa del índice"""
+    return indice.cargar(db)
+
+def respuesta(valor: str, cuerpos: List[bytes]) -> bytes:
+    """JSON {"valor": ..., "items": [...]} armado a partir de los cuerpos ya serializados"""
+    return b'{"valor":' + json.dumps(valor, ensure_ascii=False).encode() + b',"items":[' + b",".join(cuerpos) + b"]}"
+
+# Mantenimiento incremental con los eventos de sesión
+
+CANAL = "indice_escaneo"
+
+@event.listens_for(SessionLocal, "after_flush")
+def _registrar_cambios(session: Session, contexto):
+    mensajes = []
+    for item in list(session.new) + list(session.dirty):
+        if isinstance(item, (MateriaPrima, ProductoTerminado)) and not inspect(item).deleted:
+            (tipo, item_id), codigo, lote, cuerpo = _entrada(item)
+            mensajes.append({"tipo_item": tipo, "id": item_id, "codigo": codigo, "lote": lote, "cuerpo": cuerpo.decode()})
+    for item in session.deleted:
+        if isinstance(item, (MateriaPrima, ProductoTerminado)):
+            tipo = "materia_prima" if isinstance(item, MateriaPrima) else "producto_terminado"
+            mensajes.append({"tipo_item": tipo, "id": item.id, "eliminado": True})
+    cambios.enviar(session, CANAL, mensajes)
+
+def _aplicar_mensaje(mensaje: Dict):
+    clave = (mensaje["tipo_item"], mensaje["id"])
+    if mensaje.get("eliminado"):
+        indice.aplicar({clave: None})
+    else:
+        indice.aplicar({clave: (mensaje["codigo"], mensaje["lote"], mensaje["cuerpo"].encode())})
+
+cambios.escuchar(CANAL, _aplicar_mensaje)
@@ -0,0 +1,251 @@
+"""
+Libro de stock (event sourcing de existencias)
+Toda variación de cantidad_actual pasa por registrar_delta, que agrega un asiento
+append-only; cantidad_actual queda como proyección mantenida del libro.
+Los snapshots periódicos permiten calcular el saldo en cualquier fecha como
+snapshot + suma de asientos posteriores (los de id mayor al último asiento del snapshot).
+Ese corte por id solo es válido si ningún asiento de id menor se confirma después del
+snapshot: en PostgreSQL los ids se asignan antes del commit, así que tomar_snapshots
+bloquea la tabla en modo SHARE, que espera a las transacciones que están escribiendo
+asientos y detiene las nuevas hasta terminar (SQLite ya serializa las escrituras).
+Los items anteriores al libro reciben un asiento de apertura con `python bootstrap.py`
+(abrir_libro).
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple, Union
+from sqlalchemy import select, func, and_, insert, text
+from sqlalchemy.orm import Session
+
+from models import MateriaPrima, ProductoTerminado, AsientoStock, SnapshotSaldo
+
+MATERIA_PRIMA = "materia_prima"
+PRODUCTO_TERMINADO = "producto_terminado"
+
+MODELOS = {
+    MATERIA_PRIMA: MateriaPrima,
+    PRODUCTO_TERMINADO: ProductoTerminado,
+}
+
+INTERVALO_SNAPSHOT = int(os.getenv("LIBRO_STOCK_INTERVALO_SNAPSHOT_SEGUNDOS", "3600"))
+TOLERANCIA = 1e-6
+ESPERA_BLOQUEO_MS = int(os.getenv("LIBRO_STOCK_ESPERA_BLOQUEO_MS", "5000"))
+
+Item = Union[MateriaPrima, ProductoTerminado]
+
+def tipo_de(item: Item) -> str:
+    return MATERIA_PRIMA if isinstance(item, MateriaPrima) else PRODUCTO_TERMINADO
+
+def registrar_delta(
+    db: Session,
+    item: Item,
+    delta: float,
+    origen: str,
+    referencia_id: Optional[int] = None,
+    usuario_id: Optional[int] = None
+) -> AsientoStock:
+    """
+    Aplicar una variación de stock: actualiza la proyección cantidad_actual y
+    agrega el asiento en la misma transacción. El item debe tener id (flush previo).
+    """
+    item.cantidad_actual = (item.cantidad_actual or 0) + delta
+    asiento = AsientoStock(
+        tipo_item=tipo_de(item),
+        item_id=item.id,
+        delta=delta,
+        origen=origen,
+        referencia_id=referencia_id,
+        created_by=usuario_id
+    )
+    db.add(asiento)
+    return asiento
+
+def registrar_alta(
+    db: Session,
+    item: Item,
+    origen: str = "creacion",
+    usuario_id: Optional[int] = None
+) -> AsientoStock:
+    """
+    Asiento inicial de un item recién creado con su cantidad_actual (ya insertada con el
+    item, sin un UPDATE posterior que suba su versión). El item debe tener id (flush previo).
+    """
+    asiento = AsientoStock(
+        tipo_item=tipo_de(item),
+        item_id=item.id,
+        delta=item.cantidad_actual or 0.0,
+        origen=origen,
+        created_by=usuario_id
+    )
+    db.add(asiento)
+    return asiento
+
+def fijar_cantidad(
+    db: Session,
+    item: Item,
+    cantidad: float,
+    origen: str = "ajuste",
+    usuario_id: Optional[int] = None
+) -> Optional[AsientoStock]:
+    """Llevar cantidad_actual a un valor absoluto registrando la diferencia (ajuste manual)"""
+    delta = cantidad - (item.cantidad_actual or 0)
+    if abs(delta) <= TOLERANCIA:
+        return None
+    return registrar_delta(db, item, delta, origen, usuario_id=usuario_id)
+
+def _ultimos_snapshots(tipo_item: Optional[str] = None, item_id: Optional[int] = None):
+    """Subconsulta con el snapshot más reciente de cada item"""
+    ultimo = select(
+        SnapshotSaldo.tipo_item,
+        SnapshotSaldo.item_id,
+        func.max(SnapshotSaldo.id).label("id")
+    )
+    if tipo_item is not None:
+        ultimo = ultimo.where(SnapshotSaldo.tipo_item == tipo_item)
+    if item_id is not None:
+        ultimo = ultimo.where(SnapshotSaldo.item_id == item_id)
+    ultimo = ultimo.group_by(SnapshotSaldo.tipo_item, SnapshotSaldo.item_id).subquery()
+    return select(SnapshotSaldo).join(ultimo, SnapshotSaldo.id == ultimo.c.id).subquery()
+
+def saldos_libro(db: Session, tipo_item: Optional[str] = None) -> Dict[Tuple[str, int], Tuple[float, int]]:
+    """Saldo actual según el libro de cada item: {(tipo, id): (saldo, último asiento)}"""
+    snap = _ultimos_snapshots(tipo_item)
+    saldos = {
+        (fila.tipo_item, fila.item_id): (fila.saldo, fila.ultimo_asiento_id)
+        for fila in db.execute(select(snap.c.tipo_item, snap.c.item_id, snap.c.saldo, snap.c.ultimo_asiento_id))
+    }
+
+    posteriores = select(
+        AsientoStock.tipo_item,
+        AsientoStock.item_id,
+        func.sum(AsientoStock.delta),
+        func.max(AsientoStock.id)
+    ).outerjoin(
+        snap,
+        and_(snap.c.tipo_item == AsientoStock.tipo_item, snap.c.item_id == AsientoStock.item_id)
+    ).where(
+        AsientoStock.id > func.coalesce(snap.c.ultimo_asiento_id, 0)
+    )
+    if tipo_item is not None:
+        posteriores = posteriores.where(AsientoStock.tipo_item == tipo_item)
+    posteriores = posteriores.group_by(AsientoStock.tipo_item, AsientoStock.item_id)
+
+    for tipo, item_id, suma, ultimo_id in db.execute(posteriores):
+        saldo, _ = saldos.get((tipo, item_id), (0.0, 0))
+        saldos[(tipo, item_id)] = (saldo + suma, ultimo_id)
+    return saldos
+
+def abrir_libro(db: Session) -> int:
+    """
+    Registrar el asiento de apertura de los items anteriores al libro (sin asiento de
+    apertura ni de creación). El delta es cantidad_actual menos lo que ya suman sus
+    asientos, así el saldo del libro coincide aunque el item haya tenido movimientos
+    antes de abrirlo; la apertura se fecha justo antes de su primer asiento. Se ejecuta
+    desde bootstrap.py y no hace nada con los items ya abiertos.
+    """
+    total = 0
+    ahora = datetime.utcnow()
+    for tipo, modelo in MODELOS.items():
+        abiertos = select(AsientoStock.item_id).where(
+            AsientoStock.tipo_item == tipo,
+            AsientoStock.origen.in_(("apertura", "creacion"))
+        )
+        asientos = select(
+            AsientoStock.item_id,
+            func.sum(AsientoStock.delta).label("suma"),
+            func.min(AsientoStock.created_at).label("primero")
+        ).where(AsientoStock.tipo_item == tipo).group_by(AsientoStock.item_id).subquery()
+        pendientes = db.execute(
+            select(modelo.id, modelo.cantidad_actual, asientos.c.suma, asientos.c.primero)
+            .outerjoin(asientos, asientos.c.item_id == modelo.id)
+            .where(modelo.id.not_in(abiertos))
+        ).all()
+        filas = [
+            {"tipo_item": tipo, "item_id": item_id, "delta": (cantidad or 0.0) - (suma or 0.0),
+             "origen": "apertura",
+             # Antes del primer asiento: el historial anterior a la apertura es previo al libro
+             "created_at": primero - timedelta(seconds=1) if primero else ahora}
+            for item_id, cantidad, suma, primero in pendientes
+        ]
+        if filas:
+            db.execute(insert(AsientoStock), filas)
+            total += len(filas)
+    return total
+
+def tomar_snapshots(db: Session) -> int:
+    """Guardar un snapshot para cada item con asientos posteriores a su último snapshot"""
+    if db.get_bind().dialect.name == "postgresql":
+        # Sin escrituras en curso: todo asiento con id menor al último incluido ya está confirmado
+        # Mientras espera el bloqueo también detiene a los nuevos escritores: se limita la espera
+        # y si se agota el snapshot se toma en la próxima ejecución
+        db.execute(text(f"SET LOCAL lock_timeout = '{ESPERA_BLOQUEO_MS}ms'"))
+        db.execute(text("LOCK TABLE asientos_stock IN SHARE MODE"))
+    snap = _ultimos_snapshots()
+    ultimos = {
+        (tipo, item_id): ultimo_id
+        for tipo, item_id, ultimo_id in db.execute(
+            select(snap.c.tipo_item, snap.c.item_id, snap.c.ultimo_asiento_id)
+        )
+    }
+    ahora = datetime.utcnow()
+    filas = [
+        {"tipo_item": tipo, "item_id": item_id, "saldo": saldo,
+         "ultimo_asiento_id": ultimo_id, "tomado_en": ahora}
+        for (tipo, item_id), (saldo, ultimo_id) in saldos_libro(db).items()
+        if ultimos.get((tipo, item_id)) != ultimo_id
+    ]
+    if filas:
+        db.execute(insert(SnapshotSaldo), filas)
+    db.commit()
+    return len(filas)
+
+def saldo_en(db: Session, tipo_item: str, item_id: int, fecha: Optional[datetime] = None) -> Dict:
+    """
+    Saldo de un item en una fecha: último snapshot tomado hasta esa fecha más los
+    asientos posteriores a él (costo proporcional a los asientos desde el snapshot)
+    """
+    fecha = fecha or datetime.utcnow()
+    snapshot = db.query(SnapshotSaldo).filter(
+        SnapshotSaldo.tipo_item == tipo_item,
+        SnapshotSaldo.item_id == item_id,
+        SnapshotSaldo.tomado_en <= fecha
+    ).order_by(SnapshotSaldo.tomado_en.desc(), SnapshotSaldo.id.desc()).first()
+
+    desde = snapshot.ultimo_asiento_id if snapshot else 0
+    suma, cantidad = db.query(
+        func.coalesce(func.sum(AsientoStock.delta), 0.0),
+        func.count(AsientoStock.id)
+    ).filter(
+        AsientoStock.tipo_item == tipo_item,
+        AsientoStock.item_id == item_id,
+        AsientoStock.id > desde,
+        AsientoStock.created_at <= fecha
+    ).one()
+
+    return {
+        "tipo_item": tipo_item,
+        "item_id": item_id,
+        "fecha": fecha,
+        "saldo": (snapshot.saldo if snapshot else 0.0) + suma,
+        "snapshot_id": snapshot.id if snapshot else None,
+        "snapshot_tomado_en": snapshot.tomado_en if snapshot else None,
+        "asientos_aplicados": cantidad
+    }
+
+def detectar_desviaciones(db: Session) -> List[Dict]:
+    """Items cuya proyección cantidad_actual no coincide con el saldo del libro"""
+    saldos = saldos_libro(db)
+    desviaciones = []
+    for tipo, modelo in MODELOS.items():
+        for item_id, codigo, cantidad in db.execute(select(modelo.id, modelo.codigo, modelo.cantidad_actual)):
+            saldo, _ = saldos.get((tipo, item_id), (0.0, 0))
+            if abs((cantidad or 0) - saldo) > TOLERANCIA:
+                desviaciones.append({
+                    "tipo_item": tipo,
+                    "item_id": item_id,
+                    "codigo": codigo,
+                    "cantidad_actual": cantidad,
+                    "saldo_libro": saldo,
+                    "diferencia": (cantidad or 0) - saldo
+                })
+    return desviaciones
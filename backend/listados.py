@@ -0,0 +1,83 @@
+"""
+Listados de inventario con filtros, orden y selección de campos en el servidor
+Las consultas seleccionan solo las columnas pedidas (Core) en lugar de cargar objetos
+del ORM completos:
+
+    ?tipo_inventario=BPE - Magistrales&stock_bajo=true&sort=-cantidad_actual,nombre&fields=codigo,nombre
+
+Con LISTADOS_SERIALIZACION=orjson las filas se serializan directamente a bytes con orjson,
+sin pasar por la validación del response_model (mismo esquema de salida: las columnas
+seleccionadas son exactamente los campos del schema de respuesta). Con `fields` siempre
+se usa esta ruta.
+"""
+import os
+from typing import Dict, List, Optional, Sequence
+import orjson
+from fastapi import HTTPException, Response, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+SERIALIZACION = os.getenv("LISTADOS_SERIALIZACION", "pydantic")  # pydantic, orjson
+
+def _lista(valor: Optional[str]) -> List[str]:
+    return [parte.strip() for parte in (valor or "").split(",") if parte.strip()]
+
+def columnas(modelo, campos: Optional[str], permitidos: Sequence[str]) -> list:
+    """Columnas pedidas en `fields` (siempre incluye id); todas las permitidas si no se indica"""
+    pedidos = _lista(campos)
+    invalidos = [c for c in pedidos if c not in permitidos]
+    if invalidos:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Campos no válidos: {', '.join(invalidos)}"
+        )
+    nombres = ["id"] + [c for c in (pedidos or permitidos) if c != "id"]
+    return [getattr(modelo, c) for c in dict.fromkeys(nombres)]
+
+def orden(modelo, sort: Optional[str], ordenables: Sequence[str]) -> list:
+    """Criterios de `sort` ("-campo" para descendente); el id desempata para paginar de forma estable"""
+    criterios = []
+    for clave in _lista(sort):
+        nombre = clave.lstrip("-")
+        if nombre not in ordenables:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"No se puede ordenar por: {nombre}"
+            )
+        columna = getattr(modelo, nombre)
+        criterios.append(columna.desc() if clave.startswith("-") else columna.asc())
+    return criterios + [modelo.id.asc()]
+
+def listar(
+    db: Session,
+    modelo,
+    condiciones: list,
+    campos: Optional[str],
+    sort: Optional[str],
+    skip: int,
+    limit: int,
+    permitidos: Sequence[str],
+    ordenables: Sequence[str],
+    etag: Optional[str] = None
+):
+    """
+    Filas del listado como diccionarios para el response_model, o la respuesta JSON ya
+    serializada (con el ETag) si se piden `fields` o está activa la serialización orjson.
+    """
+    consulta = select(*columnas(modelo, campos, permitidos)).where(*condiciones).order_by(
+        *orden(modelo, sort, ordenables)
+    ).offset(skip).limit(limit)
+    resultado = db.execute(consulta)
+    claves = list(resultado.keys())
+    filas: List[Dict] = [dict(zip(claves, fila)) for fila in resultado]
+    if campos or SERIALIZACION == "orjson":
+        return respuesta_json(filas, etag)
+    return filas
+
+def respuesta_json(datos, etag: Optional[str] = None) -> Response:
+    """JSON serializado con orjson (fechas en ISO 8601, igual que Pydantic)"""
+    return Response(
+        content=orjson.dumps(datos, option=orjson.OPT_NON_STR_KEYS),
+        media_type="application/json",
+        headers={"ETag": etag} if etag else None
+    )
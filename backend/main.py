@@ -1,10 +1,28 @@
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from database import engine, Base
-from routers import auth, users, materias_primas, gastos, productos_terminados, ai, productos, salidas
-
-# Crear tablas
-Base.metadata.create_all(bind=engine)
+from sqlalchemy import text
+from sqlalchemy.orm.exc import StaleDataError
+from database import engine, engine_replica
+from routers import auth, users, materias_primas, gastos, productos_terminados, productos, salidas, vencimientos, mrp, libro_stock, valoracion, escaneo, busqueda, dashboard, notificaciones, perfiles
+import tareas
+import vencimientos as servicio_vencimientos
+import idempotencia
+import libro_stock as servicio_libro_stock
+import particiones
+import archivo_historial
+import indice_escaneo
+import busqueda as servicio_busqueda
+import dashboard as servicio_dashboard
+import cambios
+import concurrencia
+import compresion
+import catalogo_inventarios
+import carga_perezosa
+import perfiles as servicio_perfiles
+import trazas
+import replicas
+import detencion
 
 app = FastAPI(
     title="Sistema de Inventario",
@@ -12,6 +30,30 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Conflictos de versión (control de concurrencia optimista)
+app.add_exception_handler(StaleDataError, concurrencia.manejar_conflicto)
+
+# Perfiles de muestreo por ruta (PERFIL_MUESTREO_N / PERFIL_UMBRAL_MS; lo más adentro para medir solo la aplicación)
+if servicio_perfiles.HABILITADO:
+    app.add_middleware(servicio_perfiles.PerfilMiddleware)
+
+# Leer lo propio con réplica (DATABASE_REPLICA_URL): quien acaba de escribir lee del primario por un tiempo
+if replicas.HABILITADO:
+    app.add_middleware(replicas.LecturaPropiaMiddleware)
+
+# Reintentos con Idempotency-Key (queda dentro de CORS para que las respuestas repetidas lleven sus encabezados)
+app.add_middleware(idempotencia.IdempotenciaMiddleware)
+
+# Compresión gzip/brotli negociada (por fuera de idempotencia para comprimir también las respuestas repetidas)
+app.add_middleware(compresion.CompresionMiddleware)
+
+# Trazas por solicitud (TRAZAS_EXPORTADOR): span raíz por fuera de compresión e idempotencia, spans SQL en el engine
+if trazas.HABILITADO:
+    app.add_middleware(trazas.TrazasMiddleware)
+    trazas.instrumentar_engine(engine)
+    if engine_replica is not None:
+        trazas.instrumentar_engine(engine_replica)
+
 # Configurar CORS
 app.add_middleware(
     CORSMiddleware,
@@ -38,7 +80,95 @@ app.include_router(gastos.router, prefix="/api/gastos", tags=["Gastos de Producc
 app.include_router(productos_terminados.router, prefix="/api/productos-terminados", tags=["Productos Terminados"])
 app.include_router(productos.router, prefix="/api", tags=["Productos"])
 app.include_router(salidas.router, tags=["Salidas"])
-app.include_router(ai.router, prefix="/api/ai", tags=["Inteligencia Artificial"])
+# Poco usado: se importa con la primera solicitud (ROUTERS_PEREZOSOS)
+carga_perezosa.incluir(app, "ai", prefix="/api/ai", tags=["Inteligencia Artificial"])
+app.include_router(vencimientos.router, prefix="/api/vencimientos", tags=["Vencimientos"])
+app.include_router(mrp.router, prefix="/api/mrp", tags=["MRP"])
+app.include_router(libro_stock.router, prefix="/api/libro-stock", tags=["Libro de Stock"])
+app.include_router(valoracion.router, prefix="/api/valoracion", tags=["Valoración"])
+app.include_router(escaneo.router, prefix="/api/escaneo", tags=["Escaneo"])
+app.include_router(busqueda.router, prefix="/api/busqueda", tags=["Búsqueda"])
+app.include_router(dashboard.router, prefix="/api/dashboard", tags=["Dashboard"])
+app.include_router(perfiles.router, prefix="/api/perfiles", tags=["Perfiles"])
+app.include_router(notificaciones.router, prefix="/api/notificaciones", tags=["Notificaciones"])
+
+# Tareas periódicas
+tareas.registrar_tarea(
+    "vencimientos",
+    servicio_vencimientos.INTERVALO_ESCANEO,
+    servicio_vencimientos.escanear_vencimientos,
+    unica=True
+)
+tareas.registrar_tarea(
+    "idempotencia",
+    idempotencia.INTERVALO_PURGA,
+    idempotencia.purgar_expiradas,
+    unica=True
+)
+tareas.registrar_tarea(
+    "snapshots_libro_stock",
+    servicio_libro_stock.INTERVALO_SNAPSHOT,
+    servicio_libro_stock.tomar_snapshots,
+    unica=True
+)
+tareas.registrar_tarea(
+    "particiones",
+    particiones.INTERVALO_MANTENIMIENTO,
+    particiones.crear_particiones_futuras,
+    unica=True
+)
+tareas.registrar_tarea(
+    "archivo_historial",
+    archivo_historial.INTERVALO_ARCHIVO,
+    archivo_historial.archivar_historial,
+    unica=True
+)
+tareas.registrar_tarea(
+    "indice_escaneo",
+    indice_escaneo.INTERVALO_RECARGA,
+    indice_escaneo.recargar_indice
+)
+tareas.registrar_tarea(
+    "indice_busqueda",
+    servicio_busqueda.INTERVALO_RECARGA,
+    servicio_busqueda.recargar_indice
+)
+tareas.registrar_tarea(
+    "dashboard",
+    servicio_dashboard.INTERVALO_RECARGA,
+    servicio_dashboard.recargar
+)
+if replicas.HABILITADO:
+    tareas.registrar_tarea(
+        "retraso_replica",
+        replicas.INTERVALO_MEDICION,
+        replicas.medir_retraso
+    )
+if servicio_perfiles.HABILITADO:
+    tareas.registrar_tarea(
+        "perfiles",
+        servicio_perfiles.INTERVALO_GUARDADO,
+        servicio_perfiles.guardar
+    )
+
+@app.on_event("startup")
+def iniciar_tareas():
+    # El esquema y los datos semilla los prepara `python bootstrap.py` antes de arrancar
+    if trazas.HABILITADO:
+        trazas.configurar_logs()
+    catalogo_inventarios.al_iniciar()
+    tareas.iniciar_tareas()
+    cambios.iniciar()
+
+@app.on_event("shutdown")
+def detener_tareas():
+    detencion.iniciar()
+    tareas.detener_tareas()
+    cambios.detener()
+    if servicio_perfiles.HABILITADO:
+        servicio_perfiles.guardar()
+    if trazas.HABILITADO:
+        trazas.vaciar()
 
 @app.get("/")
 def read_root():
@@ -47,3 +177,15 @@ def read_root():
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
+
+@app.get("/ready")
+def readiness_check():
+    """Listo para recibir tráfico: la base de datos responde y el worker no se está deteniendo"""
+    if not detencion.estado["aceptando"]:
+        return JSONResponse(status_code=503, content={"status": "stopping"})
+    try:
+        with engine.connect() as conexion:
+            conexion.execute(text("SELECT 1"))
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"status": "unavailable", "detail": str(e)})
+    return {"status": "ready"}
@@ -0,0 +1,31 @@
+"""
+Entorno de migraciones de Alembic
+Usa el mismo engine y metadata que la aplicación
+"""
+from logging.config import fileConfig
+from alembic import context
+
+from database import engine, Base, DATABASE_URL
+import models  # noqa: F401  (registra las tablas en Base.metadata)
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+def run_migrations_offline():
+    context.configure(url=DATABASE_URL, target_metadata=target_metadata, literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    with engine.connect() as conexion:
+        context.configure(connection=conexion, target_metadata=target_metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
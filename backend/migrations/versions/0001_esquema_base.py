@@ -0,0 +1,265 @@
+"""Esquema base
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+
+Tablas tal como existían al introducir las migraciones. Se escribe explícito (no desde los
+modelos) para que aplicar 0001 dé siempre el mismo esquema: los cambios posteriores de los
+modelos van en sus propias revisiones. Los índices que agregan 0009 y 0010 no se crean aquí.
+
+Una base creada con create_all antes de las migraciones ya tiene estas tablas: se marca con
+`alembic stamp 0001` y luego se aplica `alembic upgrade head`.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def _indices(tabla: str, *columnas: str, unicas=()):
+    """Índices con los nombres que genera index=True en los modelos"""
+    for columna in columnas:
+        op.create_index(f"ix_{tabla}_{columna}", tabla, [columna], unique=columna in unicas)
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("username", sa.String(50), nullable=False),
+        sa.Column("email", sa.String(100), nullable=False),
+        sa.Column("hashed_password", sa.String(255), nullable=False),
+        sa.Column("full_name", sa.String(100)),
+        sa.Column(
+            "role",
+            sa.Enum("GERENTE", "OPERARIO", "JEFE_PLANTA", "DIRECTOR_TECNICO", name="roleenum", native_enum=False),
+            nullable=False
+        ),
+        sa.Column("is_active", sa.Boolean),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("updated_at", sa.DateTime),
+    )
+    _indices("users", "id", "username", "email", unicas=("username", "email"))
+
+    op.create_table(
+        "materias_primas",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("codigo", sa.String(50), nullable=False),
+        sa.Column("nombre", sa.String(100), nullable=False),
+        sa.Column("descripcion", sa.Text),
+        sa.Column("unidad_medida", sa.String(20), nullable=False),
+        sa.Column("cantidad_actual", sa.Float, nullable=False),
+        sa.Column("cantidad_minima", sa.Float, nullable=False),
+        sa.Column("lote", sa.String(50)),
+        sa.Column("proveedor", sa.String(100)),
+        sa.Column("fecha_ingreso", sa.Date),
+        sa.Column("ubicacion", sa.String(100)),
+        sa.Column("tipo_inventario", sa.String(50), nullable=False),
+        sa.Column("created_by", sa.Integer, sa.ForeignKey("users.id")),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("updated_at", sa.DateTime),
+    )
+    _indices("materias_primas", "id", "codigo", "nombre", unicas=("codigo",))
+
+    op.create_table(
+        "movimientos_materia_prima",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("materia_prima_id", sa.Integer, sa.ForeignKey("materias_primas.id"), nullable=False),
+        sa.Column("tipo", sa.String(20), nullable=False),
+        sa.Column("cantidad", sa.Float, nullable=False),
+        sa.Column("motivo", sa.String(200)),
+        sa.Column("created_by", sa.Integer, sa.ForeignKey("users.id")),
+        sa.Column("created_at", sa.DateTime),
+    )
+    _indices("movimientos_materia_prima", "id")
+
+    op.create_table(
+        "gastos",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("concepto", sa.String(100), nullable=False),
+        sa.Column("descripcion", sa.Text),
+        sa.Column("categoria", sa.String(50), nullable=False),
+        sa.Column("monto", sa.Float, nullable=False),
+        sa.Column("fecha_gasto", sa.DateTime, nullable=False),
+        sa.Column("orden_produccion", sa.String(50)),
+        sa.Column("comprobante", sa.String(100)),
+        sa.Column("created_by", sa.Integer, sa.ForeignKey("users.id")),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("updated_at", sa.DateTime),
+    )
+    _indices("gastos", "id")
+
+    op.create_table(
+        "productos_terminados",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("codigo", sa.String(50), nullable=False),
+        sa.Column("nombre", sa.String(100), nullable=False),
+        sa.Column("descripcion", sa.Text),
+        sa.Column("unidad_medida", sa.String(20), nullable=False),
+        sa.Column("cantidad_actual", sa.Float, nullable=False),
+        sa.Column("cantidad_minima", sa.Float, nullable=False),
+        sa.Column("precio_produccion", sa.Float, nullable=False),
+        sa.Column("precio_venta", sa.Float),
+        sa.Column("lote", sa.String(50)),
+        sa.Column("fecha_produccion", sa.DateTime),
+        sa.Column("fecha_vencimiento", sa.DateTime),
+        sa.Column("ubicacion", sa.String(100)),
+        sa.Column("created_by", sa.Integer, sa.ForeignKey("users.id")),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("updated_at", sa.DateTime),
+    )
+    _indices("productos_terminados", "id", "codigo", unicas=("codigo",))
+
+    op.create_table(
+        "movimientos_productos",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("producto_id", sa.Integer, sa.ForeignKey("productos_terminados.id"), nullable=False),
+        sa.Column("tipo", sa.String(20), nullable=False),
+        sa.Column("cantidad", sa.Float, nullable=False),
+        sa.Column("motivo", sa.String(200)),
+        sa.Column("destino", sa.String(100)),
+        sa.Column("created_by", sa.Integer, sa.ForeignKey("users.id")),
+        sa.Column("created_at", sa.DateTime),
+    )
+    _indices("movimientos_productos", "id")
+
+    op.create_table(
+        "inventarios",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("nombre", sa.String(50), nullable=False),
+        sa.Column("descripcion", sa.Text),
+        sa.Column("created_at", sa.DateTime),
+    )
+    _indices("inventarios", "id", "nombre", unicas=("nombre",))
+
+    op.create_table(
+        "productos",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("codigo", sa.String(50), nullable=False),
+        sa.Column("nombre", sa.String(100), nullable=False),
+        sa.Column("descripcion", sa.Text),
+        sa.Column("precio_produccion", sa.Float, nullable=False),
+        sa.Column("precio_venta", sa.Float),
+        sa.Column("unidad_negocio", sa.String(50), nullable=False),
+        sa.Column("meses_vencimiento", sa.Integer, nullable=False),
+        sa.Column("created_by", sa.Integer, sa.ForeignKey("users.id")),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("updated_at", sa.DateTime),
+    )
+    _indices("productos", "id", "codigo", "nombre", unicas=("codigo",))
+
+    op.create_table(
+        "producto_inventario",
+        sa.Column("producto_id", sa.Integer, sa.ForeignKey("productos.id"), primary_key=True),
+        sa.Column("inventario_id", sa.Integer, sa.ForeignKey("inventarios.id"), primary_key=True),
+    )
+
+    op.create_table(
+        "producto_materia_prima",
+        sa.Column("producto_id", sa.Integer, sa.ForeignKey("productos.id"), primary_key=True),
+        sa.Column("materia_prima_id", sa.Integer, sa.ForeignKey("materias_primas.id"), primary_key=True),
+        sa.Column("concentracion", sa.Float, nullable=False),
+    )
+
+    op.create_table(
+        "historial_descuentos_materias_primas",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("materia_prima_id", sa.Integer, sa.ForeignKey("materias_primas.id"), nullable=False),
+        sa.Column("producto_id", sa.Integer, sa.ForeignKey("productos.id"), nullable=False),
+        sa.Column("producto_nombre", sa.String(100), nullable=False),
+        sa.Column("cantidad_descontada", sa.Float, nullable=False),
+        sa.Column("concentracion", sa.Float, nullable=False),
+        sa.Column("volumen_producido", sa.Float, nullable=False),
+        sa.Column("unidad_volumen", sa.String(20), nullable=False),
+        sa.Column("fecha_produccion", sa.DateTime, nullable=False),
+        sa.Column("fecha_descuento", sa.DateTime),
+    )
+    _indices("historial_descuentos_materias_primas", "id")
+
+    op.create_table(
+        "registros_salidas",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("tipo_item", sa.String(50), nullable=False),
+        sa.Column("materia_prima_id", sa.Integer, sa.ForeignKey("materias_primas.id")),
+        sa.Column("producto_terminado_id", sa.Integer, sa.ForeignKey("productos_terminados.id")),
+        sa.Column("codigo_item", sa.String(50), nullable=False),
+        sa.Column("nombre_item", sa.String(100), nullable=False),
+        sa.Column("lote", sa.String(50), nullable=False),
+        sa.Column("cantidad_salida", sa.Float, nullable=False),
+        sa.Column("unidad_medida", sa.String(20), nullable=False),
+        sa.Column(
+            "motivo_salida",
+            sa.Enum("VENTA", "MUESTRAS", "RECHAZO_QA", "PRUEBAS_QA", name="salidaenum", native_enum=False),
+            nullable=False
+        ),
+        sa.Column("saldo_anterior", sa.Float, nullable=False),
+        sa.Column("saldo_actual", sa.Float, nullable=False),
+        sa.Column("observaciones", sa.Text),
+        sa.Column("created_by", sa.Integer, sa.ForeignKey("users.id")),
+        sa.Column("created_at", sa.DateTime),
+    )
+    _indices("registros_salidas", "id")
+
+    op.create_table(
+        "alertas_vencimiento",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("producto_terminado_id", sa.Integer, sa.ForeignKey("productos_terminados.id"), nullable=False),
+        sa.Column("codigo", sa.String(50), nullable=False),
+        sa.Column("nombre", sa.String(100), nullable=False),
+        sa.Column("lote", sa.String(50)),
+        sa.Column("ubicacion", sa.String(100)),
+        sa.Column("unidad_negocio", sa.String(50), nullable=False),
+        sa.Column("fecha_vencimiento", sa.DateTime, nullable=False),
+        sa.Column("cantidad", sa.Float, nullable=False),
+        sa.Column("valor_en_riesgo", sa.Float, nullable=False),
+        sa.Column("escaneado_en", sa.DateTime),
+    )
+    _indices("alertas_vencimiento", "id", "producto_terminado_id", "fecha_vencimiento")
+
+    op.create_table(
+        "claves_idempotencia",
+        sa.Column("clave", sa.String(64), primary_key=True),
+        sa.Column("huella", sa.String(64), nullable=False),
+        sa.Column("estado_http", sa.Integer),
+        sa.Column("tipo_contenido", sa.String(100)),
+        sa.Column("cuerpo", sa.LargeBinary),
+        sa.Column("expira_en", sa.DateTime, nullable=False),
+    )
+    _indices("claves_idempotencia", "expira_en")
+
+    op.create_table(
+        "asientos_stock",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("tipo_item", sa.String(50), nullable=False),
+        sa.Column("item_id", sa.Integer, nullable=False),
+        sa.Column("delta", sa.Float, nullable=False),
+        sa.Column("origen", sa.String(30), nullable=False),
+        sa.Column("referencia_id", sa.Integer),
+        sa.Column("created_by", sa.Integer, sa.ForeignKey("users.id")),
+        sa.Column("created_at", sa.DateTime),
+    )
+    _indices("asientos_stock", "id")
+    op.create_index("ix_asientos_stock_item_id", "asientos_stock", ["tipo_item", "item_id", "id"])
+
+    op.create_table(
+        "snapshots_saldo",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("tipo_item", sa.String(50), nullable=False),
+        sa.Column("item_id", sa.Integer, nullable=False),
+        sa.Column("saldo", sa.Float, nullable=False),
+        sa.Column("ultimo_asiento_id", sa.Integer, nullable=False),
+        sa.Column("tomado_en", sa.DateTime, nullable=False),
+    )
+    _indices("snapshots_saldo", "id")
+    op.create_index("ix_snapshots_saldo_item_fecha", "snapshots_saldo", ["tipo_item", "item_id", "tomado_en"])
+
+def downgrade():
+    for tabla in (
+        "snapshots_saldo", "asientos_stock", "claves_idempotencia", "alertas_vencimiento",
+        "registros_salidas", "historial_descuentos_materias_primas", "producto_materia_prima",
+        "producto_inventario", "productos", "inventarios", "movimientos_productos",
+        "productos_terminados", "gastos", "movimientos_materia_prima", "materias_primas", "users",
+    ):
+        op.drop_table(tabla)
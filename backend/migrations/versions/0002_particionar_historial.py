@@ -0,0 +1,136 @@
+"""Particionar por mes las tablas de historial (solo PostgreSQL)
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+
+Cada tabla se reemplaza por una tabla particionada por rango sobre su columna de fecha
+con una partición por mes desde el primer registro hasta MESES_ADELANTE meses después
+y una partición por defecto. La llave primaria pasa a (id, fecha) porque PostgreSQL
+exige que incluya la llave de partición. Se conservan secuencia, índices y llaves foráneas.
+
+Por eso la columna de fecha no puede ser NULL: si alguna fila no tiene fecha la migración se
+detiene sin cambiar nada (no se inventa una fecha que movería la fila en el historial); se
+corrigen esas filas y se vuelve a aplicar.
+
+Las definiciones se copian aquí (no se importan de particiones.py) para que la migración
+no cambie si cambia el módulo.
+"""
+from datetime import date, datetime
+from alembic import op
+from sqlalchemy import text
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# Tabla -> columna de fecha usada como llave de partición
+TABLAS_PARTICIONADAS = {
+    "movimientos_materia_prima": "created_at",
+    "movimientos_productos": "created_at",
+    "registros_salidas": "created_at",
+    "historial_descuentos_materias_primas": "fecha_descuento",
+}
+# Las particiones siguientes las crea la tarea periódica de particiones.py
+MESES_ADELANTE = 3
+
+def _sumar_meses(mes: date, meses: int) -> date:
+    total = mes.year * 12 + mes.month - 1 + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+def _esta_particionada(conexion, tabla: str) -> bool:
+    return conexion.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:tabla)"),
+        {"tabla": tabla}
+    ).first() is not None
+
+def _crear_particiones(conexion, tabla: str, desde: date, hasta: date):
+    """Particiones mensuales [mes, mes siguiente) de `desde` a `hasta` (inclusive)"""
+    mes = date(desde.year, desde.month, 1)
+    while mes <= hasta:
+        conexion.execute(text(
+            f"CREATE TABLE {tabla}_{mes.year:04d}_{mes.month:02d} PARTITION OF {tabla} "
+            f"FOR VALUES FROM ('{mes.isoformat()}') TO ('{_sumar_meses(mes, 1).isoformat()}')"
+        ))
+        mes = _sumar_meses(mes, 1)
+
+def _comprobar_fechas(conexion):
+    """Detener la migración si alguna tabla tiene filas sin fecha"""
+    sin_fecha = []
+    for tabla, columna in TABLAS_PARTICIONADAS.items():
+        if _esta_particionada(conexion, tabla):
+            continue
+        cantidad = conexion.execute(text(f"SELECT count(*) FROM {tabla} WHERE {columna} IS NULL")).scalar()
+        if cantidad:
+            sin_fecha.append(f"{tabla}.{columna}: {cantidad}")
+    if sin_fecha:
+        raise RuntimeError(
+            "Filas sin fecha en las tablas a particionar (" + ", ".join(sin_fecha) + "); "
+            "asigne su fecha real y vuelva a aplicar la migración"
+        )
+
+def _definiciones(conexion, tabla: str):
+    """Índices (salvo la llave primaria) y llaves foráneas de una tabla"""
+    indices = conexion.execute(text(
+        "SELECT indexdef FROM pg_indexes WHERE tablename = :tabla AND indexname <> :pk"
+    ), {"tabla": tabla, "pk": f"{tabla}_pkey"}).scalars().all()
+    foraneas = conexion.execute(text(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = to_regclass(:tabla) AND contype = 'f'"
+    ), {"tabla": tabla}).all()
+    return indices, foraneas
+
+def _reemplazar(conexion, tabla: str, columna: str, particionar: bool):
+    """Copiar la tabla a una nueva estructura (particionada o no) conservando datos y secuencia"""
+    anterior = f"{tabla}_anterior"
+    indices, foraneas = _definiciones(conexion, tabla)
+
+    conexion.execute(text(f"ALTER TABLE {tabla} RENAME TO {anterior}"))
+    conexion.execute(text(f"ALTER TABLE {anterior} RENAME CONSTRAINT {tabla}_pkey TO {anterior}_pkey"))
+    for (nombre,) in conexion.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE tablename = :tabla AND indexname <> :pk"
+    ), {"tabla": anterior, "pk": f"{anterior}_pkey"}):
+        conexion.execute(text(f"ALTER INDEX {nombre} RENAME TO {nombre}_anterior"))
+
+    if particionar:
+        conexion.execute(text(
+            f"CREATE TABLE {tabla} (LIKE {anterior} INCLUDING DEFAULTS, "
+            f"CONSTRAINT {tabla}_pkey PRIMARY KEY (id, {columna})) "
+            f"PARTITION BY RANGE ({columna})"
+        ))
+        primera = conexion.execute(text(f"SELECT min({columna}) FROM {anterior}")).scalar() or datetime.utcnow()
+        hoy = date.today()
+        _crear_particiones(conexion, tabla, min(primera.date(), hoy), _sumar_meses(hoy, MESES_ADELANTE))
+        conexion.execute(text(f"CREATE TABLE {tabla}_por_defecto PARTITION OF {tabla} DEFAULT"))
+    else:
+        conexion.execute(text(
+            f"CREATE TABLE {tabla} (LIKE {anterior} INCLUDING DEFAULTS, "
+            f"CONSTRAINT {tabla}_pkey PRIMARY KEY (id))"
+        ))
+
+    conexion.execute(text(f"INSERT INTO {tabla} SELECT * FROM {anterior}"))
+    conexion.execute(text(f"ALTER SEQUENCE {tabla}_id_seq OWNED BY {tabla}.id"))
+    conexion.execute(text(f"DROP TABLE {anterior} CASCADE"))
+
+    for definicion in indices:
+        conexion.execute(text(definicion))
+    for nombre, definicion in foraneas:
+        conexion.execute(text(f"ALTER TABLE {tabla} ADD CONSTRAINT {nombre} {definicion}"))
+
+def upgrade():
+    conexion = op.get_bind()
+    if conexion.dialect.name != "postgresql":
+        return
+    _comprobar_fechas(conexion)
+    for tabla, columna in TABLAS_PARTICIONADAS.items():
+        if not _esta_particionada(conexion, tabla):
+            _reemplazar(conexion, tabla, columna, particionar=True)
+
+def downgrade():
+    conexion = op.get_bind()
+    if conexion.dialect.name != "postgresql":
+        return
+    for tabla, columna in TABLAS_PARTICIONADAS.items():
+        if _esta_particionada(conexion, tabla):
+            _reemplazar(conexion, tabla, columna, particionar=False)
@@ -0,0 +1,37 @@
+"""Índices de trigramas (pg_trgm) para la búsqueda
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+# Tabla -> columnas buscables (ver busqueda.COLECCIONES)
+INDICES = {
+    "materias_primas": ("codigo", "nombre", "proveedor", "lote"),
+    "productos_terminados": ("codigo", "nombre", "lote"),
+    "productos": ("codigo", "nombre"),
+}
+
+def upgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for tabla, columnas in INDICES.items():
+        for columna in columnas:
+            op.execute(
+                f"CREATE INDEX IF NOT EXISTS ix_{tabla}_{columna}_trgm "
+                f"ON {tabla} USING gin ({columna} gin_trgm_ops)"
+            )
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    for tabla, columnas in INDICES.items():
+        for columna in columnas:
+            op.execute(f"DROP INDEX IF EXISTS ix_{tabla}_{columna}_trgm")
@@ -0,0 +1,28 @@
+"""Índices para los filtros de los listados de inventario
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+# Nombre del índice -> (tabla, columna); mismos nombres que genera index=True en los modelos
+INDICES = {
+    "ix_materias_primas_tipo_inventario": ("materias_primas", "tipo_inventario"),
+    "ix_materias_primas_ubicacion": ("materias_primas", "ubicacion"),
+    "ix_productos_terminados_ubicacion": ("productos_terminados", "ubicacion"),
+}
+
+def upgrade():
+    # Una base creada con create_all antes de las migraciones ya puede tenerlos
+    for nombre, (tabla, columna) in INDICES.items():
+        op.create_index(nombre, tabla, [columna], if_not_exists=True)
+
+def downgrade():
+    for nombre, (tabla, _) in INDICES.items():
+        op.drop_index(nombre, table_name=tabla, if_exists=True)
@@ -0,0 +1,18 @@
+"""Índice por fecha de gasto (gasto del mes en el resumen del dashboard)
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index("ix_gastos_fecha_gasto", "gastos", ["fecha_gasto"], if_not_exists=True)
+
+def downgrade():
+    op.drop_index("ix_gastos_fecha_gasto", table_name="gastos", if_exists=True)
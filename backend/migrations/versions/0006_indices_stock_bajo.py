@@ -0,0 +1,30 @@
+"""Índices parciales de stock bajo
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+
+Solo contienen las filas con cantidad_actual <= cantidad_minima: las consultas de
+alertas de stock bajo los recorren en lugar de la tabla completa.
+"""
+from alembic import op
+from sqlalchemy import text
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+TABLAS = ("materias_primas", "productos_terminados")
+CONDICION = "cantidad_actual <= cantidad_minima"
+
+def upgrade():
+    for tabla in TABLAS:
+        op.create_index(
+            f"ix_{tabla}_stock_bajo", tabla, ["id"], if_not_exists=True,
+            postgresql_where=text(CONDICION), sqlite_where=text(CONDICION)
+        )
+
+def downgrade():
+    for tabla in TABLAS:
+        op.drop_index(f"ix_{tabla}_stock_bajo", table_name=tabla, if_exists=True)
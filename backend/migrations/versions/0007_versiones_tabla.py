@@ -0,0 +1,27 @@
+"""Contadores de versión por tabla para los ETags
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+# Copia de etags.TABLAS_VERSIONADAS al crear la revisión
+TABLAS_VERSIONADAS = ("materias_primas", "productos_terminados", "productos", "inventarios", "gastos")
+
+def upgrade():
+    tabla = op.create_table(
+        "versiones_tabla",
+        sa.Column("tabla", sa.String(50), primary_key=True),
+        sa.Column("version", sa.Integer, nullable=False),
+    )
+    op.bulk_insert(tabla, [{"tabla": t, "version": 1} for t in TABLAS_VERSIONADAS])
+
+def downgrade():
+    op.drop_table("versiones_tabla")
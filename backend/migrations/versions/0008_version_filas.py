@@ -0,0 +1,24 @@
+"""Columna version para el control de concurrencia optimista
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+TABLAS = ("materias_primas", "productos_terminados", "productos", "gastos")
+
+def upgrade():
+    for tabla in TABLAS:
+        op.add_column(tabla, sa.Column("version", sa.Integer, nullable=False, server_default="1"))
+
+def downgrade():
+    for tabla in TABLAS:
+        with op.batch_alter_table(tabla) as batch:
+            batch.drop_column("version")
@@ -0,0 +1,22 @@
+"""Índice de fecha_vencimiento en productos terminados
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Una base creada con create_all antes de las migraciones ya puede tenerlo
+    op.create_index(
+        "ix_productos_terminados_fecha_vencimiento", "productos_terminados", ["fecha_vencimiento"],
+        if_not_exists=True
+    )
+
+def downgrade():
+    op.drop_index("ix_productos_terminados_fecha_vencimiento", table_name="productos_terminados", if_exists=True)
@@ -0,0 +1,30 @@
+"""Índices por fecha de las tablas de historial (reporte de valoración a una fecha)
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+# Nombre del índice -> (tabla, columna); mismos nombres que genera index=True en los modelos
+INDICES = {
+    "ix_movimientos_materia_prima_created_at": ("movimientos_materia_prima", "created_at"),
+    "ix_movimientos_productos_created_at": ("movimientos_productos", "created_at"),
+    "ix_historial_descuentos_materias_primas_fecha_descuento": ("historial_descuentos_materias_primas", "fecha_descuento"),
+    "ix_registros_salidas_created_at": ("registros_salidas", "created_at"),
+    "ix_asientos_stock_created_at": ("asientos_stock", "created_at"),
+}
+
+def upgrade():
+    # Una base creada con create_all antes de las migraciones ya puede tenerlos
+    for nombre, (tabla, columna) in INDICES.items():
+        op.create_index(nombre, tabla, [columna], if_not_exists=True)
+
+def downgrade():
+    for nombre, (tabla, _) in INDICES.items():
+        op.drop_index(nombre, table_name=tabla, if_exists=True)
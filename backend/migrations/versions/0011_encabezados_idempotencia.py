@@ -0,0 +1,20 @@
+"""Encabezados de las respuestas guardadas por Idempotency-Key
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column("claves_idempotencia", sa.Column("encabezados", sa.Text))
+
+def downgrade():
+    with op.batch_alter_table("claves_idempotencia") as batch:
+        batch.drop_column("encabezados")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Date, Enum, ForeignKey, Boolean, Text, Table
+from sqlalchemy import Column, Integer, String, Float, DateTime, Date, Enum, ForeignKey, Boolean, Text, Table, LargeBinary, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, date
 from database import Base
@@ -50,16 +50,19 @@ class MateriaPrima(Base):
     lote = Column(String(50))
     proveedor = Column(String(100))
     fecha_ingreso = Column(Date)
-    ubicacion = Column(String(100))
-    tipo_inventario = Column(String(50), nullable=False)  # "BPE - Magistrales" o "Fabricación de derivados"
+    ubicacion = Column(String(100), index=True)
+    tipo_inventario = Column(String(50), nullable=False, index=True)  # "BPE - Magistrales" o "Fabricación de derivados"
     created_by = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Control de concurrencia optimista
     
     # Relaciones
     created_by_user = relationship("User", back_populates="materias_primas_creadas")
     movimientos = relationship("MovimientoMateriaPrima", back_populates="materia_prima")
 
+    __mapper_args__ = {"version_id_col": version}
+
 class MovimientoMateriaPrima(Base):
     __tablename__ = "movimientos_materia_prima"
     
@@ -69,7 +72,7 @@ class MovimientoMateriaPrima(Base):
     cantidad = Column(Float, nullable=False)
     motivo = Column(String(200))
     created_by = Column(Integer, ForeignKey("users.id"))
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     
     # Relaciones
     materia_prima = relationship("MateriaPrima", back_populates="movimientos")
@@ -82,16 +85,19 @@ class Gasto(Base):
     descripcion = Column(Text)
     categoria = Column(String(50), nullable=False)  # mano_obra, servicios, mantenimiento, otros
     monto = Column(Float, nullable=False)
-    fecha_gasto = Column(DateTime, nullable=False)
+    fecha_gasto = Column(DateTime, nullable=False, index=True)
     orden_produccion = Column(String(50))
     comprobante = Column(String(100))
     created_by = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Control de concurrencia optimista
     
     # Relaciones
     created_by_user = relationship("User", back_populates="gastos_creados")
 
+    __mapper_args__ = {"version_id_col": version}
+
 class ProductoTerminado(Base):
     __tablename__ = "productos_terminados"
     
@@ -106,16 +112,19 @@ class ProductoTerminado(Base):
     precio_venta = Column(Float)
     lote = Column(String(50))
     fecha_produccion = Column(DateTime)
-    fecha_vencimiento = Column(DateTime)
-    ubicacion = Column(String(100))
+    fecha_vencimiento = Column(DateTime, index=True)
+    ubicacion = Column(String(100), index=True)
     created_by = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Control de concurrencia optimista
     
     # Relaciones
     created_by_user = relationship("User", back_populates="productos_creados")
     movimientos = relationship("MovimientoProducto", back_populates="producto")
 
+    __mapper_args__ = {"version_id_col": version}
+
 class MovimientoProducto(Base):
     __tablename__ = "movimientos_productos"
     
@@ -126,7 +135,7 @@ class MovimientoProducto(Base):
     motivo = Column(String(200))
     destino = Column(String(100))  # cliente, almacén, etc.
     created_by = Column(Integer, ForeignKey("users.id"))
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     
     # Relaciones
     producto = relationship("ProductoTerminado", back_populates="movimientos")
@@ -173,12 +182,15 @@ class Producto(Base):
     created_by = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Control de concurrencia optimista
     
     # Relaciones
     created_by_user = relationship("User")  # Sin back_populates para evitar conflicto
     inventarios = relationship("Inventario", secondary=producto_inventario, back_populates="productos")
     materias_primas = relationship("MateriaPrima", secondary=producto_materia_prima)
 
+    __mapper_args__ = {"version_id_col": version}
+
 class HistorialDescuentoMateriaPrima(Base):
     __tablename__ = "historial_descuentos_materias_primas"
     
@@ -191,7 +203,7 @@ class HistorialDescuentoMateriaPrima(Base):
     volumen_producido = Column(Float, nullable=False)
     unidad_volumen = Column(String(20), nullable=False)  # mL, unidades, etc.
     fecha_produccion = Column(DateTime, nullable=False)
-    fecha_descuento = Column(DateTime, default=datetime.utcnow)
+    fecha_descuento = Column(DateTime, default=datetime.utcnow, index=True)
     
     # Relaciones
     materia_prima = relationship("MateriaPrima")
@@ -220,10 +232,77 @@ class RegistroSalida(Base):
     saldo_actual = Column(Float, nullable=False)
     observaciones = Column(Text)
     created_by = Column(Integer, ForeignKey("users.id"))
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     
     # Relaciones
     materia_prima = relationship("MateriaPrima")
     producto_terminado = relationship("ProductoTerminado")
     usuario = relationship("User")
 
+
+class AlertaVencimiento(Base):
+    """Tabla precalculada de lotes próximos a vencer (la mantiene el escáner de vencimientos)"""
+    __tablename__ = "alertas_vencimiento"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    producto_terminado_id = Column(Integer, ForeignKey("productos_terminados.id"), nullable=False, index=True)
+    codigo = Column(String(50), nullable=False)
+    nombre = Column(String(100), nullable=False)
+    lote = Column(String(50))
+    ubicacion = Column(String(100))
+    unidad_negocio = Column(String(50), nullable=False)
+    fecha_vencimiento = Column(DateTime, nullable=False, index=True)
+    cantidad = Column(Float, nullable=False)
+    valor_en_riesgo = Column(Float, nullable=False)  # cantidad_actual * precio_produccion
+    escaneado_en = Column(DateTime, default=datetime.utcnow)
+
+class ClaveIdempotencia(Base):
+    """Respuestas guardadas por Idempotency-Key para reintentos de POST"""
+    __tablename__ = "claves_idempotencia"
+    
+    clave = Column(String(64), primary_key=True)  # sha256 de credencial + método + ruta + Idempotency-Key
+    huella = Column(String(64), nullable=False)  # sha256 del cuerpo de la solicitud
+    estado_http = Column(Integer)  # NULL mientras la solicitud original está en proceso
+    tipo_contenido = Column(String(100))
+    encabezados = Column(Text)  # JSON [[nombre, valor], ...] de la respuesta guardada
+    cuerpo = Column(LargeBinary)
+    expira_en = Column(DateTime, nullable=False, index=True)  # Fin de la reserva en proceso o del TTL
+
+class AsientoStock(Base):
+    """Libro de stock: variaciones append-only de existencias de cualquier origen"""
+    __tablename__ = "asientos_stock"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    tipo_item = Column(String(50), nullable=False)  # "materia_prima" o "producto_terminado"
+    item_id = Column(Integer, nullable=False)
+    delta = Column(Float, nullable=False)
+    origen = Column(String(30), nullable=False)  # apertura, creacion, ajuste, movimiento, salida, produccion, material_empaque
+    referencia_id = Column(Integer)  # id del movimiento, salida o producto que originó el asiento
+    created_by = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    
+    __table_args__ = (
+        Index("ix_asientos_stock_item_id", "tipo_item", "item_id", "id"),
+    )
+
+class SnapshotSaldo(Base):
+    """Saldo de un item acumulado hasta un asiento del libro de stock"""
+    __tablename__ = "snapshots_saldo"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    tipo_item = Column(String(50), nullable=False)
+    item_id = Column(Integer, nullable=False)
+    saldo = Column(Float, nullable=False)
+    ultimo_asiento_id = Column(Integer, nullable=False)
+    tomado_en = Column(DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_snapshots_saldo_item_fecha", "tipo_item", "item_id", "tomado_en"),
+    )
+
+class VersionTabla(Base):
+    """Contador por tabla que aumenta en cada transacción que la modifica (ETags de los listados)"""
+    __tablename__ = "versiones_tabla"
+    
+    tabla = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
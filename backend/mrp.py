@@ -0,0 +1,229 @@
+"""
+Motor de planeación de requerimientos de materiales (MRP)
+Carga todas las fórmulas (producto_materia_prima) y existencias en arreglos
+de NumPy una sola vez por consulta y calcula de forma vectorizada:
+- la cantidad máxima producible de cada producto con el stock actual
+- los faltantes de un plan de producción
+- la materia prima cuello de botella
+Cada componente se resuelve igual que en registrar_produccion: materia prima
+con el mismo nombre en el inventario de destino de la unidad de negocio.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import Producto, MateriaPrima, producto_materia_prima
+import produccion
+
+@dataclass
+class DatosMRP:
+    """Arreglos del MRP; las materias se indexan por posición en `materia_ids`"""
+    producto_ids: np.ndarray
+    producto_codigos: List[str]
+    producto_nombres: List[str]
+    producto_destinos: List[str]
+    materia_ids: np.ndarray
+    materia_nombres: List[str]
+    materia_tipos: List[str]
+    stock: np.ndarray
+    # Componentes de las fórmulas (formato COO): producto, materia a descontar, cantidad por unidad
+    comp_producto: np.ndarray
+    comp_materia: np.ndarray
+    comp_coeficiente: np.ndarray
+    # Componentes sin materia prima en el inventario de destino (registrar_produccion los omite)
+    sin_inventario: List[Tuple[int, str]]
+
+def cargar_datos(db: Session) -> DatosMRP:
+    """Leer productos, existencias y fórmulas en tres consultas Core (sin hidratar objetos ORM)"""
+    conexion = db.connection()
+    productos = conexion.execute(
+        select(Producto.id, Producto.codigo, Producto.nombre, Producto.unidad_negocio).order_by(Producto.id)
+    ).fetchall()
+    materias = conexion.execute(
+        select(
+            MateriaPrima.id, MateriaPrima.nombre, MateriaPrima.tipo_inventario, MateriaPrima.cantidad_actual
+        ).order_by(MateriaPrima.id)
+    ).fetchall()
+    formulas = conexion.execute(
+        select(
+            producto_materia_prima.c.producto_id,
+            producto_materia_prima.c.materia_prima_id,
+            producto_materia_prima.c.concentracion
+        )
+    ).fetchall()
+
+    producto_ids = np.fromiter((p[0] for p in productos), dtype=np.int64, count=len(productos))
+    materia_ids = np.fromiter((m[0] for m in materias), dtype=np.int64, count=len(materias))
+    stock = np.fromiter((m[3] for m in materias), dtype=np.float64, count=len(materias))
+
+    # Inventarios de destino codificados como enteros
+    destinos = [produccion.inventario_destino(p[3]) for p in productos]
+    catalogo_destinos = sorted(set(destinos))
+    codigo_destino = {d: i for i, d in enumerate(catalogo_destinos)}
+    producto_destino = np.fromiter((codigo_destino[d] for d in destinos), dtype=np.int64, count=len(destinos))
+
+    # Para cada destino y cada materia del BOM: posición de la materia que realmente se descuenta
+    # (mismo nombre en el inventario de destino, la de menor id) o -1 si no existe
+    primera = {}
+    for i, m in enumerate(materias):
+        primera.setdefault((m[1], m[2]), i)
+    resolucion = np.array(
+        [[primera.get((m[1], d), -1) for m in materias] for d in catalogo_destinos],
+        dtype=np.int64
+    ).reshape(len(catalogo_destinos), len(materias))
+
+    bom = np.array([tuple(f) for f in formulas], dtype=np.float64).reshape(-1, 3)
+    bom_producto = np.searchsorted(producto_ids, bom[:, 0].astype(np.int64))
+    bom_materia = np.searchsorted(materia_ids, bom[:, 1].astype(np.int64))
+    materia_descuento = resolucion[producto_destino[bom_producto], bom_materia] if len(bom) else np.empty(0, dtype=np.int64)
+    resuelto = materia_descuento >= 0
+
+    sin_inventario = [
+        (int(producto_ids[p]), materias[m][1])
+        for p, m in zip(bom_producto[~resuelto].tolist(), bom_materia[~resuelto].tolist())
+    ]
+
+    return DatosMRP(
+        producto_ids=producto_ids,
+        producto_codigos=[p[1] for p in productos],
+        producto_nombres=[p[2] for p in productos],
+        producto_destinos=destinos,
+        materia_ids=materia_ids,
+        materia_nombres=[m[1] for m in materias],
+        materia_tipos=[m[2] for m in materias],
+        stock=np.maximum(stock, 0),
+        comp_producto=bom_producto[resuelto],
+        comp_materia=materia_descuento[resuelto],
+        comp_coeficiente=produccion.cantidad_por_unidad(bom[resuelto, 2]),
+        sin_inventario=sin_inventario
+    )
+
+def capacidad_maxima(
+    stock: np.ndarray,
+    comp_producto: np.ndarray,
+    comp_materia: np.ndarray,
+    comp_coeficiente: np.ndarray,
+    n_productos: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cantidad máxima producible por producto (inf si no tiene componentes)
+    y el índice de la materia cuello de botella (-1 si no aplica)
+    """
+    maximo = np.full(n_productos, np.inf)
+    cuello = np.full(n_productos, -1, dtype=np.int64)
+    validos = comp_coeficiente > 0
+    if not validos.any():
+        return maximo, cuello
+
+    # Varias filas del BOM pueden resolverse a la misma materia (mismo nombre en el destino):
+    # se suman sus coeficientes, como los requerimientos acumulados de simular_produccion
+    pares, inversa = np.unique(
+        comp_producto[validos] * stock.shape[0] + comp_materia[validos], return_inverse=True
+    )
+    coeficiente = np.zeros(len(pares))
+    np.add.at(coeficiente, inversa, comp_coeficiente[validos])
+    prod = pares // stock.shape[0]
+    mat = pares % stock.shape[0]
+    capacidad = stock[mat] / coeficiente
+
+    # Ordenar por producto y capacidad: el primer componente de cada grupo es el limitante
+    orden = np.lexsort((capacidad, prod))
+    prod_ordenado = prod[orden]
+    primeros = np.flatnonzero(np.r_[True, prod_ordenado[1:] != prod_ordenado[:-1]])
+    limitantes = orden[primeros]
+
+    maximo[prod[limitantes]] = capacidad[limitantes]
+    cuello[prod[limitantes]] = mat[limitantes]
+    return maximo, cuello
+
+def requerimientos_plan(
+    stock: np.ndarray,
+    comp_producto: np.ndarray,
+    comp_materia: np.ndarray,
+    comp_coeficiente: np.ndarray,
+    plan: np.ndarray
+) -> np.ndarray:
+    """Demanda total por materia prima para un vector de cantidades por producto"""
+    return np.bincount(
+        comp_materia,
+        weights=comp_coeficiente * plan[comp_producto],
+        minlength=stock.shape[0]
+    )
+
+def _materia(datos: DatosMRP, m: int) -> Dict:
+    return {
+        "materia_prima_id": int(datos.materia_ids[m]),
+        "nombre": datos.materia_nombres[m],
+        "tipo_inventario": datos.materia_tipos[m],
+        "disponible": float(datos.stock[m])
+    }
+
+def calcular_capacidad(db: Session) -> List[Dict]:
+    """Cantidad máxima producible y cuello de botella de cada producto"""
+    datos = cargar_datos(db)
+    maximo, cuello = capacidad_maxima(
+        datos.stock, datos.comp_producto, datos.comp_materia,
+        datos.comp_coeficiente, len(datos.producto_ids)
+    )
+
+    resultado = []
+    for i, producto_id in enumerate(datos.producto_ids.tolist()):
+        resultado.append({
+            "producto_id": producto_id,
+            "codigo": datos.producto_codigos[i],
+            "nombre": datos.producto_nombres[i],
+            "inventario_destino": datos.producto_destinos[i],
+            "cantidad_maxima": None if np.isinf(maximo[i]) else float(maximo[i]),
+            "cuello_botella": _materia(datos, cuello[i]) if cuello[i] >= 0 else None
+        })
+    return resultado
+
+def calcular_plan(db: Session, items: List[Tuple[int, float]]) -> Dict:
+    """
+    Requerimientos y faltantes de un plan [(producto_id, cantidad), ...]
+    El cuello de botella es la materia con menor cobertura (disponible / requerido)
+    """
+    datos = cargar_datos(db)
+    indice_producto = {pid: i for i, pid in enumerate(datos.producto_ids.tolist())}
+
+    plan = np.zeros(len(datos.producto_ids))
+    no_encontrados = []
+    for producto_id, cantidad in items:
+        i = indice_producto.get(producto_id)
+        if i is None:
+            no_encontrados.append(producto_id)
+            continue
+        plan[i] += cantidad
+
+    requerido = requerimientos_plan(
+        datos.stock, datos.comp_producto, datos.comp_materia, datos.comp_coeficiente, plan
+    )
+    faltante = np.maximum(requerido - datos.stock, 0)
+
+    usadas = np.flatnonzero(requerido > 0)
+    cobertura = datos.stock[usadas] / requerido[usadas]
+    cuello: Optional[Dict] = None
+    factor = 1.0
+    if usadas.size:
+        k = int(np.argmin(cobertura))
+        factor = float(min(cobertura[k], 1.0))
+        cuello = {**_materia(datos, usadas[k]), "requerido": float(requerido[usadas[k]])}
+
+    planificados = set(np.flatnonzero(plan > 0).tolist())
+    return {
+        "requerimientos": [
+            {**_materia(datos, m), "requerido": float(requerido[m]), "faltante": float(faltante[m])}
+            for m in usadas.tolist()
+        ],
+        "faltantes": int(np.count_nonzero(faltante[usadas] > 0)),
+        "factor_cumplimiento": factor,
+        "cuello_botella": cuello,
+        "productos_no_encontrados": no_encontrados,
+        "componentes_sin_inventario": [
+            {"producto_id": producto_id, "materia_prima": nombre}
+            for producto_id, nombre in datos.sin_inventario
+            if indice_producto[producto_id] in planificados
+        ]
+    }
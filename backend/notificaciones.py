@@ -0,0 +1,139 @@
+"""
+Notificaciones en vivo por Server-Sent Events (SSE)
+Un hub en proceso reparte los eventos publicados en cada canal a las conexiones suscritas.
+Se puede publicar desde cualquier hilo (los endpoints síncronos y las tareas corren fuera
+del event loop); cada suscripción tiene una cola acotada y si un cliente no la vacía a
+tiempo se le cierra la conexión para que vuelva a conectarse y recargue su estado.
+"""
+import asyncio
+import json
+import os
+import threading
+from datetime import date, datetime
+from typing import AsyncIterator, Dict, Iterable, Optional, Set
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+TAMANO_COLA = int(os.getenv("NOTIFICACIONES_TAMANO_COLA", "1000"))
+INTERVALO_LATIDO = int(os.getenv("NOTIFICACIONES_LATIDO_SEGUNDOS", "15"))
+
+def _json(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+def evento(canal: str, datos, id_evento: Optional[int] = None) -> bytes:
+    """Evento SSE serializado"""
+    id_linea = f"id: {id_evento}\n" if id_evento is not None else ""
+    return f"{id_linea}event: {canal}\ndata: {json.dumps(datos, default=_json, ensure_ascii=False)}\n\n".encode()
+
+class Suscripcion:
+    def __init__(self, canales: Set[str]):
+        self.canales = canales
+        self.loop = asyncio.get_running_loop()
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=TAMANO_COLA)
+        self.desbordada = False
+
+    def _entregar(self, mensaje: bytes):
+        # Corre en el event loop de la suscripción
+        if self.desbordada:
+            return
+        try:
+            self.cola.put_nowait(mensaje)
+        except asyncio.QueueFull:
+            # Se descarta lo pendiente y se cierra la conexión: el cliente se reconecta y recarga
+            self.desbordada = True
+            while not self.cola.empty():
+                self.cola.get_nowait()
+            self.cola.put_nowait(None)
+
+    def _cerrar(self):
+        # Corre en el event loop de la suscripción: lo pendiente se envía y después se cierra
+        try:
+            self.cola.put_nowait(None)
+        except asyncio.QueueFull:
+            while not self.cola.empty():
+                self.cola.get_nowait()
+            self.cola.put_nowait(None)
+
+class Hub:
+    def __init__(self):
+        self._candado = threading.Lock()
+        self._suscripciones: Set[Suscripcion] = set()
+
+    def suscribir(self, canales: Iterable[str]) -> Suscripcion:
+        """Se llama desde el event loop que va a leer la suscripción"""
+        suscripcion = Suscripcion(set(canales))
+        with self._candado:
+            self._suscripciones.add(suscripcion)
+        return suscripcion
+
+    def cancelar(self, suscripcion: Suscripcion):
+        with self._candado:
+            self._suscripciones.discard(suscripcion)
+
+    def publicar(self, canal: str, datos: Dict, id_evento: Optional[int] = None):
+        """
+        Enviar un evento a los suscriptores de `canal` (seguro desde cualquier hilo).
+        `id_evento` es el id SSE que el cliente reenvía en Last-Event-ID al reconectar.
+        """
+        with self._candado:
+            destinos = [s for s in self._suscripciones if canal in s.canales]
+        if not destinos:
+            return
+        mensaje = evento(canal, datos, id_evento)
+        for suscripcion in destinos:
+            try:
+                suscripcion.loop.call_soon_threadsafe(suscripcion._entregar, mensaje)
+            except RuntimeError:
+                # El event loop ya se cerró
+                self.cancelar(suscripcion)
+
+    def cerrar(self):
+        """Terminar todos los flujos abiertos (el worker se detiene)"""
+        with self._candado:
+            suscripciones = list(self._suscripciones)
+        for suscripcion in suscripciones:
+            try:
+                suscripcion.loop.call_soon_threadsafe(suscripcion._cerrar)
+            except RuntimeError:
+                self.cancelar(suscripcion)
+
+    @property
+    def suscriptores(self) -> int:
+        return len(self._suscripciones)
+
+hub = Hub()
+
+async def _flujo(request: Request, suscripcion: Suscripcion, inicial: Optional[bytes]) -> AsyncIterator[bytes]:
+    try:
+        yield b"retry: 3000\n\n"
+        if inicial:
+            yield inicial
+        while True:
+            try:
+                mensaje = await asyncio.wait_for(suscripcion.cola.get(), timeout=INTERVALO_LATIDO)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                # Comentario SSE para mantener viva la conexión a través de proxies
+                yield b": latido\n\n"
+                continue
+            if mensaje is None:
+                break
+            yield mensaje
+    finally:
+        hub.cancelar(suscripcion)
+
+
+def respuesta_sse(request: Request, suscripcion: Suscripcion, inicial: Optional[bytes] = None) -> StreamingResponse:
+    """
+    Respuesta text/event-stream de una suscripción; `inicial` se envía al conectar.
+    Conviene suscribirse antes de leer el estado inicial para no perder eventos entre
+    la lectura y la suscripción (el cliente descarta los repetidos).
+    """
+    return StreamingResponse(
+        _flujo(request, suscripcion, inicial),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,191 @@
+"""
+Particionamiento mensual por rango de las tablas de historial (solo PostgreSQL)
+La conversión de las tablas la hace la migración de Alembic; este módulo crea las
+particiones de los meses siguientes (tarea periódica) y archiva particiones antiguas:
+
+    python particiones.py listar
+    python particiones.py crear [--meses 3]
+    python particiones.py archivar --antes 2024-01
+
+Archivar separa (DETACH) cada partición anterior al mes indicado, pasa sus filas al
+archivo frío del historial (archivo_historial: Parquet en ARCHIVO_DIRECTORIO, el mismo que
+consultan los endpoints de historial y la valoración) y la elimina. Las filas archivadas
+se leen con `python archivo_historial.py consultar <tabla>`.
+"""
+import argparse
+import os
+from datetime import date, datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import text, select, MetaData
+from sqlalchemy.orm import Session
+
+from database import engine, SessionLocal
+import archivo_historial
+
+# Tabla -> columna de fecha usada como llave de partición
+TABLAS_PARTICIONADAS = {
+    "movimientos_materia_prima": "created_at",
+    "movimientos_productos": "created_at",
+    "registros_salidas": "created_at",
+    "historial_descuentos_materias_primas": "fecha_descuento",
+}
+
+MESES_ADELANTE = int(os.getenv("PARTICIONES_MESES_ADELANTE", "3"))
+INTERVALO_MANTENIMIENTO = int(os.getenv("PARTICIONES_INTERVALO_SEGUNDOS", "86400"))
+
+def sumar_meses(mes: date, meses: int) -> date:
+    total = mes.year * 12 + mes.month - 1 + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+def nombre_particion(tabla: str, mes: date) -> str:
+    return f"{tabla}_{mes.year:04d}_{mes.month:02d}"
+
+def esta_particionada(bind, tabla: str) -> bool:
+    return bind.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:tabla)"),
+        {"tabla": tabla}
+    ).first() is not None
+
+def crear_particion(bind, tabla: str, mes: date) -> bool:
+    """Crear la partición [mes, mes siguiente) si no existe; retorna True si la creó"""
+    nombre = nombre_particion(tabla, mes)
+    if bind.execute(text("SELECT to_regclass(:nombre)"), {"nombre": nombre}).scalar() is not None:
+        return False
+    bind.execute(text(
+        f"CREATE TABLE {nombre} PARTITION OF {tabla} "
+        f"FOR VALUES FROM ('{mes.isoformat()}') TO ('{sumar_meses(mes, 1).isoformat()}')"
+    ))
+    return True
+
+def crear_particiones(bind, tabla: str, desde: date, hasta: date) -> int:
+    """Crear las particiones mensuales de `desde` a `hasta` (inclusive)"""
+    creadas = 0
+    mes = date(desde.year, desde.month, 1)
+    while mes <= hasta:
+        creadas += crear_particion(bind, tabla, mes)
+        mes = sumar_meses(mes, 1)
+    return creadas
+
+def crear_particiones_futuras(db: Session, meses: int = MESES_ADELANTE) -> int:
+    """Tarea periódica: asegurar las particiones del mes actual y los `meses` siguientes"""
+    if db.get_bind().dialect.name != "postgresql":
+        return 0
+    hoy = date.today()
+    creadas = 0
+    for tabla in TABLAS_PARTICIONADAS:
+        if esta_particionada(db, tabla):
+            creadas += crear_particiones(db, tabla, hoy, sumar_meses(hoy, meses))
+    db.commit()
+    return creadas
+
+def listar_particiones(bind, tabla: str) -> List[Tuple[str, Optional[date]]]:
+    """Particiones de una tabla con el mes que cubren (None para la partición por defecto)"""
+    filas = bind.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:tabla) ORDER BY c.relname"
+    ), {"tabla": tabla}).all()
+    particiones = []
+    for (nombre,) in filas:
+        sufijo = nombre[len(tabla) + 1:]
+        try:
+            mes = datetime.strptime(sufijo, "%Y_%m").date()
+        except ValueError:
+            mes = None
+        particiones.append((nombre, mes))
+    return particiones
+
+def archivar_particion(tabla: str, particion: str) -> Optional[str]:
+    """
+    Separar la partición, pasar sus filas al archivo frío y eliminarla. Las filas se leen por
+    lotes; el archivo se publica en el índice recién cuando el DROP hizo commit.
+    Retorna la ruta del archivo (None si la partición estaba vacía).
+    """
+    with engine.begin() as conexion:
+        conexion.execute(text(f"ALTER TABLE {tabla} DETACH PARTITION {particion}"))
+
+    modelo, _ = archivo_historial.TABLAS[tabla]
+    # Misma estructura que la tabla padre: los tipos (Enum, fechas) se leen igual que desde el modelo
+    separada = modelo.__table__.to_metadata(MetaData(), name=particion)
+    db = SessionLocal()
+    pendiente = None
+    try:
+        resultado = db.execute(
+            select(*separada.columns).order_by(separada.c.id),
+            execution_options={"yield_per": archivo_historial.FILAS_POR_LOTE}
+        )
+        pendiente = archivo_historial.exportar(resultado, tabla)
+        db.execute(text(f"DROP TABLE {particion}"))
+        db.commit()
+    except Exception:
+        db.rollback()
+        if pendiente is not None:
+            os.remove(pendiente)
+        raise
+    finally:
+        db.close()
+    if pendiente is None:
+        return None
+    archivo_historial.publicar(tabla, pendiente)
+    return pendiente[:-len(archivo_historial.PENDIENTE)]
+
+def archivar_anteriores(antes: date) -> List[str]:
+    """Archivar todas las particiones de meses anteriores a `antes`"""
+    archivos = []
+    with engine.connect() as conexion:
+        pendientes = [
+            (tabla, particion)
+            for tabla in TABLAS_PARTICIONADAS
+            for particion, mes in listar_particiones(conexion, tabla)
+            if mes is not None and mes < antes
+        ]
+    db = SessionLocal()
+    try:
+        # Terminar un archivado anterior interrumpido antes de agregar archivos
+        for tabla in TABLAS_PARTICIONADAS:
+            archivo_historial.recuperar(db, tabla)
+    finally:
+        db.close()
+    for tabla, particion in pendientes:
+        ruta = archivar_particion(tabla, particion)
+        if ruta is not None:
+            archivos.append(ruta)
+    return archivos
+
+def _mes(valor: str) -> date:
+    return datetime.strptime(valor, "%Y-%m").date()
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Particiones mensuales de las tablas de historial")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    comandos.add_parser("listar", help="Listar particiones por tabla")
+
+    crear = comandos.add_parser("crear", help="Crear particiones del mes actual y los siguientes")
+    crear.add_argument("--meses", type=int, default=MESES_ADELANTE)
+
+    archivar = comandos.add_parser("archivar", help="Archivar particiones anteriores a un mes")
+    archivar.add_argument("--antes", type=_mes, required=True, help="Mes AAAA-MM (no se incluye)")
+
+    args = parser.parse_args(argv)
+
+    if engine.dialect.name != "postgresql":
+        parser.error("El particionamiento requiere PostgreSQL")
+
+    if args.comando == "listar":
+        with engine.connect() as conexion:
+            for tabla in TABLAS_PARTICIONADAS:
+                print(tabla)
+                for particion, mes in listar_particiones(conexion, tabla):
+                    print(f"  {particion}" + ("" if mes else " (por defecto)"))
+    elif args.comando == "crear":
+        db = SessionLocal()
+        try:
+            print(f"Particiones creadas: {crear_particiones_futuras(db, args.meses)}")
+        finally:
+            db.close()
+    elif args.comando == "archivar":
+        for ruta in archivar_anteriores(args.antes):
+            print(f"Archivada: {ruta}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Perfil de arranque de un worker
+Mide en un intérprete nuevo (arranque en frío) cuánto tarda `import main` y los eventos de
+startup, y con `python -X importtime` reporta el tiempo de importación por paquete y de
+los módulos propios de la aplicación:
+
+    python perfil_arranque.py                          # perfil de importaciones
+    python perfil_arranque.py --top 40
+    python perfil_arranque.py --presupuesto-ms 2500    # falla (código 1) si se excede
+
+Con --presupuesto-ms se toma la mediana de varias mediciones y el proceso termina con
+error si el arranque supera el presupuesto. El presupuesto por defecto se toma de
+ARRANQUE_PRESUPUESTO_MS (2500); tests/test_arranque.py lo verifica con pytest para que una
+importación pesada nueva no pase desapercibida.
+
+Sin DATABASE_URL usa una base SQLite temporal preparada con bootstrap.py.
+"""
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, Iterator, List, Tuple
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+PRESUPUESTO_MS = int(os.getenv("ARRANQUE_PRESUPUESTO_MS", "2500"))
+
+# Se ejecuta en el proceso hijo: importación y startup, como un worker recién creado
+_MEDICION = """
+import asyncio, json, time
+inicio = time.perf_counter()
+import main
+importado = time.perf_counter()
+asyncio.run(main.app.router.startup())
+listo = time.perf_counter()
+asyncio.run(main.app.router.shutdown())
+print(json.dumps({"importacion_ms": (importado - inicio) * 1000, "listo_ms": (listo - inicio) * 1000}))
+"""
+
+def _entorno() -> Dict[str, str]:
+    # Sin tareas en segundo plano: se mide solo lo que bloquea al worker hasta quedar listo
+    return dict(os.environ, TAREAS_HABILITADAS="false")
+
+def _modulos_propios() -> set:
+    propios = {nombre[:-3] for nombre in os.listdir(DIRECTORIO) if nombre.endswith(".py")}
+    return propios | {"routers"}
+
+@contextlib.contextmanager
+def base_temporal() -> Iterator[None]:
+    """Sin DATABASE_URL, una base SQLite temporal preparada con bootstrap.py mientras dura el bloque"""
+    if "DATABASE_URL" in os.environ:
+        yield
+        return
+    temporal = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    temporal.close()
+    os.environ["DATABASE_URL"] = f"sqlite:///{temporal.name}"
+    try:
+        subprocess.run([sys.executable, "bootstrap.py"], cwd=DIRECTORIO, env=_entorno(),
+                       check=True, capture_output=True)
+        yield
+    finally:
+        del os.environ["DATABASE_URL"]
+        os.remove(temporal.name)
+
+def medir_arranque() -> Dict[str, float]:
+    """Tiempo de importación y hasta terminar el startup en un intérprete nuevo"""
+    resultado = subprocess.run(
+        [sys.executable, "-c", _MEDICION], cwd=DIRECTORIO, env=_entorno(),
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(resultado.stdout.strip().splitlines()[-1])
+
+def perfil_importaciones() -> List[Tuple[str, int, int]]:
+    """(módulo, propio µs, acumulado µs) de cada importación según -X importtime"""
+    resultado = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"], cwd=DIRECTORIO, env=_entorno(),
+        capture_output=True, text=True, check=True
+    )
+    filas = []
+    for linea in resultado.stderr.splitlines():
+        if not linea.startswith("import time:") or "[us]" in linea:
+            continue
+        propio, acumulado, modulo = linea[len("import time:"):].split("|")
+        filas.append((modulo.strip(), int(propio), int(acumulado)))
+    return filas
+
+def agrupar_por_paquete(filas: List[Tuple[str, int, int]]) -> Dict[str, int]:
+    """Tiempo propio sumado por paquete de primer nivel (fastapi, pydantic, sqlalchemy...)"""
+    propios = _modulos_propios()
+    paquetes: Dict[str, int] = {}
+    for modulo, propio, _ in filas:
+        paquete = modulo.split(".")[0]
+        if paquete in propios:
+            paquete = "(aplicación)"
+        paquetes[paquete] = paquetes.get(paquete, 0) + propio
+    return paquetes
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de arranque e importaciones de un worker")
+    parser.add_argument("--top", type=int, default=25, help="Filas por tabla")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Mediciones del arranque completo")
+    parser.add_argument("--presupuesto-ms", type=float, default=PRESUPUESTO_MS,
+                        help="Máximo aceptado para la mediana hasta quedar listo (0 = sin límite)")
+    args = parser.parse_args()
+
+    with base_temporal():
+        filas = perfil_importaciones()
+        total = max(acumulado for _, _, acumulado in filas)
+        print(f"Importaciones de main: {len(filas)} módulos, {total / 1000:.0f} ms\n")
+
+        print(f"{'paquete':<30}{'ms':>9}{'%':>7}")
+        paquetes = agrupar_por_paquete(filas)
+        for paquete, propio in sorted(paquetes.items(), key=lambda p: -p[1])[:args.top]:
+            print(f"{paquete:<30}{propio / 1000:>9.1f}{propio * 100 / total:>7.1f}")
+
+        propios = _modulos_propios()
+        print(f"\n{'módulo de la aplicación':<40}{'propio ms':>11}{'acumulado ms':>14}")
+        aplicacion = [f for f in filas if f[0].split(".")[0] in propios]
+        for modulo, propio, acumulado in sorted(aplicacion, key=lambda f: -f[2])[:args.top]:
+            print(f"{modulo:<40}{propio / 1000:>11.1f}{acumulado / 1000:>14.1f}")
+
+        mediciones = [medir_arranque() for _ in range(args.repeticiones)]
+        importacion = statistics.median(m["importacion_ms"] for m in mediciones)
+        listo = statistics.median(m["listo_ms"] for m in mediciones)
+        print(f"\nArranque en frío (mediana de {args.repeticiones}): "
+              f"import main {importacion:.0f} ms, listo {listo:.0f} ms")
+
+    if args.presupuesto_ms and listo > args.presupuesto_ms:
+        print(f"Presupuesto de arranque excedido: {listo:.0f} ms > {args.presupuesto_ms:.0f} ms")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Perfiles de muestreo por ruta (para diagnosticar endpoints lentos en producción)
+Opcional y apagado por defecto. Un hilo muestreador lee cada PERFIL_INTERVALO_MS las pilas
+de los hilos que están ejecutando el endpoint de una solicitud perfilada y las acumula por
+plantilla de ruta ("GET /api/materias-primas/{materia_id}"). Se perfila:
+
+- PERFIL_MUESTREO_N: una de cada N solicitudes, desde que empieza (0 = no)
+- PERFIL_UMBRAL_MS: las solicitudes que siguen en curso pasado este umbral; el perfil cubre
+  solo lo que ocurre después del umbral (0 = no)
+
+Las pilas se guardan en formato "colapsado" (una línea `marco;marco;marco cantidad`), el
+que usan flamegraph.pl, speedscope e inferno:
+
+    <PERFIL_DIRECTORIO>/<pid>/<ruta>.folded
+    <PERFIL_DIRECTORIO>/<pid>/resumen.json
+
+Cada worker escribe en su carpeta cada PERFIL_INTERVALO_GUARDADO_SEGUNDOS y al detenerse;
+GET /api/perfiles combina todas. Con el muestreo apagado el middleware no se instala; con
+PERFIL_MUESTREO_N el costo de una solicitud no elegida es un sorteo, y el hilo muestreador
+solo despierta mientras hay solicitudes perfiladas en curso.
+"""
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+MUESTREO_N = int(os.getenv("PERFIL_MUESTREO_N", "0"))
+UMBRAL_MS = int(os.getenv("PERFIL_UMBRAL_MS", "0"))
+INTERVALO_MS = int(os.getenv("PERFIL_INTERVALO_MS", "5"))
+DIRECTORIO = os.getenv("PERFIL_DIRECTORIO", "perfiles")
+INTERVALO_GUARDADO = int(os.getenv("PERFIL_INTERVALO_GUARDADO_SEGUNDOS", "60"))
+PROFUNDIDAD_MAXIMA = 128
+
+HABILITADO = MUESTREO_N > 0 or UMBRAL_MS > 0
+
+class _Solicitud:
+    __slots__ = ("scope", "inicio", "desde")
+
+    def __init__(self, scope, muestreada: bool):
+        self.scope = scope
+        self.inicio = time.perf_counter()
+        # Momento desde el que se toman muestras
+        self.desde = self.inicio if muestreada else self.inicio + UMBRAL_MS / 1000
+
+class _PerfilRuta:
+    __slots__ = ("solicitudes", "segundos", "pilas")
+
+    def __init__(self):
+        self.solicitudes = 0
+        self.segundos = 0.0
+        self.pilas: Counter = Counter()
+
+_activas: Dict[int, _Solicitud] = {}
+_perfiles: Dict[str, _PerfilRuta] = {}
+_candado = threading.Lock()
+_hay_activas = threading.Event()
+_hilo: Optional[threading.Thread] = None
+# Marca de tiempo del último reinicio aplicado en este worker
+_reiniciado_en = 0.0
+
+def _clave(scope) -> Optional[str]:
+    ruta = scope.get("route")
+    if ruta is None or not hasattr(ruta, "path"):
+        return None
+    return f"{scope['method']} {scope.get('root_path', '')}{ruta.path}"
+
+def _marco(frame) -> str:
+    codigo = frame.f_code
+    modulo = os.path.splitext(os.path.basename(codigo.co_filename))[0]
+    return f"{modulo}.{getattr(codigo, 'co_qualname', codigo.co_name)}"
+
+def _pila(frame, codigo_endpoint) -> Optional[str]:
+    """Pila colapsada desde el endpoint hacia adentro; None si el hilo no está en el endpoint"""
+    marcos = []
+    while frame is not None and len(marcos) < PROFUNDIDAD_MAXIMA:
+        marcos.append(_marco(frame))
+        if frame.f_code is codigo_endpoint:
+            return ";".join(reversed(marcos))
+        frame = frame.f_back
+    return None
+
+def _muestrear():
+    """Una muestra: a lo sumo una pila por solicitud activa de cada ruta"""
+    ahora = time.perf_counter()
+    with _candado:
+        pendientes: Dict[str, List] = {}
+        for solicitud in _activas.values():
+            endpoint = solicitud.scope.get("endpoint")
+            clave = _clave(solicitud.scope)
+            if ahora < solicitud.desde or clave is None or not hasattr(endpoint, "__code__"):
+                continue
+            pendientes.setdefault(clave, [endpoint.__code__, 0])[1] += 1
+    if not pendientes:
+        return
+    marcos = sys._current_frames()
+    propio = threading.get_ident()
+    muestras = []
+    for clave, (codigo, cupo) in pendientes.items():
+        for ident, frame in marcos.items():
+            if cupo == 0:
+                break
+            if ident == propio:
+                continue
+            pila = _pila(frame, codigo)
+            if pila is not None:
+                muestras.append((clave, pila))
+                cupo -= 1
+    with _candado:
+        for clave, pila in muestras:
+            _perfiles.setdefault(clave, _PerfilRuta()).pilas[pila] += 1
+
+def _bucle():
+    while True:
+        _hay_activas.wait()
+        time.sleep(INTERVALO_MS / 1000)
+        try:
+            _muestrear()
+        except Exception as e:
+            print(f"Error tomando muestras de perfil: {e}")
+
+def _asegurar_hilo():
+    global _hilo
+    if _hilo is None:
+        _hilo = threading.Thread(target=_bucle, name="perfiles", daemon=True)
+        _hilo.start()
+
+class PerfilMiddleware:
+    """Middleware ASGI que registra las solicitudes a perfilar (se ubica lo más adentro posible)"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        muestreada = MUESTREO_N > 0 and random.random() * MUESTREO_N < 1
+        if not muestreada and UMBRAL_MS <= 0:
+            return await self.app(scope, receive, send)
+
+        _asegurar_hilo()
+        solicitud = _Solicitud(scope, muestreada)
+        with _candado:
+            _activas[id(solicitud)] = solicitud
+            _hay_activas.set()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            duracion = time.perf_counter() - solicitud.inicio
+            with _candado:
+                del _activas[id(solicitud)]
+                if not _activas:
+                    _hay_activas.clear()
+                clave = _clave(scope)
+                if clave is not None and (muestreada or duracion * 1000 >= UMBRAL_MS):
+                    perfil = _perfiles.setdefault(clave, _PerfilRuta())
+                    perfil.solicitudes += 1
+                    perfil.segundos += duracion
+
+# Almacenamiento
+
+def nombre_archivo(clave: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", clave).strip("_") + ".folded"
+
+def _ruta_reinicio() -> str:
+    return os.path.join(DIRECTORIO, "reinicio")
+
+def _aplicar_reinicio():
+    """Si otro worker reinició los perfiles, descartar también los de este"""
+    global _reiniciado_en
+    try:
+        with open(_ruta_reinicio(), encoding="utf-8") as entrada:
+            marca = float(entrada.read())
+    except (FileNotFoundError, ValueError):
+        return
+    if marca > _reiniciado_en:
+        with _candado:
+            _perfiles.clear()
+        _reiniciado_en = marca
+
+def guardar(db=None) -> int:
+    """Escribir los perfiles de este worker en su carpeta (tarea periódica); retorna las rutas guardadas"""
+    _aplicar_reinicio()
+    with _candado:
+        copia = {
+            clave: (p.solicitudes, p.segundos, dict(p.pilas)) for clave, p in _perfiles.items()
+        }
+    if not copia:
+        return 0
+    carpeta = os.path.join(DIRECTORIO, str(os.getpid()))
+    os.makedirs(carpeta, exist_ok=True)
+    resumen = {}
+    for clave, (solicitudes, segundos, contadas) in copia.items():
+        archivo = nombre_archivo(clave)
+        temporal = os.path.join(carpeta, archivo + ".tmp")
+        with open(temporal, "w", encoding="utf-8") as salida:
+            for pila, cantidad in contadas.items():
+                salida.write(f"{pila} {cantidad}\n")
+        os.replace(temporal, os.path.join(carpeta, archivo))
+        resumen[clave] = {"archivo": archivo, "solicitudes": solicitudes, "segundos": segundos}
+    temporal = os.path.join(carpeta, "resumen.json.tmp")
+    with open(temporal, "w", encoding="utf-8") as salida:
+        json.dump(resumen, salida, indent=2)
+    os.replace(temporal, os.path.join(carpeta, "resumen.json"))
+    return len(resumen)
+
+def _carpetas() -> List[str]:
+    try:
+        return [os.path.join(DIRECTORIO, c) for c in os.listdir(DIRECTORIO) if c.isdigit()]
+    except FileNotFoundError:
+        return []
+
+def _combinar() -> Dict[str, Dict]:
+    """Perfiles de todos los workers: lo guardado en disco más lo que este worker tiene en memoria"""
+    guardar()
+    combinado: Dict[str, Dict] = {}
+    for carpeta in _carpetas():
+        try:
+            with open(os.path.join(carpeta, "resumen.json"), encoding="utf-8") as entrada:
+                resumen = json.load(entrada)
+        except (FileNotFoundError, ValueError):
+            continue
+        for clave, datos in resumen.items():
+            perfil = combinado.setdefault(clave, {"solicitudes": 0, "segundos": 0.0, "archivos": []})
+            perfil["solicitudes"] += datos["solicitudes"]
+            perfil["segundos"] += datos["segundos"]
+            perfil["archivos"].append(os.path.join(carpeta, datos["archivo"]))
+    return combinado
+
+def listar() -> List[Dict]:
+    """Rutas perfiladas, de la de mayor tiempo total a la de menor"""
+    rutas = []
+    for clave, perfil in _combinar().items():
+        muestras = 0
+        for archivo in perfil["archivos"]:
+            with open(archivo, encoding="utf-8") as entrada:
+                muestras += sum(int(linea.rsplit(" ", 1)[1]) for linea in entrada if linea.strip())
+        rutas.append({
+            "ruta": clave,
+            "solicitudes": perfil["solicitudes"],
+            "muestras": muestras,
+            "tiempo_total_ms": round(perfil["segundos"] * 1000, 1),
+            "tiempo_promedio_ms": round(perfil["segundos"] * 1000 / perfil["solicitudes"], 1)
+            if perfil["solicitudes"] else 0.0,
+        })
+    rutas.sort(key=lambda r: -r["tiempo_total_ms"])
+    return rutas
+
+def pilas(clave: str) -> Optional[str]:
+    """Pilas colapsadas de una ruta, sumadas entre workers (None si la ruta no tiene perfil)"""
+    perfil = _combinar().get(clave)
+    if perfil is None:
+        return None
+    total: Counter = Counter()
+    for archivo in perfil["archivos"]:
+        with open(archivo, encoding="utf-8") as entrada:
+            for linea in entrada:
+                if linea.strip():
+                    pila, cantidad = linea.rsplit(" ", 1)
+                    total[pila] += int(cantidad)
+    return "".join(f"{pila} {cantidad}\n" for pila, cantidad in total.most_common())
+
+def reiniciar():
+    """Descartar los perfiles de todos los workers (los demás lo aplican en su próximo guardado)"""
+    for carpeta in _carpetas():
+        shutil.rmtree(carpeta, ignore_errors=True)
+    os.makedirs(DIRECTORIO, exist_ok=True)
+    with open(_ruta_reinicio(), "w", encoding="utf-8") as salida:
+        salida.write(repr(time.time()))
+    _aplicar_reinicio()
@@ -0,0 +1,251 @@
+"""
+Reglas de descuento de materias primas al registrar producción
+Compartidas por el registro de producción (individual y por turno), la simulación y el motor MRP
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select, insert
+from sqlalchemy.orm import Session
+
+from models import MateriaPrima, Producto, HistorialDescuentoMateriaPrima, producto_materia_prima
+import libro_stock
+import trazas
+
+FACTOR_CORRECCION = 1.05  # 5% adicional por pérdidas de proceso
+
+class ProductoNoEncontrado(Exception):
+    """Alguna orden referencia un producto inexistente"""
+    def __init__(self, producto_id: int):
+        super().__init__(f"Producto {producto_id} no encontrado")
+        self.producto_id = producto_id
+
+class FaltanteInventario(Exception):
+    """No hay existencias suficientes; `faltantes` lista (materia, cantidad faltante)"""
+    def __init__(self, faltantes: List[Tuple[MateriaPrima, float]]):
+        super().__init__(", ".join(f"{m.nombre} en {m.tipo_inventario}" for m, _ in faltantes))
+        self.faltantes = faltantes
+
+def inventario_destino(unidad_negocio: str) -> str:
+    """Inventario del que se descuentan las materias primas según la unidad de negocio"""
+    if unidad_negocio == "BPE - Magistrales":
+        return "BPE - Magistrales"
+    # "Droguería" o "Fabricación de derivados"
+    return "Fabricación de derivados"
+
+def cantidad_por_unidad(concentracion: float) -> float:
+    """Cantidad de materia prima por unidad producida: concentración (%P/V) * 1.05"""
+    return (concentracion / 100) * FACTOR_CORRECCION
+
+def cantidad_a_descontar(concentracion: float, cantidad: float) -> float:
+    """Fórmula: concentración (%P/V) * volumen_producido * 1.05"""
+    return cantidad_por_unidad(concentracion) * cantidad
+
+def cargar_formulas(db: Session, producto_ids: Iterable[int]) -> Tuple[Dict[int, Producto], Dict[int, List[Tuple[str, float]]]]:
+    """Productos y sus fórmulas [(nombre materia prima, concentración)] en dos consultas"""
+    ids = set(producto_ids)
+    productos = {p.id: p for p in db.query(Producto).filter(Producto.id.in_(ids)).all()}
+    formulas: Dict[int, List[Tuple[str, float]]] = defaultdict(list)
+    filas = db.execute(
+        select(
+            producto_materia_prima.c.producto_id,
+            MateriaPrima.nombre,
+            producto_materia_prima.c.concentracion
+        ).join(MateriaPrima, MateriaPrima.id == producto_materia_prima.c.materia_prima_id)
+        .where(producto_materia_prima.c.producto_id.in_(ids))
+        .order_by(producto_materia_prima.c.producto_id, producto_materia_prima.c.materia_prima_id)
+    )
+    for producto_id, nombre, concentracion in filas:
+        formulas[producto_id].append((nombre, concentracion))
+    return productos, formulas
+
+def cargar_materias_destino(db: Session, claves: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], MateriaPrima]:
+    """
+    Materias primas a descontar por (nombre, inventario de destino) en una sola consulta,
+    que sirve como foto consistente de las existencias. No toma bloqueos.
+    """
+    claves = set(claves)
+    if not claves:
+        return {}
+    nombres = {nombre for nombre, _ in claves}
+    destinos = {destino for _, destino in claves}
+    materias = {}
+    candidatas = db.query(MateriaPrima).filter(
+        MateriaPrima.nombre.in_(nombres),
+        MateriaPrima.tipo_inventario.in_(destinos)
+    ).order_by(MateriaPrima.id).all()
+    for materia in candidatas:
+        clave = (materia.nombre, materia.tipo_inventario)
+        if clave in claves:
+            materias.setdefault(clave, materia)
+    return materias
+
+def descuentos_orden(
+    producto: Producto,
+    formula: List[Tuple[str, float]],
+    cantidad: float,
+    materias: Dict[Tuple[str, str], MateriaPrima]
+) -> Tuple[List[Tuple[MateriaPrima, float, float]], List[str]]:
+    """
+    Descuentos [(materia, concentración, cantidad a descontar)] de una orden
+    y los componentes sin materia prima en el inventario de destino
+    """
+    destino = inventario_destino(producto.unidad_negocio)
+    descuentos, sin_inventario = [], []
+    for nombre, concentracion in formula:
+        materia = materias.get((nombre, destino))
+        if materia is None:
+            sin_inventario.append(nombre)
+            continue
+        descuentos.append((materia, concentracion, cantidad_a_descontar(concentracion, cantidad)))
+    return descuentos, sin_inventario
+
+def simular_produccion(db: Session, ordenes: List[Tuple[int, float]]) -> Dict:
+    """
+    Calcula, sin modificar ni bloquear nada, los descuentos de cada orden contra la
+    misma foto de existencias. Cada orden se evalúa por separado; `consolidado`
+    muestra el efecto de ejecutarlas todas.
+    """
+    productos, formulas = cargar_formulas(db, [producto_id for producto_id, _ in ordenes])
+    claves = {
+        (nombre, inventario_destino(productos[producto_id].unidad_negocio))
+        for producto_id in productos
+        for nombre, _ in formulas[producto_id]
+    }
+    materias = cargar_materias_destino(db, claves)
+
+    resultados = []
+    total: Dict[int, float] = defaultdict(float)
+    for producto_id, cantidad in ordenes:
+        producto = productos.get(producto_id)
+        if producto is None:
+            resultados.append({"producto_id": producto_id, "cantidad": cantidad, "viable": False,
+                               "error": "Producto no encontrado"})
+            continue
+
+        descuentos, sin_inventario = descuentos_orden(producto, formulas[producto_id], cantidad, materias)
+        requerido: Dict[int, float] = defaultdict(float)
+        for materia, _, descontar in descuentos:
+            requerido[materia.id] += descontar
+            total[materia.id] += descontar
+
+        detalle = [
+            {
+                "materia_prima_id": materia.id,
+                "nombre": materia.nombre,
+                "lote": materia.lote,
+                "concentracion": concentracion,
+                "cantidad_a_descontar": descontar,
+                "disponible": materia.cantidad_actual,
+                "saldo_resultante": materia.cantidad_actual - requerido[materia.id]
+            }
+            for materia, concentracion, descontar in descuentos
+        ]
+        afectadas = {materia.id: materia for materia, _, _ in descuentos}
+        faltantes = [
+            {"materia_prima_id": materia_id, "nombre": afectadas[materia_id].nombre,
+             "faltante": cantidad_requerida - afectadas[materia_id].cantidad_actual}
+            for materia_id, cantidad_requerida in requerido.items()
+            if cantidad_requerida > afectadas[materia_id].cantidad_actual
+        ]
+        resultados.append({
+            "producto_id": producto_id,
+            "producto_nombre": producto.nombre,
+            "cantidad": cantidad,
+            "inventario_destino": inventario_destino(producto.unidad_negocio),
+            "descuentos": detalle,
+            "faltantes": faltantes,
+            "componentes_sin_inventario": sin_inventario,
+            "viable": not faltantes
+        })
+
+    por_id = {materia.id: materia for materia in materias.values()}
+    consolidado = [
+        {
+            "materia_prima_id": materia_id,
+            "nombre": por_id[materia_id].nombre,
+            "lote": por_id[materia_id].lote,
+            "requerido": requerido_total,
+            "disponible": por_id[materia_id].cantidad_actual,
+            "faltante": max(requerido_total - por_id[materia_id].cantidad_actual, 0.0)
+        }
+        for materia_id, requerido_total in sorted(total.items())
+    ]
+    return {
+        "ordenes": resultados,
+        "consolidado": consolidado,
+        "viable": all(r["viable"] for r in resultados) and not any(c["faltante"] > 0 for c in consolidado)
+    }
+
+def bloquear_materias(db: Session, materia_ids: Iterable[int]) -> Dict[int, MateriaPrima]:
+    """
+    Bloquear (SELECT ... FOR UPDATE) cada materia prima una sola vez, en orden de id
+    para evitar interbloqueos entre transacciones concurrentes, y recargar sus existencias
+    """
+    ids = sorted(set(materia_ids))
+    if not ids:
+        return {}
+    materias = db.query(MateriaPrima).filter(
+        MateriaPrima.id.in_(ids)
+    ).order_by(MateriaPrima.id).with_for_update().populate_existing().all()
+    return {materia.id: materia for materia in materias}
+
+def registrar_producciones(db: Session, producciones: List, usuario_id: Optional[int] = None) -> List[str]:
+    """
+    Registrar varias producciones en la transacción actual (sin commit):
+    agrega la demanda por materia prima, bloquea cada fila una vez, valida todos los
+    faltantes, aplica un descuento consolidado por materia y escribe el historial en bloque.
+    Retorna el inventario de destino utilizado por cada producción.
+    """
+    with trazas.span("produccion.cargar_formulas", ordenes=len(producciones)):
+        productos, formulas = cargar_formulas(db, [p.producto_id for p in producciones])
+    for p in producciones:
+        if p.producto_id not in productos:
+            raise ProductoNoEncontrado(p.producto_id)
+
+    claves = {
+        (nombre, inventario_destino(productos[producto_id].unidad_negocio))
+        for producto_id in productos
+        for nombre, _ in formulas[producto_id]
+    }
+    with trazas.span("produccion.bloquear_materias", materias=len(claves)):
+        resueltas = cargar_materias_destino(db, claves)
+        bloqueadas = bloquear_materias(db, [materia.id for materia in resueltas.values()])
+    materias = {clave: bloqueadas[materia.id] for clave, materia in resueltas.items() if materia.id in bloqueadas}
+
+    demanda: Dict[int, float] = defaultdict(float)
+    historial = []
+    destinos = []
+    ahora = datetime.utcnow()
+    for p in producciones:
+        producto = productos[p.producto_id]
+        destinos.append(inventario_destino(producto.unidad_negocio))
+        descuentos, _ = descuentos_orden(producto, formulas[p.producto_id], p.cantidad, materias)
+        for materia, concentracion, descontar in descuentos:
+            demanda[materia.id] += descontar
+            historial.append({
+                "materia_prima_id": materia.id,
+                "producto_id": producto.id,
+                "producto_nombre": producto.nombre,
+                "cantidad_descontada": descontar,  # En gramos
+                "concentracion": concentracion,  # %P/V
+                "volumen_producido": p.cantidad,
+                "unidad_volumen": "mL",  # Asumiendo que es mL por defecto
+                "fecha_produccion": p.fecha_produccion or ahora,
+                "fecha_descuento": ahora
+            })
+
+    faltantes = [
+        (bloqueadas[materia_id], requerido - bloqueadas[materia_id].cantidad_actual)
+        for materia_id, requerido in sorted(demanda.items())
+        if bloqueadas[materia_id].cantidad_actual < requerido
+    ]
+    if faltantes:
+        raise FaltanteInventario(faltantes)
+
+    with trazas.span("produccion.descontar", materias=len(demanda), historial=len(historial)):
+        for materia_id, requerido in demanda.items():
+            libro_stock.registrar_delta(db, bloqueadas[materia_id], -requerido, "produccion", usuario_id=usuario_id)
+        if historial:
+            db.execute(insert(HistorialDescuentoMateriaPrima), historial)
+    return destinos
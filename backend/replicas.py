@@ -0,0 +1,148 @@
+"""
+Lecturas en la réplica para los endpoints de reportes
+Los endpoints pesados de solo lectura (historial de salidas, reporte de gastos por
+categoría, historial de descuentos, alertas de stock bajo y los datos del chat de IA) usan
+`get_db_lectura`: leen de DATABASE_REPLICA_URL cuando la réplica está al día y del
+primario en otro caso. Sin DATABASE_REPLICA_URL todo va al primario.
+
+- Retraso: cada REPLICA_INTERVALO_SEGUNDOS se comparan los contadores de `versiones_tabla`
+  (los mismos de los ETags) del primario y de la réplica. El retraso es el tiempo desde la
+  última medición del primario que la réplica ya alcanzó; si supera
+  REPLICA_RETRASO_MAXIMO_SEGUNDOS, o la réplica no responde, se lee del primario.
+- Leer lo propio: la respuesta a una solicitud que confirmó cambios lleva la cookie
+  `lectura_primaria` por REPLICA_PEGADO_SEGUNDOS (por defecto el retraso máximo más un
+  intervalo); mientras el cliente la envíe, sus lecturas van al primario. Al ser una cookie
+  vale para todos los workers.
+
+Las respuestas de estos endpoints llevan `X-Origen-Lectura: replica | primaria`.
+"""
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, Optional
+from fastapi import Request, Response
+from sqlalchemy import select, event
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, SessionReplica
+from models import VersionTabla
+
+INTERVALO_MEDICION = int(os.getenv("REPLICA_INTERVALO_SEGUNDOS", "2"))
+RETRASO_MAXIMO = float(os.getenv("REPLICA_RETRASO_MAXIMO_SEGUNDOS", "10"))
+PEGADO_SEGUNDOS = int(os.getenv("REPLICA_PEGADO_SEGUNDOS", str(int(RETRASO_MAXIMO) + INTERVALO_MEDICION)))
+COOKIE = "lectura_primaria"
+
+HABILITADO = SessionReplica is not None
+
+# Último estado medido (None hasta la primera medición: se lee del primario)
+estado: Dict[str, Optional[float]] = {"retraso": None, "medido_en": None}
+_mediciones: deque = deque(maxlen=1000)  # (momento, versiones del primario)
+_candado = threading.Lock()
+
+def _versiones(db: Session) -> Dict[str, int]:
+    return dict(db.execute(select(VersionTabla.tabla, VersionTabla.version)).all())
+
+def _alcanza(replica: Dict[str, int], primario: Dict[str, int]) -> bool:
+    return all(replica.get(tabla, 0) >= version for tabla, version in primario.items())
+
+def medir_retraso(db: Session) -> Optional[float]:
+    """Tarea periódica: retraso estimado de la réplica en segundos (None si no responde)"""
+    ahora = time.time()
+    primario = _versiones(db)
+    replica_db = SessionReplica()
+    try:
+        replica = _versiones(replica_db)
+    except Exception as e:
+        print(f"Réplica no disponible: {e}")
+        replica = None
+    finally:
+        replica_db.close()
+
+    with _candado:
+        _mediciones.append((ahora, primario))
+        if replica is None:
+            retraso = None
+        else:
+            # La medición más reciente que la réplica ya contiene marca hasta cuándo está al día
+            alcanzada = None
+            for momento, versiones in _mediciones:
+                if _alcanza(replica, versiones):
+                    alcanzada = momento
+            if alcanzada is None:
+                retraso = ahora - _mediciones[0][0]
+            else:
+                retraso = ahora - alcanzada
+                while _mediciones[0][0] < alcanzada:
+                    _mediciones.popleft()
+        estado["retraso"] = retraso
+        estado["medido_en"] = ahora
+    return retraso
+
+def replica_disponible() -> bool:
+    retraso, medido_en = estado["retraso"], estado["medido_en"]
+    if not HABILITADO or retraso is None or medido_en is None:
+        return False
+    # Una medición vieja (tareas detenidas) no sirve para decidir
+    if time.time() - medido_en > max(3 * INTERVALO_MEDICION, RETRASO_MAXIMO):
+        return False
+    return retraso <= RETRASO_MAXIMO
+
+def get_db_lectura(request: Request, response: Response):
+    """Sesión para lecturas de reportes: réplica si está al día y el cliente no escribió hace poco"""
+    if replica_disponible() and COOKIE not in request.cookies:
+        db = SessionReplica()
+        response.headers["X-Origen-Lectura"] = "replica"
+    else:
+        db = SessionLocal()
+        response.headers["X-Origen-Lectura"] = "primaria"
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Leer lo propio: marcar las solicitudes que confirmaron cambios en el primario
+
+_escrituras: ContextVar[Optional[dict]] = ContextVar("escrituras_solicitud", default=None)
+_CLAVE_PENDIENTE = "replicas_hubo_escritura"
+
+def _registrar_escritura(session: Session, contexto):
+    session.info[_CLAVE_PENDIENTE] = True
+
+def _confirmar_escritura(session: Session):
+    if session.info.pop(_CLAVE_PENDIENTE, False):
+        # El contexto del endpoint (aunque corra en el threadpool) comparte este dict con el middleware
+        solicitud = _escrituras.get()
+        if solicitud is not None:
+            solicitud["escribio"] = True
+
+def _descartar(session: Session):
+    session.info.pop(_CLAVE_PENDIENTE, None)
+
+if HABILITADO:
+    event.listen(SessionLocal, "after_flush", _registrar_escritura)
+    event.listen(SessionLocal, "after_commit", _confirmar_escritura)
+    event.listen(SessionLocal, "after_rollback", _descartar)
+
+class LecturaPropiaMiddleware:
+    """Middleware ASGI que agrega la cookie `lectura_primaria` a las respuestas de solicitudes que escribieron"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            return await self.app(scope, receive, send)
+        solicitud = {"escribio": False}
+        token = _escrituras.set(solicitud)
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start" and solicitud["escribio"]:
+                cookie = f"{COOKIE}=1; Max-Age={PEGADO_SEGUNDOS}; Path=/; HttpOnly; SameSite=Lax"
+                mensaje["headers"] = list(mensaje.get("headers", [])) + [(b"set-cookie", cookie.encode())]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _escrituras.reset(token)
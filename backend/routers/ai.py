@@ -5,7 +5,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
 from typing import Optional, Dict
 from sqlalchemy.orm import Session
-from database import get_db
+from replicas import get_db_lectura
 from auth import get_current_user
 from models import User, MateriaPrima, ProductoTerminado, Gasto
 from deepseek_service import chat_with_deepseek, clear_conversation, get_conversation_context
@@ -66,7 +66,7 @@ def get_production_data(db: Session) -> Optional[Dict]:
 async def chat_endpoint(
     chat_input: ChatMessage,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db_lectura)
 ):
     """
     Endpoint para chat con Deepseek
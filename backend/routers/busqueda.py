@@ -0,0 +1,32 @@
+"""
+Router de búsqueda (typeahead y difusa) sobre materias primas, productos terminados y productos
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from database import get_db
+from models import User
+from schemas import BusquedaResponse
+from auth import can_view_inventory
+import busqueda
+
+router = APIRouter()
+
+@router.get("/", response_model=BusquedaResponse)
+def buscar(
+    q: str = Query(..., min_length=1, max_length=100),
+    tipos: Optional[List[str]] = Query(None),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(can_view_inventory),
+    db: Session = Depends(get_db)
+):
+    """
+    Buscar por nombre, código, proveedor y lote con coincidencia por prefijo y difusa.
+    `tipos` limita la búsqueda a materia_prima, producto_terminado y/o producto.
+    """
+    invalidos = [t for t in tipos or [] if t not in busqueda.COLECCIONES]
+    if invalidos:
+        raise HTTPException(status_code=400, detail=f"Tipos no válidos: {', '.join(invalidos)}")
+    return busqueda.buscar(db, q, tipos, skip, limit)
@@ -0,0 +1,21 @@
+"""
+Router del resumen del dashboard
+"""
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from database import get_db
+from models import User
+from schemas import DashboardResumenResponse
+from auth import can_view_inventory
+import dashboard
+
+router = APIRouter()
+
+@router.get("/summary", response_model=DashboardResumenResponse)
+def get_resumen(
+    current_user: User = Depends(can_view_inventory),
+    db: Session = Depends(get_db)
+):
+    """Existencias, stock bajo, valor del inventario, lotes por vencer, gasto del mes y salidas recientes"""
+    return dashboard.resumen(db)
@@ -0,0 +1,50 @@
+"""
+Router de escaneo de códigos de barras y lotes (servido desde el índice en memoria)
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import Session
+
+from database import get_db
+from models import User
+from schemas import EscaneoMultipleInput
+from auth import can_view_inventory
+import indice_escaneo
+
+router = APIRouter()
+
+PATRON_POR = "^(auto|codigo|lote)$"
+
+@router.post("/multiple")
+def escanear_multiple(
+    escaneo: EscaneoMultipleInput,
+    por: str = Query("auto", pattern=PATRON_POR),
+    current_user: User = Depends(can_view_inventory),
+    db: Session = Depends(get_db)
+):
+    """
+    Buscar muchos códigos o lotes en una solicitud (sincronización de lectores portátiles).
+    Retorna una entrada por valor, en el mismo orden; los no encontrados tienen items vacío.
+    """
+    indice_escaneo.asegurar_cargado(db)
+    cuerpos = [
+        indice_escaneo.respuesta(valor, indice_escaneo.indice.buscar(valor, por))
+        for valor in escaneo.valores
+    ]
+    return Response(content=b'{"resultados":[' + b",".join(cuerpos) + b"]}", media_type="application/json")
+
+@router.get("/{valor}")
+def escanear(
+    valor: str,
+    por: str = Query("auto", pattern=PATRON_POR),
+    current_user: User = Depends(can_view_inventory),
+    db: Session = Depends(get_db)
+):
+    """
+    Item, lote, saldo y vencimiento para un código escaneado.
+    Con por=auto se busca por código y, si no hay coincidencias, por lote.
+    """
+    indice_escaneo.asegurar_cargado(db)
+    cuerpos = indice_escaneo.indice.buscar(valor, por)
+    if not cuerpos:
+        raise HTTPException(status_code=404, detail="Código no encontrado")
+    return Response(content=indice_escaneo.respuesta(valor, cuerpos), media_type="application/json")
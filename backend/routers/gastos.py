@@ -1,36 +1,41 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 
 from database import get_db
+from replicas import get_db_lectura
 from models import User, Gasto
 from schemas import GastoResponse, GastoCreate, GastoUpdate
 from auth import can_view_inventory, can_manage_expenses
+import etags
+import listados
+import concurrencia
 
 router = APIRouter()
 
+CAMPOS_LISTADO = list(GastoResponse.model_fields)
+
 @router.get("/", response_model=List[GastoResponse])
 def list_gastos(
     skip: int = 0,
     limit: int = 100,
     categoria: str = None,
     current_user: User = Depends(can_view_inventory),
+    etag: str = Depends(etags.etag_tablas("gastos")),
     db: Session = Depends(get_db)
 ):
     """Listar todos los gastos de producción"""
-    query = db.query(Gasto)
-    
+    condiciones = []
     if categoria:
-        query = query.filter(Gasto.categoria == categoria)
-    
-    gastos = query.offset(skip).limit(limit).all()
-    return gastos
+        condiciones.append(Gasto.categoria == categoria)
+    return listados.listar(db, Gasto, condiciones, None, None, skip, limit, CAMPOS_LISTADO, (), etag)
 
 @router.get("/{gasto_id}", response_model=GastoResponse)
 def get_gasto(
     gasto_id: int,
     current_user: User = Depends(can_view_inventory),
+    etag: str = Depends(etags.etag_fila(Gasto)),
     db: Session = Depends(get_db)
 ):
     """Obtener un gasto por ID"""
@@ -59,6 +64,7 @@ def create_gasto(
 def update_gasto(
     gasto_id: int,
     gasto_update: GastoUpdate,
+    if_match: Optional[str] = Header(None),
     current_user: User = Depends(can_manage_expenses),
     db: Session = Depends(get_db)
 ):
@@ -71,6 +77,7 @@ def update_gasto(
         )
     
     update_data = gasto_update.model_dump(exclude_unset=True)
+    concurrencia.comprobar(gasto, concurrencia.version_esperada(if_match, update_data.pop("version", None)))
     for field, value in update_data.items():
         setattr(gasto, field, value)
     
@@ -101,9 +108,9 @@ def reporte_por_categoria(
     fecha_inicio: datetime = None,
     fecha_fin: datetime = None,
     current_user: User = Depends(can_view_inventory),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db_lectura)
 ):
-    """Obtener reporte de gastos agrupados por categoría"""
+    """Obtener reporte de gastos agrupados por categoría (réplica de lectura si está disponible)"""
     query = db.query(Gasto)
     
     if fecha_inicio:
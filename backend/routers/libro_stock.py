@@ -0,0 +1,71 @@
+"""
+Router para consultar el libro de stock (asientos, saldos históricos y desviaciones)
+"""
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import datetime
+
+from database import get_db
+from models import User, AsientoStock
+from schemas import AsientoStockResponse, SaldoLibroResponse, DesviacionLibroResponse
+from auth import can_view_inventory, can_modify_inventory
+import libro_stock
+
+router = APIRouter()
+
+PATRON_TIPO = "^(materia_prima|producto_terminado)$"
+
+@router.get("/saldo", response_model=SaldoLibroResponse)
+def saldo_en_fecha(
+    tipo_item: str = Query(..., pattern=PATRON_TIPO),
+    item_id: int = Query(...),
+    fecha: Optional[datetime] = None,
+    current_user: User = Depends(can_view_inventory),
+    db: Session = Depends(get_db)
+):
+    """Saldo de un item en una fecha (por defecto ahora) a partir del último snapshot"""
+    return libro_stock.saldo_en(db, tipo_item, item_id, fecha)
+
+@router.get("/asientos", response_model=List[AsientoStockResponse])
+def listar_asientos(
+    tipo_item: Optional[str] = Query(None, pattern=PATRON_TIPO),
+    item_id: Optional[int] = None,
+    origen: Optional[str] = None,
+    fecha_inicio: Optional[datetime] = None,
+    fecha_fin: Optional[datetime] = None,
+    skip: int = 0,
+    limit: int = 100,
+    current_user: User = Depends(can_view_inventory),
+    db: Session = Depends(get_db)
+):
+    """Listar asientos del libro, del más reciente al más antiguo"""
+    query = db.query(AsientoStock)
+    if tipo_item:
+        query = query.filter(AsientoStock.tipo_item == tipo_item)
+    if item_id is not None:
+        query = query.filter(AsientoStock.item_id == item_id)
+    if origen:
+        query = query.filter(AsientoStock.origen == origen)
+    if fecha_inicio:
+        query = query.filter(AsientoStock.created_at >= fecha_inicio)
+    if fecha_fin:
+        query = query.filter(AsientoStock.created_at <= fecha_fin)
+    return query.order_by(AsientoStock.id.desc()).offset(skip).limit(limit).all()
+
+@router.get("/desviaciones", response_model=List[DesviacionLibroResponse])
+def listar_desviaciones(
+    current_user: User = Depends(can_view_inventory),
+    db: Session = Depends(get_db)
+):
+    """Items cuya cantidad_actual no coincide con el saldo reconstruido del libro"""
+    return libro_stock.detectar_desviaciones(db)
+
+@router.post("/snapshots")
+def tomar_snapshots(
+    current_user: User = Depends(can_modify_inventory),
+    db: Session = Depends(get_db)
+):
+    """Forzar la toma de snapshots"""
+    total = libro_stock.tomar_snapshots(db)
+    return {"snapshots": total}
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import datetime
 
 from database import get_db
+from replicas import get_db_lectura
 from models import User, MateriaPrima, MovimientoMateriaPrima, HistorialDescuentoMateriaPrima
 from schemas import (
     MateriaPrimaResponse, 
@@ -13,24 +15,52 @@ from schemas import (
     HistorialDescuentoResponse
 )
 from auth import can_view_inventory, can_modify_inventory
+import libro_stock
+import archivo_historial
+import listados
+import etags
+import concurrencia
+import stock_bajo as servicio_stock_bajo
 
 router = APIRouter()
 
+CAMPOS_LISTADO = list(MateriaPrimaResponse.model_fields)
+ORDENABLES = (
+    "id", "codigo", "nombre", "cantidad_actual", "cantidad_minima", "lote", "proveedor",
+    "fecha_ingreso", "tipo_inventario", "ubicacion", "created_at", "updated_at"
+)
+
 @router.get("/", response_model=List[MateriaPrimaResponse])
 def list_materias_primas(
     skip: int = 0,
     limit: int = 100,
+    tipo_inventario: Optional[str] = None,
+    ubicacion: Optional[str] = None,
+    stock_bajo: Optional[bool] = None,
+    sort: Optional[str] = Query(None, description="Campos separados por coma; prefijo - para descendente"),
+    fields: Optional[str] = Query(None, description="Campos a retornar separados por coma"),
     current_user: User = Depends(can_view_inventory),
+    etag: str = Depends(etags.etag_tablas("materias_primas")),
     db: Session = Depends(get_db)
 ):
-    """Listar todas las materias primas"""
-    materias = db.query(MateriaPrima).offset(skip).limit(limit).all()
-    return materias
+    """Listar materias primas con filtros, orden y selección de campos"""
+    condiciones = []
+    if tipo_inventario:
+        condiciones.append(MateriaPrima.tipo_inventario == tipo_inventario)
+    if ubicacion:
+        condiciones.append(MateriaPrima.ubicacion == ubicacion)
+    if stock_bajo is not None:
+        bajo = MateriaPrima.cantidad_actual <= MateriaPrima.cantidad_minima
+        condiciones.append(bajo if stock_bajo else ~bajo)
+    return listados.listar(
+        db, MateriaPrima, condiciones, fields, sort, skip, limit, CAMPOS_LISTADO, ORDENABLES, etag
+    )
 
 @router.get("/{materia_id}", response_model=MateriaPrimaResponse)
 def get_materia_prima(
     materia_id: int,
     current_user: User = Depends(can_view_inventory),
+    etag: str = Depends(etags.etag_fila(MateriaPrima)),
     db: Session = Depends(get_db)
 ):
     """Obtener una materia prima por ID"""
@@ -49,8 +79,12 @@ def create_materia_prima(
     db: Session = Depends(get_db)
 ):
     """Crear una nueva materia prima"""
-    db_materia = MateriaPrima(**materia.model_dump(), created_by=current_user.id)
+    materia_data = materia.model_dump()
+    cantidad_inicial = materia_data.pop("cantidad_actual")
+    db_materia = MateriaPrima(**materia_data, cantidad_actual=cantidad_inicial, created_by=current_user.id)
     db.add(db_materia)
+    db.flush()
+    libro_stock.registrar_alta(db, db_materia, usuario_id=current_user.id)
     db.commit()
     db.refresh(db_materia)
     return db_materia
@@ -59,6 +93,7 @@ def create_materia_prima(
 def update_materia_prima(
     materia_id: int,
     materia_update: MateriaPrimaUpdate,
+    if_match: Optional[str] = Header(None),
     current_user: User = Depends(can_modify_inventory),
     db: Session = Depends(get_db)
 ):
@@ -71,9 +106,15 @@ def update_materia_prima(
         )
     
     update_data = materia_update.model_dump(exclude_unset=True)
+    concurrencia.comprobar(materia, concurrencia.version_esperada(if_match, update_data.pop("version", None)))
+    cantidad = update_data.pop("cantidad_actual", None)
     for field, value in update_data.items():
         setattr(materia, field, value)
     
+    # La cantidad se ajusta a través del libro de stock
+    if cantidad is not None:
+        libro_stock.fijar_cantidad(db, materia, cantidad, usuario_id=current_user.id)
+    
     db.commit()
     db.refresh(materia)
     return materia
@@ -103,23 +144,20 @@ def create_movimiento(
     db: Session = Depends(get_db)
 ):
     """Registrar un movimiento de materia prima (entrada/salida)"""
-    materia = db.query(MateriaPrima).filter(MateriaPrima.id == movimiento.materia_prima_id).first()
+    # Bloquear la fila: el movimiento no lleva versión del cliente y no debe fallar con 409
+    materia = db.query(MateriaPrima).filter(MateriaPrima.id == movimiento.materia_prima_id).with_for_update().first()
     if not materia:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Materia prima no encontrada"
         )
     
-    # Actualizar cantidad según el tipo de movimiento
-    if movimiento.tipo == "entrada":
-        materia.cantidad_actual += movimiento.cantidad
-    elif movimiento.tipo == "salida":
-        if materia.cantidad_actual < movimiento.cantidad:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Cantidad insuficiente en inventario"
-            )
-        materia.cantidad_actual -= movimiento.cantidad
+    # Validar cantidad según el tipo de movimiento
+    if movimiento.tipo == "salida" and materia.cantidad_actual < movimiento.cantidad:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cantidad insuficiente en inventario"
+        )
     
     # Crear el registro de movimiento
     db_movimiento = MovimientoMateriaPrima(
@@ -127,6 +165,13 @@ def create_movimiento(
         created_by=current_user.id
     )
     db.add(db_movimiento)
+    db.flush()
+    
+    # Actualizar cantidad a través del libro de stock
+    delta = movimiento.cantidad if movimiento.tipo == "entrada" else -movimiento.cantidad
+    libro_stock.registrar_delta(
+        db, materia, delta, "movimiento", referencia_id=db_movimiento.id, usuario_id=current_user.id
+    )
     db.commit()
     db.refresh(db_movimiento)
     
@@ -135,35 +180,48 @@ def create_movimiento(
 @router.get("/movimientos/{materia_id}", response_model=List[MovimientoMateriaPrimaResponse])
 def list_movimientos(
     materia_id: int,
+    fecha_inicio: Optional[datetime] = None,
+    fecha_fin: Optional[datetime] = None,
     skip: int = 0,
     limit: int = 100,
     current_user: User = Depends(can_view_inventory),
     db: Session = Depends(get_db)
 ):
-    """Listar movimientos de una materia prima"""
-    movimientos = db.query(MovimientoMateriaPrima).filter(
+    """Listar movimientos de una materia prima (el rango de fechas limita las particiones leídas)"""
+    query = db.query(MovimientoMateriaPrima).filter(
         MovimientoMateriaPrima.materia_prima_id == materia_id
-    ).offset(skip).limit(limit).all()
-    return movimientos
+    )
+    if fecha_inicio:
+        query = query.filter(MovimientoMateriaPrima.created_at >= fecha_inicio)
+    if fecha_fin:
+        query = query.filter(MovimientoMateriaPrima.created_at <= fecha_fin)
+    movimientos = query.order_by(MovimientoMateriaPrima.created_at.desc()).offset(skip).limit(limit).all()
+    
+    # Las filas de particiones archivadas son más antiguas que las de la tabla: continúan la página
+    return archivo_historial.completar_pagina(
+        "movimientos_materia_prima", movimientos, query.count, skip, limit,
+        fecha_inicio, fecha_fin, {"materia_prima_id": materia_id}
+    )
 
 @router.get("/alertas/stock-bajo", response_model=List[MateriaPrimaResponse])
 def get_stock_bajo(
     current_user: User = Depends(can_view_inventory),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db_lectura)
 ):
-    """Obtener materias primas con stock bajo"""
-    materias = db.query(MateriaPrima).filter(
-        MateriaPrima.cantidad_actual <= MateriaPrima.cantidad_minima
-    ).all()
-    return materias
+    """Obtener materias primas con stock bajo (índice parcial; en vivo en /api/notificaciones/stock-bajo)"""
+    return servicio_stock_bajo.items_stock_bajo(db, MateriaPrima)
 
 @router.get("/{materia_id}/historial-descuentos", response_model=List[HistorialDescuentoResponse])
 def get_historial_descuentos(
     materia_id: int,
+    fecha_inicio: Optional[datetime] = None,
+    fecha_fin: Optional[datetime] = None,
+    skip: int = 0,
+    limit: int = 100,
     current_user: User = Depends(can_view_inventory),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db_lectura)
 ):
-    """Obtener historial de descuentos de una materia prima"""
+    """Obtener historial de descuentos de una materia prima, paginado (el rango de fechas limita las particiones leídas)"""
     materia = db.query(MateriaPrima).filter(MateriaPrima.id == materia_id).first()
     if not materia:
         raise HTTPException(
@@ -171,8 +229,17 @@ def get_historial_descuentos(
             detail="Materia prima no encontrada"
         )
     
-    historial = db.query(HistorialDescuentoMateriaPrima).filter(
+    query = db.query(HistorialDescuentoMateriaPrima).filter(
         HistorialDescuentoMateriaPrima.materia_prima_id == materia_id
-    ).order_by(HistorialDescuentoMateriaPrima.fecha_descuento.desc()).all()
+    )
+    if fecha_inicio:
+        query = query.filter(HistorialDescuentoMateriaPrima.fecha_descuento >= fecha_inicio)
+    if fecha_fin:
+        query = query.filter(HistorialDescuentoMateriaPrima.fecha_descuento <= fecha_fin)
+    historial = query.order_by(HistorialDescuentoMateriaPrima.fecha_descuento.desc()).offset(skip).limit(limit).all()
     
-    return historial
+    # Las filas del archivo frío son más antiguas que las de la tabla: continúan la página
+    return archivo_historial.completar_pagina(
+        "historial_descuentos_materias_primas", historial, query.count, skip, limit,
+        fecha_inicio, fecha_fin, {"materia_prima_id": materia_id}
+    )
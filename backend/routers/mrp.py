@@ -0,0 +1,31 @@
+"""
+Router para planeación de requerimientos de materiales (MRP)
+"""
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from typing import List
+
+from database import get_db
+from models import User
+from schemas import PlanProduccionInput
+from auth import can_view_inventory
+import mrp
+
+router = APIRouter()
+
+@router.get("/capacidad", response_model=List[dict])
+def capacidad_produccion(
+    current_user: User = Depends(can_view_inventory),
+    db: Session = Depends(get_db)
+):
+    """Cantidad máxima producible de cada producto con el stock actual y su materia limitante"""
+    return mrp.calcular_capacidad(db)
+
+@router.post("/plan", response_model=dict)
+def evaluar_plan(
+    plan: PlanProduccionInput,
+    current_user: User = Depends(can_view_inventory),
+    db: Session = Depends(get_db)
+):
+    """Requerimientos de materias primas, faltantes y cuello de botella de un plan de producción"""
+    return mrp.calcular_plan(db, [(item.producto_id, item.cantidad) for item in plan.items])
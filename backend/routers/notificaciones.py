@@ -0,0 +1,71 @@
+"""
+Router de notificaciones en vivo (Server-Sent Events)
+"""
+from fastapi import APIRouter, Depends, Header, Query, Request
+from typing import Optional
+from fastapi.concurrency import run_in_threadpool
+
+from database import SessionLocal
+from models import User
+from auth import can_view_inventory
+import notificaciones
+import stock_bajo
+import cambios
+
+router = APIRouter()
+
+def _estado_stock_bajo():
+    db = SessionLocal()
+    try:
+        return [
+            stock_bajo.datos_item(tipo, item, True)
+            for modelo, tipo in stock_bajo.TIPOS.items()
+            for item in stock_bajo.items_stock_bajo(db, modelo)
+        ]
+    finally:
+        db.close()
+
+@router.get("/stock-bajo")
+async def stream_stock_bajo(
+    request: Request,
+    current_user: User = Depends(can_view_inventory)
+):
+    """
+    Flujo SSE de stock bajo. Al conectar envía `stock_bajo_inicial` con la lista actual
+    y después un evento `stock_bajo` cada vez que un item cruza su mínimo.
+    """
+    suscripcion = notificaciones.hub.suscribir([stock_bajo.CANAL])
+    inicial = notificaciones.evento("stock_bajo_inicial", await run_in_threadpool(_estado_stock_bajo))
+    return notificaciones.respuesta_sse(request, suscripcion, inicial)
+
+def _estado_inventario(desde: Optional[int]) -> bytes:
+    db = SessionLocal()
+    try:
+        version = cambios.version_actual(db)
+        if desde is None:
+            return notificaciones.evento("inventario_inicial", {"version": version})
+        pendientes = cambios.cambios_desde(db, desde)
+        if pendientes is None:
+            return notificaciones.evento("recargar", {"version": version}, version)
+        return b"".join(notificaciones.evento(cambios.CANAL, c, c["version"]) for c in pendientes)
+    finally:
+        db.close()
+
+@router.get("/inventario")
+async def stream_inventario(
+    request: Request,
+    desde: Optional[int] = Query(None, ge=0, description="Última versión conocida por el cliente"),
+    last_event_id: Optional[str] = Header(None),
+    current_user: User = Depends(can_view_inventory)
+):
+    """
+    Flujo SSE con un delta por cada cambio de existencias confirmado (evento `inventario`).
+    Al conectar sin `desde` envía `inventario_inicial` con la versión actual; con `desde`
+    (o el header Last-Event-ID) reenvía el último delta de cada item modificado después,
+    o `recargar` si son demasiados.
+    """
+    if desde is None and last_event_id and last_event_id.isdigit():
+        desde = int(last_event_id)
+    suscripcion = notificaciones.hub.suscribir([cambios.CANAL])
+    inicial = await run_in_threadpool(_estado_inventario, desde)
+    return notificaciones.respuesta_sse(request, suscripcion, inicial)
@@ -0,0 +1,37 @@
+"""
+Router de perfiles de muestreo por ruta (solo gerente)
+"""
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from models import User
+from schemas import PerfilRutaResponse
+from auth import can_manage_users
+import perfiles
+
+router = APIRouter()
+
+@router.get("/", response_model=List[PerfilRutaResponse])
+def listar_perfiles(current_user: User = Depends(can_manage_users)):
+    """Rutas perfiladas en todos los workers, de mayor a menor tiempo total"""
+    return perfiles.listar()
+
+@router.get("/pilas", response_class=PlainTextResponse)
+def obtener_pilas(
+    ruta: str = Query(..., description='Plantilla de la ruta, p. ej. "GET /api/materias-primas/{materia_id}"'),
+    current_user: User = Depends(can_manage_users)
+):
+    """Pilas colapsadas de la ruta (para flamegraph.pl, speedscope o inferno)"""
+    texto = perfiles.pilas(ruta)
+    if texto is None:
+        raise HTTPException(status_code=404, detail="La ruta no tiene perfil")
+    return PlainTextResponse(texto, headers={
+        "Content-Disposition": f'attachment; filename="{perfiles.nombre_archivo(ruta)}"'
+    })
+
+@router.delete("/")
+def reiniciar_perfiles(current_user: User = Depends(can_manage_users)):
+    """Descartar los perfiles acumulados"""
+    perfiles.reiniciar()
+    return {"message": "Perfiles reiniciados"}
@@ -3,29 +3,25 @@ Router para endpoints de Productos
 Gestiona la creación, lectura, actualización y eliminación de productos
 con sus relaciones a materias primas e inventarios
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, status
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, select
-from typing import List
+from sqlalchemy import and_
+from typing import List, Optional
+from datetime import datetime
 from database import get_db
 from auth import get_current_user
-from models import User, Producto, Inventario, MateriaPrima, producto_materia_prima, HistorialDescuentoMateriaPrima
-from schemas import ProductoCreate, ProductoUpdate, ProductoResponse, InventarioResponse, RegistrarProduccionInput
+from models import User, Producto, Inventario, MateriaPrima, producto_materia_prima
+from schemas import ProductoCreate, ProductoUpdate, ProductoResponse, InventarioResponse, RegistrarProduccionInput, RegistrarProduccionMultipleInput, SimularProduccionInput
+import produccion as produccion_service
+import etags
+import concurrencia
+import catalogo_inventarios
+import trazas
 
 router = APIRouter()
 
-# Inicializar inventarios por defecto
-def init_inventarios(db: Session):
-    """Crea los tres inventarios por defecto si no existen"""
-    inventarios_nombres = ["Magistral", "Droguería", "Brasil"]
-    
-    for nombre in inventarios_nombres:
-        inv_existente = db.query(Inventario).filter(Inventario.nombre == nombre).first()
-        if not inv_existente:
-            nuevo_inv = Inventario(nombre=nombre, descripcion=f"Inventario {nombre}")
-            db.add(nuevo_inv)
-    
-    db.commit()
+# La respuesta de un producto incluye sus materias primas e inventarios
+TABLAS_PRODUCTO = ("productos", "materias_primas", "inventarios")
 
 @router.post("/products", response_model=ProductoResponse, status_code=status.HTTP_201_CREATED)
 def crear_producto(
@@ -94,6 +90,7 @@ def crear_producto(
 @router.get("/products", response_model=List[ProductoResponse])
 def listar_productos(
     current_user: User = Depends(get_current_user),
+    etag: str = Depends(etags.etag_tablas(*TABLAS_PRODUCTO)),
     db: Session = Depends(get_db),
     skip: int = 0,
     limit: int = 100
@@ -106,6 +103,7 @@ def listar_productos(
 def obtener_producto(
     producto_id: int,
     current_user: User = Depends(get_current_user),
+    etag: str = Depends(etags.etag_fila(Producto, "materias_primas", "inventarios")),
     db: Session = Depends(get_db)
 ):
     """Obtener un producto específico"""
@@ -121,6 +119,7 @@ def obtener_producto(
 def actualizar_producto(
     producto_id: int,
     producto_update: ProductoUpdate,
+    if_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -131,6 +130,10 @@ def actualizar_producto(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Producto no encontrado"
         )
+    concurrencia.comprobar(db_producto, concurrencia.version_esperada(if_match, producto_update.version))
+    # Siempre se escribe la fila para que el UPDATE verifique e incremente la versión,
+    # aunque solo cambien las materias primas o los inventarios
+    db_producto.updated_at = datetime.utcnow()
     
     # Actualizar campos básicos
     if producto_update.codigo is not None:
@@ -232,94 +235,114 @@ def listar_inventarios(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Listar todos los inventarios"""
-    init_inventarios(db)
-    inventarios = db.query(Inventario).all()
-    return inventarios
+    """Listar todos los inventarios (catálogo en memoria)"""
+    return catalogo_inventarios.listar(db)
 
 @router.post("/products/{producto_id}/registrar-produccion", status_code=status.HTTP_200_OK)
 def registrar_produccion(
     producto_id: int,
     produccion: RegistrarProduccionInput,
+    dry_run: bool = False,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Registrar la producción de un producto y descontar materias primas del inventario
     Fórmula de descuento: concentración (%P/V) * volumen_producido * 1.05 (factor corrección 5%)
+    Con dry_run=true solo se calculan los descuentos y faltantes, sin modificar el inventario
     """
-    from datetime import datetime
+    if dry_run:
+        simulacion = produccion_service.simular_produccion(db, [(producto_id, produccion.cantidad)])
+        orden = simulacion["ordenes"][0]
+        if orden.get("error"):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Producto no encontrado"
+            )
+        return orden
     
-    # Obtener el producto
-    producto = db.query(Producto).filter(Producto.id == producto_id).first()
-    if not producto:
+    # Descontar las materias primas del inventario correspondiente al destino
+    # Fórmula: concentración (%P/V) * volumen_producido * 1.05
+    try:
+        destinos = produccion_service.registrar_producciones(
+            db, [produccion.model_copy(update={"producto_id": producto_id})], usuario_id=current_user.id
+        )
+    except produccion_service.ProductoNoEncontrado:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Producto no encontrado"
         )
+    except produccion_service.FaltanteInventario as e:
+        db.rollback()
+        materia, _ = e.faltantes[0]
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Cantidad insuficiente de {materia.nombre} en {materia.tipo_inventario}"
+        )
     
-    # Determinar el inventario de destino basado en la unidad de negocio
-    if producto.unidad_negocio == "BPE - Magistrales":
-        inventario_destino = "BPE - Magistrales"
-    else:  # "Droguería" o "Fabricación de derivados"
-        inventario_destino = "Fabricación de derivados"
+    with trazas.span("db.commit"):
+        db.commit()
     
-    # Descontar las materias primas del inventario correspondiente
-    if producto.materias_primas:
-        for materia in producto.materias_primas:
-            # Obtener la concentración de la tabla de asociación
-            stmt = select(producto_materia_prima.c.concentracion).where(
-                and_(
-                    producto_materia_prima.c.producto_id == producto_id,
-                    producto_materia_prima.c.materia_prima_id == materia.id
-                )
+    return {
+        "success": True,
+        "message": f"Producción de {produccion.cantidad} unidades registrada exitosamente",
+        "inventario_utilizado": destinos[0]
+    }
+
+@router.post("/products/registrar-produccion-multiple", status_code=status.HTTP_200_OK)
+def registrar_produccion_multiple(
+    registro: RegistrarProduccionMultipleInput,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Registrar todas las producciones de un turno en una sola transacción
+    Cada materia prima se bloquea una vez (en orden de id) y recibe un único descuento consolidado;
+    si falta alguna materia prima no se registra ninguna producción
+    """
+    try:
+        destinos = produccion_service.registrar_producciones(db, registro.producciones, usuario_id=current_user.id)
+    except produccion_service.ProductoNoEncontrado as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Producto con ID {e.producto_id} no encontrado"
+        )
+    except produccion_service.FaltanteInventario as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cantidad insuficiente de " + ", ".join(
+                f"{materia.nombre} en {materia.tipo_inventario} (faltan {faltante:.2f})"
+                for materia, faltante in e.faltantes
             )
-            concentracion_result = db.execute(stmt).first()
-            
-            if concentracion_result:
-                concentracion = concentracion_result[0]  # %P/V
-                
-                # Fórmula: concentración (%P/V) * volumen_producido * 1.05
-                # Resultado en unidades de concentración, necesita conversión a gramos
-                cantidad_a_descontar = (concentracion / 100) * produccion.cantidad * 1.05
-                
-                # Buscar la materia prima con el tipo de inventario correspondiente
-                materia_a_descontar = db.query(MateriaPrima).filter(
-                    and_(
-                        MateriaPrima.nombre == materia.nombre,
-                        MateriaPrima.tipo_inventario == inventario_destino
-                    )
-                ).first()
-                
-                if materia_a_descontar:
-                    # Verificar que hay suficiente cantidad
-                    if materia_a_descontar.cantidad_actual < cantidad_a_descontar:
-                        raise HTTPException(
-                            status_code=status.HTTP_400_BAD_REQUEST,
-                            detail=f"Cantidad insuficiente de {materia_a_descontar.nombre} en {inventario_destino}"
-                        )
-                    
-                    # Descontar la cantidad
-                    materia_a_descontar.cantidad_actual -= cantidad_a_descontar
-                    
-                    # Registrar en el historial de descuentos
-                    descuento = HistorialDescuentoMateriaPrima(
-                        materia_prima_id=materia_a_descontar.id,
-                        producto_id=producto_id,
-                        producto_nombre=producto.nombre,
-                        cantidad_descontada=cantidad_a_descontar,  # En gramos
-                        concentracion=concentracion,  # %P/V
-                        volumen_producido=produccion.cantidad,
-                        unidad_volumen="mL",  # Asumiendo que es mL por defecto
-                        fecha_produccion=produccion.fecha_produccion or datetime.utcnow()
-                    )
-                    db.add(descuento)
+        )
     
-    db.commit()
+    with trazas.span("db.commit"):
+        db.commit()
     
     return {
         "success": True,
-        "message": f"Producción de {produccion.cantidad} unidades registrada exitosamente",
-        "inventario_utilizado": inventario_destino
+        "message": f"{len(registro.producciones)} producciones registradas exitosamente",
+        "producciones": [
+            {
+                "producto_id": p.producto_id,
+                "cantidad": p.cantidad,
+                "inventario_utilizado": destino
+            }
+            for p, destino in zip(registro.producciones, destinos)
+        ]
     }
 
+@router.post("/products/simular-produccion", status_code=status.HTTP_200_OK)
+def simular_produccion(
+    simulacion: SimularProduccionInput,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Simular varias órdenes de producción contra la misma foto de existencias
+    Reporta los descuentos, lotes afectados y todos los faltantes de cada orden sin modificar el inventario
+    """
+    return produccion_service.simular_produccion(
+        db, [(orden.producto_id, orden.cantidad) for orden in simulacion.ordenes]
+    )
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import datetime
 
 from database import get_db
+from replicas import get_db_lectura
 from models import User, ProductoTerminado, MovimientoProducto, MateriaPrima
 from schemas import (
     ProductoTerminadoResponse, 
@@ -12,24 +14,49 @@ from schemas import (
     MovimientoProductoResponse
 )
 from auth import can_view_inventory, can_modify_inventory
+import libro_stock
+import listados
+import etags
+import archivo_historial
+import concurrencia
+import stock_bajo as servicio_stock_bajo
 
 router = APIRouter()
 
+CAMPOS_LISTADO = list(ProductoTerminadoResponse.model_fields)
+ORDENABLES = (
+    "id", "codigo", "nombre", "cantidad_actual", "cantidad_minima", "precio_produccion",
+    "precio_venta", "lote", "fecha_produccion", "fecha_vencimiento", "ubicacion", "created_at", "updated_at"
+)
+
 @router.get("/", response_model=List[ProductoTerminadoResponse])
 def list_productos(
     skip: int = 0,
     limit: int = 100,
+    ubicacion: Optional[str] = None,
+    stock_bajo: Optional[bool] = None,
+    sort: Optional[str] = Query(None, description="Campos separados por coma; prefijo - para descendente"),
+    fields: Optional[str] = Query(None, description="Campos a retornar separados por coma"),
     current_user: User = Depends(can_view_inventory),
+    etag: str = Depends(etags.etag_tablas("productos_terminados")),
     db: Session = Depends(get_db)
 ):
-    """Listar todos los productos terminados"""
-    productos = db.query(ProductoTerminado).offset(skip).limit(limit).all()
-    return productos
+    """Listar productos terminados con filtros, orden y selección de campos"""
+    condiciones = []
+    if ubicacion:
+        condiciones.append(ProductoTerminado.ubicacion == ubicacion)
+    if stock_bajo is not None:
+        bajo = ProductoTerminado.cantidad_actual <= ProductoTerminado.cantidad_minima
+        condiciones.append(bajo if stock_bajo else ~bajo)
+    return listados.listar(
+        db, ProductoTerminado, condiciones, fields, sort, skip, limit, CAMPOS_LISTADO, ORDENABLES, etag
+    )
 
 @router.get("/{producto_id}", response_model=ProductoTerminadoResponse)
 def get_producto(
     producto_id: int,
     current_user: User = Depends(can_view_inventory),
+    etag: str = Depends(etags.etag_fila(ProductoTerminado)),
     db: Session = Depends(get_db)
 ):
     """Obtener un producto terminado por ID"""
@@ -58,10 +85,12 @@ def create_producto(
     
     # Preparar datos para crear el producto
     producto_data = producto.model_dump(exclude=['presentaciones', 'materiales', 'volumen_total', 'tipo_inventario'])
+    cantidad_inicial = producto_data.pop("cantidad_actual")
     
-    db_producto = ProductoTerminado(**producto_data, created_by=current_user.id)
+    db_producto = ProductoTerminado(**producto_data, cantidad_actual=cantidad_inicial, created_by=current_user.id)
     db.add(db_producto)
     db.flush()  # Flush para obtener el ID sin hacer commit
+    libro_stock.registrar_alta(db, db_producto, usuario_id=current_user.id)
     
     # Si es unidades, descontar materiales
     if producto.unidad_medida == 'unidades' and producto.materiales and producto.presentaciones:
@@ -71,7 +100,7 @@ def create_producto(
         if producto.materiales.get('envase'):
             envase = db.query(MateriaPrima).filter(
                 MateriaPrima.codigo == producto.materiales['envase']
-            ).first()
+            ).with_for_update().first()
             if not envase:
                 db.rollback()
                 raise HTTPException(
@@ -84,13 +113,16 @@ def create_producto(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"Cantidad insuficiente de envase: disponible {envase.cantidad_actual}, requerido {cantidad_total}"
                 )
-            envase.cantidad_actual -= cantidad_total
+            libro_stock.registrar_delta(
+                db, envase, -cantidad_total, "material_empaque",
+                referencia_id=db_producto.id, usuario_id=current_user.id
+            )
         
         # Descontar gotero
         if producto.materiales.get('gotero'):
             gotero = db.query(MateriaPrima).filter(
                 MateriaPrima.codigo == producto.materiales['gotero']
-            ).first()
+            ).with_for_update().first()
             if not gotero:
                 db.rollback()
                 raise HTTPException(
@@ -103,13 +135,16 @@ def create_producto(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"Cantidad insuficiente de gotero: disponible {gotero.cantidad_actual}, requerido {cantidad_total}"
                 )
-            gotero.cantidad_actual -= cantidad_total
+            libro_stock.registrar_delta(
+                db, gotero, -cantidad_total, "material_empaque",
+                referencia_id=db_producto.id, usuario_id=current_user.id
+            )
         
         # Descontar caja
         if producto.materiales.get('caja'):
             caja = db.query(MateriaPrima).filter(
                 MateriaPrima.codigo == producto.materiales['caja']
-            ).first()
+            ).with_for_update().first()
             if not caja:
                 db.rollback()
                 raise HTTPException(
@@ -122,7 +157,10 @@ def create_producto(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"Cantidad insuficiente de caja: disponible {caja.cantidad_actual}, requerido {cantidad_total}"
                 )
-            caja.cantidad_actual -= cantidad_total
+            libro_stock.registrar_delta(
+                db, caja, -cantidad_total, "material_empaque",
+                referencia_id=db_producto.id, usuario_id=current_user.id
+            )
     
     db.commit()
     db.refresh(db_producto)
@@ -132,6 +170,7 @@ def create_producto(
 def update_producto(
     producto_id: int,
     producto_update: ProductoTerminadoUpdate,
+    if_match: Optional[str] = Header(None),
     current_user: User = Depends(can_modify_inventory),
     db: Session = Depends(get_db)
 ):
@@ -144,6 +183,7 @@ def update_producto(
         )
     
     update_data = producto_update.model_dump(exclude_unset=True)
+    concurrencia.comprobar(producto, concurrencia.version_esperada(if_match, update_data.pop("version", None)))
     
     # Verificar código único si se está actualizando
     if "codigo" in update_data:
@@ -157,9 +197,14 @@ def update_producto(
                 detail="El código de producto ya existe"
             )
     
+    cantidad = update_data.pop("cantidad_actual", None)
     for field, value in update_data.items():
         setattr(producto, field, value)
     
+    # La cantidad se ajusta a través del libro de stock
+    if cantidad is not None:
+        libro_stock.fijar_cantidad(db, producto, cantidad, usuario_id=current_user.id)
+    
     db.commit()
     db.refresh(producto)
     return producto
@@ -189,23 +234,20 @@ def create_movimiento(
     db: Session = Depends(get_db)
 ):
     """Registrar un movimiento de producto (entrada/salida)"""
-    producto = db.query(ProductoTerminado).filter(ProductoTerminado.id == movimiento.producto_id).first()
+    # Bloquear la fila: el movimiento no lleva versión del cliente y no debe fallar con 409
+    producto = db.query(ProductoTerminado).filter(ProductoTerminado.id == movimiento.producto_id).with_for_update().first()
     if not producto:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Producto no encontrado"
         )
     
-    # Actualizar cantidad según el tipo de movimiento
-    if movimiento.tipo == "entrada":
-        producto.cantidad_actual += movimiento.cantidad
-    elif movimiento.tipo == "salida":
-        if producto.cantidad_actual < movimiento.cantidad:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Cantidad insuficiente en inventario"
-            )
-        producto.cantidad_actual -= movimiento.cantidad
+    # Validar cantidad según el tipo de movimiento
+    if movimiento.tipo == "salida" and producto.cantidad_actual < movimiento.cantidad:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cantidad insuficiente en inventario"
+        )
     
     # Crear el registro de movimiento
     db_movimiento = MovimientoProducto(
@@ -213,6 +255,13 @@ def create_movimiento(
         created_by=current_user.id
     )
     db.add(db_movimiento)
+    db.flush()
+    
+    # Actualizar cantidad a través del libro de stock
+    delta = movimiento.cantidad if movimiento.tipo == "entrada" else -movimiento.cantidad
+    libro_stock.registrar_delta(
+        db, producto, delta, "movimiento", referencia_id=db_movimiento.id, usuario_id=current_user.id
+    )
     db.commit()
     db.refresh(db_movimiento)
     
@@ -221,24 +270,33 @@ def create_movimiento(
 @router.get("/movimientos/{producto_id}", response_model=List[MovimientoProductoResponse])
 def list_movimientos(
     producto_id: int,
+    fecha_inicio: Optional[datetime] = None,
+    fecha_fin: Optional[datetime] = None,
     skip: int = 0,
     limit: int = 100,
     current_user: User = Depends(can_view_inventory),
     db: Session = Depends(get_db)
 ):
-    """Listar movimientos de un producto"""
-    movimientos = db.query(MovimientoProducto).filter(
+    """Listar movimientos de un producto (el rango de fechas limita las particiones leídas)"""
+    query = db.query(MovimientoProducto).filter(
         MovimientoProducto.producto_id == producto_id
-    ).offset(skip).limit(limit).all()
-    return movimientos
+    )
+    if fecha_inicio:
+        query = query.filter(MovimientoProducto.created_at >= fecha_inicio)
+    if fecha_fin:
+        query = query.filter(MovimientoProducto.created_at <= fecha_fin)
+    movimientos = query.order_by(MovimientoProducto.created_at.desc()).offset(skip).limit(limit).all()
+    
+    # Las filas de particiones archivadas son más antiguas que las de la tabla: continúan la página
+    return archivo_historial.completar_pagina(
+        "movimientos_productos", movimientos, query.count, skip, limit,
+        fecha_inicio, fecha_fin, {"producto_id": producto_id}
+    )
 
 @router.get("/alertas/stock-bajo", response_model=List[ProductoTerminadoResponse])
 def get_stock_bajo(
     current_user: User = Depends(can_view_inventory),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db_lectura)
 ):
-    """Obtener productos con stock bajo"""
-    productos = db.query(ProductoTerminado).filter(
-        ProductoTerminado.cantidad_actual <= ProductoTerminado.cantidad_minima
-    ).all()
-    return productos
+    """Obtener productos con stock bajo (índice parcial; en vivo en /api/notificaciones/stock-bajo)"""
+    return servicio_stock_bajo.items_stock_bajo(db, ProductoTerminado)
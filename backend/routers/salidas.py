@@ -1,10 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from datetime import datetime
 from models import RegistroSalida, MateriaPrima, ProductoTerminado, SalidaEnum
 from schemas import RegistroSalidaCreate, RegistroSalidaResponse
 from database import get_db
+from replicas import get_db_lectura
 from auth import get_current_user
+import libro_stock
+import archivo_historial
 from typing import List, Optional
 
 router = APIRouter(prefix="/api/salidas", tags=["salidas"])
@@ -37,9 +41,10 @@ async def registrar_salida(
         if not salida.materia_prima_id:
             raise HTTPException(status_code=400, detail="materia_prima_id requerido")
         
+        # Bloquear la fila: el descuento no lleva versión del cliente y no debe fallar con 409
         materia_prima = db.query(MateriaPrima).filter(
             MateriaPrima.id == salida.materia_prima_id
-        ).first()
+        ).with_for_update().first()
         
         if not materia_prima:
             raise HTTPException(status_code=404, detail="Materia prima no encontrada")
@@ -51,9 +56,9 @@ async def registrar_salida(
             raise HTTPException(status_code=400, detail="Cantidad insuficiente en inventario")
         
         # Registrar salida
+        item = materia_prima
         saldo_anterior = materia_prima.cantidad_actual
-        materia_prima.cantidad_actual -= salida.cantidad_salida
-        saldo_actual = materia_prima.cantidad_actual
+        saldo_actual = saldo_anterior - salida.cantidad_salida
         
         registro = RegistroSalida(
             tipo_item="materia_prima",
@@ -77,7 +82,7 @@ async def registrar_salida(
         
         producto_terminado = db.query(ProductoTerminado).filter(
             ProductoTerminado.id == salida.producto_terminado_id
-        ).first()
+        ).with_for_update().first()
         
         if not producto_terminado:
             raise HTTPException(status_code=404, detail="Producto terminado no encontrado")
@@ -89,9 +94,9 @@ async def registrar_salida(
             raise HTTPException(status_code=400, detail="Cantidad insuficiente en inventario")
         
         # Registrar salida
+        item = producto_terminado
         saldo_anterior = producto_terminado.cantidad_actual
-        producto_terminado.cantidad_actual -= salida.cantidad_salida
-        saldo_actual = producto_terminado.cantidad_actual
+        saldo_actual = saldo_anterior - salida.cantidad_salida
         
         registro = RegistroSalida(
             tipo_item="producto_terminado",
@@ -109,6 +114,10 @@ async def registrar_salida(
         )
     
     db.add(registro)
+    db.flush()
+    libro_stock.registrar_delta(
+        db, item, -salida.cantidad_salida, "salida", referencia_id=registro.id, usuario_id=current_user.id
+    )
     db.commit()
     db.refresh(registro)
     
@@ -121,10 +130,14 @@ async def obtener_historial_salidas(
     motivo: Optional[str] = Query(None),
     fecha_inicio: Optional[str] = Query(None),
     fecha_fin: Optional[str] = Query(None),
-    db: Session = Depends(get_db),
+    materia_prima_id: Optional[int] = Query(None),
+    producto_terminado_id: Optional[int] = Query(None),
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db_lectura),
     current_user = Depends(get_current_user)
 ):
-    """Obtener historial de salidas con filtros opcionales"""
+    """Obtener historial de salidas con filtros opcionales, paginado (réplica de lectura si está disponible)"""
     
     query = db.query(RegistroSalida).order_by(RegistroSalida.created_at.desc())
     
@@ -134,15 +147,38 @@ async def obtener_historial_salidas(
     if motivo:
         query = query.filter(RegistroSalida.motivo_salida == motivo)
     
-    if fecha_inicio:
-        fecha_inicio_obj = datetime.fromisoformat(fecha_inicio)
+    if materia_prima_id:
+        query = query.filter(RegistroSalida.materia_prima_id == materia_prima_id)
+    
+    if producto_terminado_id:
+        query = query.filter(RegistroSalida.producto_terminado_id == producto_terminado_id)
+    
+    fecha_inicio_obj = datetime.fromisoformat(fecha_inicio) if fecha_inicio else None
+    fecha_fin_obj = datetime.fromisoformat(fecha_fin) if fecha_fin else None
+    
+    if fecha_inicio_obj:
         query = query.filter(RegistroSalida.created_at >= fecha_inicio_obj)
     
-    if fecha_fin:
-        fecha_fin_obj = datetime.fromisoformat(fecha_fin)
+    if fecha_fin_obj:
         query = query.filter(RegistroSalida.created_at <= fecha_fin_obj)
     
-    return query.all()
+    registros = query.offset(skip).limit(limit).all()
+    
+    # Las filas del archivo frío son más antiguas que las de la tabla: continúan la página
+    filtros = {}
+    if tipo_item:
+        filtros["tipo_item"] = tipo_item
+    if motivo:
+        filtros["motivo_salida"] = motivo
+    if materia_prima_id:
+        filtros["materia_prima_id"] = materia_prima_id
+    if producto_terminado_id:
+        filtros["producto_terminado_id"] = producto_terminado_id
+    # Lectura de Parquet (bloqueante) fuera del event loop
+    return await run_in_threadpool(
+        archivo_historial.completar_pagina, "registros_salidas", registros, query.count,
+        skip, limit, fecha_inicio_obj, fecha_fin_obj, filtros
+    )
 
 
 @router.get("/codigo/{codigo}", response_model=dict)
@@ -0,0 +1,24 @@
+"""
+Router para la valoración del inventario en una fecha
+"""
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from typing import Optional
+from datetime import datetime
+
+from database import get_db
+from models import User
+from schemas import ValoracionInventarioResponse
+from auth import can_view_inventory
+import valoracion
+
+router = APIRouter()
+
+@router.get("/", response_model=ValoracionInventarioResponse)
+def valorar_inventario(
+    fecha: Optional[datetime] = None,
+    current_user: User = Depends(can_view_inventory),
+    db: Session = Depends(get_db)
+):
+    """Existencias y valor del inventario reconstruidos a una fecha (por defecto ahora)"""
+    return valoracion.valorar_inventario(db, fecha)
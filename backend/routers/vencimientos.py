@@ -0,0 +1,62 @@
+"""
+Router para consultas de vencimiento de productos terminados
+"""
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import datetime, timedelta
+
+from database import get_db
+from models import User, AlertaVencimiento
+from schemas import LoteVencimientoResponse, ResumenVencimientoResponse, AlertaVencimientoResponse
+from auth import can_view_inventory, can_modify_inventory
+import vencimientos
+
+router = APIRouter()
+
+@router.get("/", response_model=List[LoteVencimientoResponse])
+def listar_por_vencer(
+    dias: int = Query(vencimientos.HORIZONTE_DIAS, ge=0, le=3650),
+    incluir_vencidos: bool = True,
+    skip: int = 0,
+    limit: int = 100,
+    current_user: User = Depends(can_view_inventory),
+    db: Session = Depends(get_db)
+):
+    """Listar lotes con existencias que vencen en los próximos `dias` días"""
+    return vencimientos.lotes_por_vencer(db, dias, incluir_vencidos, skip, limit)
+
+@router.get("/resumen", response_model=List[ResumenVencimientoResponse])
+def resumen_por_vencer(
+    dias: int = Query(vencimientos.HORIZONTE_DIAS, ge=0, le=3650),
+    agrupar_por: str = Query("ubicacion", pattern="^(ubicacion|unidad_negocio)$"),
+    incluir_vencidos: bool = True,
+    current_user: User = Depends(can_view_inventory),
+    db: Session = Depends(get_db)
+):
+    """Cantidad y valor en riesgo agrupados por ubicación o unidad de negocio"""
+    return vencimientos.resumen_por_vencer(db, dias, agrupar_por, incluir_vencidos)
+
+@router.get("/alertas", response_model=List[AlertaVencimientoResponse])
+def listar_alertas(
+    dias: Optional[int] = Query(None, ge=0, le=3650),
+    skip: int = 0,
+    limit: int = 100,
+    current_user: User = Depends(can_view_inventory),
+    db: Session = Depends(get_db)
+):
+    """Leer la tabla precalculada de alertas de vencimiento"""
+    query = db.query(AlertaVencimiento)
+    if dias is not None:
+        limite = datetime.utcnow() + timedelta(days=dias)
+        query = query.filter(AlertaVencimiento.fecha_vencimiento <= limite)
+    return query.order_by(AlertaVencimiento.fecha_vencimiento).offset(skip).limit(limit).all()
+
+@router.post("/alertas/escanear")
+def escanear_alertas(
+    current_user: User = Depends(can_modify_inventory),
+    db: Session = Depends(get_db)
+):
+    """Forzar el recálculo de la tabla de alertas de vencimiento"""
+    total = vencimientos.escanear_vencimientos(db)
+    return {"alertas": total, "horizonte_dias": vencimientos.HORIZONTE_DIAS}
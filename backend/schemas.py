@@ -66,12 +66,14 @@ class MateriaPrimaUpdate(BaseModel):
     proveedor: Optional[str] = None
     fecha_ingreso: Optional[date] = None
     tipo_inventario: Optional[str] = None
+    version: Optional[int] = None  # Versión leída; también se puede enviar en If-Match
 
 class MateriaPrimaResponse(MateriaPrimaBase):
     id: int
     created_by: Optional[int]
     created_at: datetime
     updated_at: datetime
+    version: int
     
     class Config:
         from_attributes = True
@@ -116,12 +118,14 @@ class GastoUpdate(BaseModel):
     fecha_gasto: Optional[datetime] = None
     orden_produccion: Optional[str] = None
     comprobante: Optional[str] = None
+    version: Optional[int] = None  # Versión leída; también se puede enviar en If-Match
 
 class GastoResponse(GastoBase):
     id: int
     created_by: Optional[int]
     created_at: datetime
     updated_at: datetime
+    version: int
     
     class Config:
         from_attributes = True
@@ -160,12 +164,14 @@ class ProductoTerminadoUpdate(BaseModel):
     fecha_produccion: Optional[datetime] = None
     fecha_vencimiento: Optional[datetime] = None
     ubicacion: Optional[str] = None
+    version: Optional[int] = None  # Versión leída; también se puede enviar en If-Match
 
 class ProductoTerminadoResponse(ProductoTerminadoBase):
     id: int
     created_by: Optional[int]
     created_at: datetime
     updated_at: datetime
+    version: int
     
     class Config:
         from_attributes = True
@@ -244,12 +250,14 @@ class ProductoUpdate(BaseModel):
     meses_vencimiento: Optional[int] = Field(None, ge=0, le=12)
     materias_primas: Optional[List[ProductoMateriaPrimaInput]] = None
     inventarios: Optional[List[int]] = None
+    version: Optional[int] = None  # Versión leída; también se puede enviar en If-Match
 
 class ProductoResponse(ProductoBase):
     id: int
     created_by: Optional[int]
     created_at: datetime
     updated_at: datetime
+    version: int
     inventarios: List[InventarioResponse] = []
     materias_primas: List[dict] = []
     
@@ -313,3 +321,170 @@ class RegistroSalidaResponse(BaseModel):
         from_attributes = True
 
 
+
+# Schemas para Vencimientos
+class LoteVencimientoResponse(BaseModel):
+    producto_terminado_id: int
+    codigo: str
+    nombre: str
+    lote: Optional[str]
+    ubicacion: Optional[str]
+    unidad_negocio: str
+    fecha_vencimiento: datetime
+    cantidad: float
+    valor_en_riesgo: float
+
+class ResumenVencimientoResponse(BaseModel):
+    grupo: str
+    lotes: int
+    cantidad: float
+    valor_en_riesgo: float
+    proximo_vencimiento: datetime
+
+class AlertaVencimientoResponse(LoteVencimientoResponse):
+    id: int
+    escaneado_en: datetime
+    
+    class Config:
+        from_attributes = True
+
+# Schemas para MRP
+class ItemPlanProduccion(BaseModel):
+    producto_id: int
+    cantidad: float = Field(..., gt=0)
+
+class PlanProduccionInput(BaseModel):
+    items: List[ItemPlanProduccion] = Field(..., min_length=1)
+
+class SimularProduccionInput(BaseModel):
+    ordenes: List[ItemPlanProduccion] = Field(..., min_length=1)
+
+class RegistrarProduccionMultipleInput(BaseModel):
+    producciones: List[RegistrarProduccionInput] = Field(..., min_length=1)
+
+# Schemas para el libro de stock
+class AsientoStockResponse(BaseModel):
+    id: int
+    tipo_item: str
+    item_id: int
+    delta: float
+    origen: str
+    referencia_id: Optional[int] = None
+    created_by: Optional[int] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class SaldoLibroResponse(BaseModel):
+    tipo_item: str
+    item_id: int
+    fecha: datetime
+    saldo: float
+    snapshot_id: Optional[int] = None
+    snapshot_tomado_en: Optional[datetime] = None
+    asientos_aplicados: int
+
+class DesviacionLibroResponse(BaseModel):
+    tipo_item: str
+    item_id: int
+    codigo: Optional[str] = None
+    cantidad_actual: Optional[float] = None
+    saldo_libro: float
+    diferencia: float
+
+# Schemas para la valoración de inventario
+class ValoracionUnidadNegocio(BaseModel):
+    unidad_negocio: str
+    lotes: int
+    cantidad: float
+    valor_produccion: float
+    valor_venta: float
+
+class ValoracionMateriaPrima(BaseModel):
+    tipo_inventario: str
+    unidad_medida: str
+    lotes: int
+    cantidad: float
+
+class ValoracionInventarioResponse(BaseModel):
+    fecha: datetime
+    productos_terminados: List[ValoracionUnidadNegocio]
+    total_valor_produccion: float
+    total_valor_venta: float
+    materias_primas: List[ValoracionMateriaPrima]
+
+# Schemas para escaneo
+class EscaneoMultipleInput(BaseModel):
+    valores: List[str] = Field(..., min_length=1, max_length=1000)
+
+# Schemas para búsqueda
+class ResultadoBusqueda(BaseModel):
+    tipo_item: str
+    id: int
+    codigo: str
+    nombre: str
+    lote: Optional[str] = None
+    proveedor: Optional[str] = None
+    campo: Optional[str] = None  # Campo con la mejor coincidencia
+    prefijo: bool
+    puntaje: float
+
+class BusquedaResponse(BaseModel):
+    consulta: str
+    total: int
+    items: List[ResultadoBusqueda]
+
+# Schemas para el resumen del dashboard
+class TotalesInventario(BaseModel):
+    total: int
+    stock_bajo: int
+    valor_produccion: float
+    valor_venta: float
+
+class AlertaStockBajo(BaseModel):
+    tipo_item: str
+    id: int
+    codigo: str
+    nombre: str
+    cantidad_actual: float
+    cantidad_minima: float
+
+class ResumenVencimientos(BaseModel):
+    dias: int
+    lotes: int
+    vencidos: int
+    valor_en_riesgo: float
+    proximo_vencimiento: Optional[datetime] = None
+
+class ResumenGastoMes(BaseModel):
+    desde: datetime
+    total: float
+    registros: int
+
+class SalidaReciente(BaseModel):
+    id: int
+    tipo_item: str
+    codigo_item: str
+    nombre_item: str
+    lote: str
+    cantidad_salida: float
+    unidad_medida: str
+    motivo_salida: str
+    created_at: datetime
+
+class DashboardResumenResponse(BaseModel):
+    materias_primas: TotalesInventario  # Sin precio: valor_produccion y valor_venta en 0
+    productos_terminados: TotalesInventario
+    alertas_stock_bajo: List[AlertaStockBajo]
+    vencimientos: ResumenVencimientos
+    gasto_mes: ResumenGastoMes
+    salidas_recientes: List[SalidaReciente]
+    generado_en: datetime
+
+class PerfilRutaResponse(BaseModel):
+    ruta: str
+    solicitudes: int
+    muestras: int
+    tiempo_total_ms: float
+    tiempo_promedio_ms: float
@@ -0,0 +1,84 @@
+"""
+Stock bajo: consultas sobre los índices parciales y avisos en vivo
+Cuando un commit deja un item por debajo de su mínimo (o lo saca de esa condición) se
+publica un evento en el canal "stock_bajo" del hub de notificaciones de cada worker (por
+el feed de cambios: pg_notify/LISTEN con el backend postgres). El estado anterior se toma
+del historial de atributos de SQLAlchemy en el primer flush de la transacción; cada flush
+envía los cruces respecto de lo ya enviado en la misma transacción.
+"""
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import MateriaPrima, ProductoTerminado
+from notificaciones import hub
+import cambios
+
+CANAL = "stock_bajo"
+TIPOS = {MateriaPrima: "materia_prima", ProductoTerminado: "producto_terminado"}
+
+Clave = Tuple[str, int]  # (tipo_item, id)
+
+def items_stock_bajo(db: Session, modelo) -> List:
+    """Items con stock bajo; la condición coincide con la del índice parcial"""
+    return db.query(modelo).filter(modelo.cantidad_actual <= modelo.cantidad_minima).all()
+
+def _bajo(cantidad_actual, cantidad_minima) -> bool:
+    return (cantidad_actual or 0) <= (cantidad_minima or 0)
+
+def _valor_anterior(estado, atributo: str):
+    historial = estado.attrs[atributo].history
+    if historial.deleted:
+        return historial.deleted[0]
+    return estado.attrs[atributo].value
+
+def datos_item(tipo: str, item, bajo: bool) -> Dict:
+    return {
+        "tipo_item": tipo,
+        "id": item.id,
+        "codigo": item.codigo,
+        "nombre": item.nombre,
+        "cantidad_actual": item.cantidad_actual,
+        "cantidad_minima": item.cantidad_minima,
+        "stock_bajo": bajo,
+    }
+
+# Transiciones con los eventos de sesión
+
+_CLAVE_ESTADOS = "stock_bajo_estados"
+
+@event.listens_for(SessionLocal, "after_flush")
+def _registrar_cambios(session: Session, contexto):
+    # {clave: condición de stock bajo ya anunciada (al inicio: la anterior a la transacción)}
+    estados: Dict[Clave, Optional[bool]] = session.info.setdefault(_CLAVE_ESTADOS, {})
+    mensajes = []
+    for item in list(session.new) + list(session.dirty) + list(session.deleted):
+        tipo = TIPOS.get(type(item))
+        if tipo is None:
+            continue
+        estado = inspect(item)
+        clave = (tipo, item.id)
+        if clave not in estados:
+            if item in session.new:
+                estados[clave] = None
+            else:
+                estados[clave] = _bajo(_valor_anterior(estado, "cantidad_actual"), _valor_anterior(estado, "cantidad_minima"))
+        if item in session.deleted or estado.deleted:
+            # Eliminado: solo interesa si estaba en la lista de stock bajo
+            if estados[clave]:
+                mensajes.append({"tipo_item": tipo, "id": item.id, "stock_bajo": False, "eliminado": True})
+            estados[clave] = None
+            continue
+        bajo = _bajo(item.cantidad_actual, item.cantidad_minima)
+        if bajo != bool(estados[clave]):
+            mensajes.append(datos_item(tipo, item, bajo))
+        estados[clave] = bajo
+    cambios.enviar(session, CANAL, mensajes)
+
+@event.listens_for(SessionLocal, "after_commit")
+@event.listens_for(SessionLocal, "after_rollback")
+def _limpiar(session: Session):
+    session.info.pop(_CLAVE_ESTADOS, None)
+
+cambios.escuchar(CANAL, lambda datos: hub.publicar(CANAL, datos))
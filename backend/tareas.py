@@ -0,0 +1,104 @@
+"""
+Tareas periódicas en segundo plano
+Cada tarea corre en su propio hilo con una sesión de base de datos independiente.
+Con varios workers cada proceso arranca sus tareas: las que mantienen estado en memoria
+(índices, contadores) deben correr en todos, pero las que escriben en la base de datos se
+registran con unica=True y en PostgreSQL solo las ejecuta el worker líder: el que tiene el
+advisory lock de tareas, retenido en una conexión propia mientras el proceso vive. Si el
+líder muere su conexión se cierra, el lock se libera y otro worker lo toma en su siguiente
+ronda.
+"""
+import os
+import threading
+from typing import Callable, List, Optional, Tuple
+from sqlalchemy import select, func
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, engine
+
+TAREAS_HABILITADAS = os.getenv("TAREAS_HABILITADAS", "true").lower() == "true"
+CLAVE_LIDER = 72_060_045  # Advisory lock de las tareas únicas
+
+_tareas: List[Tuple[str, int, Callable[[Session], object], bool]] = []
+_hilos: List[threading.Thread] = []
+_detener = threading.Event()
+
+def registrar_tarea(nombre: str, intervalo: int, funcion: Callable[[Session], object], unica: bool = False):
+    """
+    Registrar una función que recibe una sesión y se ejecuta cada `intervalo` segundos.
+    `unica`: solo la ejecuta el worker líder
+    """
+    _tareas.append((nombre, intervalo, funcion, unica))
+
+def _ejecutar(nombre: str, funcion: Callable[[Session], object]):
+    db = SessionLocal()
+    try:
+        funcion(db)
+    except Exception as e:
+        db.rollback()
+        print(f"Error en tarea periódica '{nombre}': {e}")
+    finally:
+        db.close()
+
+_lider: Optional[Connection] = None
+_candado_lider = threading.Lock()
+
+def es_lider() -> bool:
+    """Si este proceso debe ejecutar las tareas únicas (siempre, fuera de PostgreSQL)"""
+    global _lider
+    if engine.dialect.name != "postgresql":
+        return True
+    with _candado_lider:
+        if _lider is not None:
+            try:
+                _lider.execute(select(1))
+                _lider.commit()
+                return True
+            except Exception:
+                # Se perdió la conexión y con ella el lock
+                _lider.invalidate()
+                _lider = None
+        conexion = engine.connect()
+        if conexion.execute(select(func.pg_try_advisory_lock(CLAVE_LIDER))).scalar():
+            conexion.commit()
+            _lider = conexion
+            return True
+        conexion.close()
+        return False
+
+def _soltar_liderazgo():
+    global _lider
+    with _candado_lider:
+        if _lider is not None:
+            # Al cerrar la conexión PostgreSQL libera el lock de sesión
+            _lider.invalidate()
+            _lider = None
+
+def _bucle(nombre: str, intervalo: int, funcion: Callable[[Session], object], unica: bool):
+    while not _detener.is_set():
+        try:
+            if not unica or es_lider():
+                _ejecutar(nombre, funcion)
+        except Exception as e:
+            print(f"Error en tarea periódica '{nombre}': {e}")
+        _detener.wait(intervalo)
+
+def iniciar_tareas():
+    """Arrancar un hilo por cada tarea registrada"""
+    if not TAREAS_HABILITADAS or _hilos:
+        return
+    _detener.clear()
+    for nombre, intervalo, funcion, unica in _tareas:
+        hilo = threading.Thread(
+            target=_bucle, args=(nombre, intervalo, funcion, unica),
+            name=f"tarea-{nombre}", daemon=True
+        )
+        hilo.start()
+        _hilos.append(hilo)
+
+def detener_tareas():
+    """Señalar a los hilos que terminen en su próxima espera"""
+    _detener.set()
+    _hilos.clear()
+    _soltar_liderazgo()
@@ -0,0 +1,20 @@
+"""
+Presupuesto de arranque en frío de un worker
+Falla si la mediana de lo que tarda un intérprete nuevo en importar main y ejecutar el
+startup supera perfil_arranque.PRESUPUESTO_MS (ARRANQUE_PRESUPUESTO_MS, por defecto 2500).
+Si falla, `python perfil_arranque.py` muestra qué importación creció.
+"""
+import statistics
+
+import perfil_arranque
+
+REPETICIONES = 3
+
+def test_arranque_dentro_del_presupuesto():
+    assert perfil_arranque.PRESUPUESTO_MS > 0, "ARRANQUE_PRESUPUESTO_MS debe fijar un presupuesto"
+    with perfil_arranque.base_temporal():
+        mediciones = [perfil_arranque.medir_arranque() for _ in range(REPETICIONES)]
+    listo = statistics.median(m["listo_ms"] for m in mediciones)
+    assert listo <= perfil_arranque.PRESUPUESTO_MS, (
+        f"Arranque en frío {listo:.0f} ms > presupuesto {perfil_arranque.PRESUPUESTO_MS} ms"
+    )
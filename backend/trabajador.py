@@ -0,0 +1,48 @@
+"""
+Worker de gunicorn con detención ordenada (worker_class en gunicorn.conf.py)
+Igual que uvicorn.workers.UvicornWorker, pero el servidor avisa a detencion.py en cuanto
+decide terminar, en lugar de hacerlo recién en el evento shutdown de la aplicación (que
+uvicorn ejecuta después de dejar de aceptar conexiones y de esperar a las abiertas).
+
+- WEB_ESPERA_DRENADO_SEGUNDOS: tras un SIGTERM el worker sigue atendiendo este tiempo con
+  /ready en 503 antes de cerrar (0 = cerrar de inmediato). Un segundo SIGTERM no espera.
+"""
+import asyncio
+import os
+import signal
+import sys
+from types import FrameType
+from typing import Optional
+
+from gunicorn.arbiter import Arbiter
+from uvicorn.server import Server
+from uvicorn.workers import UvicornWorker
+
+import detencion
+
+ESPERA_DRENADO = float(os.getenv("WEB_ESPERA_DRENADO_SEGUNDOS", "0"))
+
+class ServidorOrdenado(Server):
+    def handle_exit(self, sig: int, frame: Optional[FrameType]) -> None:
+        if sig == signal.SIGTERM and ESPERA_DRENADO > 0 and detencion.estado["aceptando"]:
+            detencion.iniciar()
+            asyncio.get_event_loop().call_later(ESPERA_DRENADO, super().handle_exit, sig, frame)
+            return
+        detencion.iniciar()
+        super().handle_exit(sig, frame)
+
+    async def on_tick(self, counter: int) -> bool:
+        salir = await super().on_tick(counter)
+        if salir:
+            # Último tick antes de cerrar los sockets y esperar a las conexiones abiertas
+            detencion.cerrar_flujos()
+        return salir
+
+class TrabajadorUvicorn(UvicornWorker):
+    async def _serve(self) -> None:
+        self.config.app = self.wsgi
+        server = ServidorOrdenado(config=self.config)
+        self._install_sigquit_handler()
+        await server.serve(sockets=self.sockets)
+        if not server.started:
+            sys.exit(Arbiter.WORKER_BOOT_ERROR)
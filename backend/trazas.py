@@ -0,0 +1,382 @@
+"""
+Trazas de solicitudes (spans al estilo OpenTelemetry, sin dependencias)
+Cada solicitud recibe una traza con un span raíz y spans hijos para la decodificación del
+JWT, la búsqueda del usuario, cada sentencia SQL, la llamada a Deepseek y las fases del
+registro de producción. Así se sabe en qué parte se va el tiempo de un `/api/ai/chat` o
+un `/registrar-produccion` lento.
+
+- TRAZAS_EXPORTADOR: "archivo" (una línea JSON por span en TRAZAS_ARCHIVO), "otlp" (lotes
+  OTLP/JSON por HTTP a TRAZAS_OTLP_URL) o vacío para no trazar (por defecto)
+- TRAZAS_MUESTREO: fracción de solicitudes cuyos spans se exportan (por defecto 1.0). Se
+  respeta la decisión de un `traceparent` entrante (W3C Trace Context)
+
+La respuesta lleva `traceparent` y `X-Trace-Id`, la llamada a Deepseek propaga
+`traceparent`, y los logs emitidos durante la solicitud terminan con `trace_id=...`.
+
+    python trazas.py recolector --puerto 4318 --archivo trazas.jsonl   # colector OTLP local
+    python trazas.py arbol trazas.jsonl [--traza <id>]                  # árbol de spans
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import string
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+EXPORTADOR = os.getenv("TRAZAS_EXPORTADOR", "").lower()
+ARCHIVO = os.getenv("TRAZAS_ARCHIVO", "trazas.jsonl")
+OTLP_URL = os.getenv("TRAZAS_OTLP_URL", "http://localhost:4318/v1/traces")
+MUESTREO = float(os.getenv("TRAZAS_MUESTREO", "1.0"))
+INTERVALO_EXPORTACION = float(os.getenv("TRAZAS_INTERVALO_SEGUNDOS", "2"))
+SERVICIO = os.getenv("TRAZAS_SERVICIO", "inventario-api")
+LARGO_MAXIMO_SQL = 500
+
+HABILITADO = EXPORTADOR in ("archivo", "otlp")
+
+class Span:
+    __slots__ = ("traza_id", "span_id", "padre_id", "nombre", "inicio", "fin", "atributos", "error", "muestreada")
+
+    def __init__(self, nombre: str, traza_id: str, padre_id: Optional[str], muestreada: bool, atributos: Dict):
+        self.traza_id = traza_id
+        self.span_id = os.urandom(8).hex()
+        self.padre_id = padre_id
+        self.nombre = nombre
+        self.inicio = time.time_ns()
+        self.fin = 0
+        self.atributos = atributos
+        self.error: Optional[str] = None
+        self.muestreada = muestreada
+
+    def traceparent(self) -> str:
+        return f"00-{self.traza_id}-{self.span_id}-{'01' if self.muestreada else '00'}"
+
+    def terminar(self, error: Optional[BaseException] = None):
+        self.fin = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        if self.muestreada:
+            _exportar(self)
+
+    def como_dict(self) -> Dict:
+        return {
+            "trace_id": self.traza_id,
+            "span_id": self.span_id,
+            "parent_id": self.padre_id,
+            "name": self.nombre,
+            "start_ns": self.inicio,
+            "duration_ms": round((self.fin - self.inicio) / 1e6, 3),
+            "attributes": self.atributos,
+            "error": self.error,
+        }
+
+_actual: ContextVar[Optional[Span]] = ContextVar("span_actual", default=None)
+
+def actual() -> Optional[Span]:
+    return _actual.get()
+
+def iniciar(nombre: str, **atributos) -> Optional[Span]:
+    """Span hijo del actual sin volverlo el actual (SQL); None si la solicitud no se exporta"""
+    padre = _actual.get()
+    if padre is None or not padre.muestreada:
+        return None
+    return Span(nombre, padre.traza_id, padre.span_id, True, atributos)
+
+@contextmanager
+def span(nombre: str, **atributos):
+    """Span hijo del actual mientras dura el bloque"""
+    hijo = iniciar(nombre, **atributos)
+    if hijo is None:
+        yield None
+        return
+    token = _actual.set(hijo)
+    try:
+        yield hijo
+    except BaseException as e:
+        hijo.terminar(e)
+        raise
+    else:
+        hijo.terminar()
+    finally:
+        _actual.reset(token)
+
+# Middleware
+
+def _leer_traceparent(valor: str):
+    partes = valor.strip().lower().split("-")
+    if len(partes) != 4 or [len(p) for p in partes] != [2, 32, 16, 2] or partes[1] == "0" * 32:
+        return None
+    if any(c not in string.hexdigits for c in "".join(partes)):
+        return None
+    return partes[1], partes[2], int(partes[3], 16) & 1 == 1
+
+class TrazasMiddleware:
+    """Middleware ASGI que abre el span raíz de cada solicitud"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        entrante = None
+        for nombre, valor in scope["headers"]:
+            if nombre == b"traceparent":
+                entrante = _leer_traceparent(valor.decode("latin-1"))
+                break
+        if entrante is not None:
+            traza_id, padre_id, muestreada = entrante
+        else:
+            traza_id, padre_id, muestreada = os.urandom(16).hex(), None, random.random() < MUESTREO
+        raiz = Span(f"{scope['method']} {scope['path']}", traza_id, padre_id, muestreada, {
+            "http.method": scope["method"],
+            "http.target": scope["path"],
+        })
+        token = _actual.set(raiz)
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                raiz.atributos["http.status_code"] = mensaje["status"]
+                mensaje["headers"] = list(mensaje.get("headers", [])) + [
+                    (b"traceparent", raiz.traceparent().encode()),
+                    (b"x-trace-id", traza_id.encode()),
+                ]
+            await send(mensaje)
+
+        error = None
+        try:
+            await self.app(scope, receive, enviar)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            ruta = scope.get("route")
+            if ruta is not None and hasattr(ruta, "path"):
+                raiz.nombre = f"{scope['method']} {scope.get('root_path', '')}{ruta.path}"
+                raiz.atributos["http.route"] = f"{scope.get('root_path', '')}{ruta.path}"
+            if error is None and raiz.atributos.get("http.status_code", 200) >= 500:
+                raiz.error = f"HTTP {raiz.atributos['http.status_code']}"
+            raiz.terminar(error)
+            _actual.reset(token)
+
+# SQL
+
+def _antes_de_sql(conn, cursor, statement, parameters, context, executemany):
+    sql = iniciar("db.query", **{"db.statement": statement[:LARGO_MAXIMO_SQL], "db.executemany": executemany})
+    if sql is not None:
+        context._span_traza = sql
+
+def _despues_de_sql(conn, cursor, statement, parameters, context, executemany):
+    sql = getattr(context, "_span_traza", None)
+    if sql is not None:
+        sql.atributos["db.rowcount"] = cursor.rowcount
+        sql.terminar()
+        context._span_traza = None
+
+def _error_sql(contexto_excepcion):
+    sql = getattr(contexto_excepcion.execution_context, "_span_traza", None)
+    if sql is not None:
+        sql.terminar(contexto_excepcion.original_exception)
+        contexto_excepcion.execution_context._span_traza = None
+
+def instrumentar_engine(engine):
+    from sqlalchemy import event
+    event.listen(engine, "before_cursor_execute", _antes_de_sql)
+    event.listen(engine, "after_cursor_execute", _despues_de_sql)
+    event.listen(engine, "handle_error", _error_sql)
+
+# Logs
+
+class _FormatoConTraza(logging.Formatter):
+    """Agrega trace_id al final de cada línea emitida dentro de una solicitud trazada"""
+    def __init__(self, base: Optional[logging.Formatter]):
+        super().__init__()
+        self.base = base or logging.Formatter()
+
+    def format(self, record):
+        texto = self.base.format(record)
+        traza = _actual.get()
+        return f"{texto} trace_id={traza.traza_id}" if traza is not None else texto
+
+def configurar_logs():
+    """Envolver el formato de los handlers de la aplicación, uvicorn y gunicorn"""
+    fabrica = logging.getLogRecordFactory()
+
+    def con_traza(*args, **kwargs):
+        record = fabrica(*args, **kwargs)
+        traza = _actual.get()
+        record.trace_id = traza.traza_id if traza is not None else ""
+        record.span_id = traza.span_id if traza is not None else ""
+        return record
+
+    logging.setLogRecordFactory(con_traza)
+    for nombre in ("", "uvicorn", "uvicorn.error", "uvicorn.access", "gunicorn.error", "gunicorn.access"):
+        for handler in logging.getLogger(nombre).handlers:
+            if not isinstance(handler.formatter, _FormatoConTraza):
+                handler.setFormatter(_FormatoConTraza(handler.formatter))
+
+# Exportación
+
+_pendientes: deque = deque()
+_despertar = threading.Event()
+_hilo: Optional[threading.Thread] = None
+_candado_hilo = threading.Lock()
+
+def _exportar(terminado: Span):
+    global _hilo
+    _pendientes.append(terminado)
+    if _hilo is None:
+        with _candado_hilo:
+            if _hilo is None:
+                _hilo = threading.Thread(target=_bucle, name="trazas", daemon=True)
+                _hilo.start()
+
+def _tipo(s: Span) -> int:
+    """SpanKind de OTLP: SERVER para el raíz, CLIENT para SQL y HTTP salientes, INTERNAL el resto"""
+    if "http.method" in s.atributos:
+        return 2
+    if "db.statement" in s.atributos or "http.url" in s.atributos:
+        return 3
+    return 1
+
+def _otlp(spans: List[Span]) -> Dict:
+    def atributos(valores: Dict) -> List[Dict]:
+        convertidos = []
+        for clave, valor in valores.items():
+            if isinstance(valor, bool):
+                convertido = {"boolValue": valor}
+            elif isinstance(valor, int):
+                convertido = {"intValue": str(valor)}
+            elif isinstance(valor, float):
+                convertido = {"doubleValue": valor}
+            else:
+                convertido = {"stringValue": str(valor)}
+            convertidos.append({"key": clave, "value": convertido})
+        return convertidos
+
+    return {"resourceSpans": [{
+        "resource": {"attributes": atributos({"service.name": SERVICIO, "process.pid": os.getpid()})},
+        "scopeSpans": [{
+            "scope": {"name": "trazas"},
+            "spans": [{
+                "traceId": s.traza_id,
+                "spanId": s.span_id,
+                "parentSpanId": s.padre_id or "",
+                "name": s.nombre,
+                "kind": _tipo(s),
+                "startTimeUnixNano": str(s.inicio),
+                "endTimeUnixNano": str(s.fin),
+                "attributes": atributos(s.atributos),
+                "status": {"code": 2, "message": s.error} if s.error else {},
+            } for s in spans],
+        }],
+    }]}
+
+def vaciar() -> int:
+    """Exportar los spans pendientes; retorna cuántos se exportaron"""
+    spans = []
+    while _pendientes:
+        spans.append(_pendientes.popleft())
+    if not spans:
+        return 0
+    if EXPORTADOR == "otlp":
+        import urllib.request
+        solicitud = urllib.request.Request(
+            OTLP_URL, data=json.dumps(_otlp(spans)).encode(), headers={"Content-Type": "application/json"}
+        )
+        urllib.request.urlopen(solicitud, timeout=5).close()
+    else:
+        with open(ARCHIVO, "a", encoding="utf-8") as salida:
+            salida.write("".join(json.dumps(s.como_dict()) + "\n" for s in spans))
+    return len(spans)
+
+def _bucle():
+    while True:
+        _despertar.wait(INTERVALO_EXPORTACION)
+        _despertar.clear()
+        try:
+            vaciar()
+        except Exception as e:
+            print(f"Error exportando trazas: {e}")
+
+# Herramientas de línea de comandos
+
+def _recolector(puerto: int, archivo: str):
+    """Colector OTLP/JSON mínimo: recibe lotes en /v1/traces y los guarda como líneas JSON"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Manejador(BaseHTTPRequestHandler):
+        def do_POST(self):
+            cuerpo = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            lineas = []
+            for recurso in cuerpo.get("resourceSpans", []):
+                for alcance in recurso.get("scopeSpans", []):
+                    for s in alcance.get("spans", []):
+                        inicio, fin = int(s["startTimeUnixNano"]), int(s["endTimeUnixNano"])
+                        lineas.append(json.dumps({
+                            "trace_id": s["traceId"], "span_id": s["spanId"], "parent_id": s.get("parentSpanId") or None,
+                            "name": s["name"], "start_ns": inicio, "duration_ms": round((fin - inicio) / 1e6, 3),
+                            "attributes": {a["key"]: next(iter(a["value"].values())) for a in s.get("attributes", [])},
+                            "error": s.get("status", {}).get("message"),
+                        }) + "\n")
+            with open(archivo, "a", encoding="utf-8") as salida:
+                salida.write("".join(lineas))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            pass
+
+    print(f"Colector OTLP en http://0.0.0.0:{puerto}/v1/traces -> {archivo}")
+    ThreadingHTTPServer(("0.0.0.0", puerto), Manejador).serve_forever()
+
+def _arbol(archivo: str, traza: Optional[str]):
+    """Imprimir las trazas del archivo como árbol de spans con su duración"""
+    spans: Dict[str, List[Dict]] = {}
+    with open(archivo, encoding="utf-8") as entrada:
+        for linea in entrada:
+            if linea.strip():
+                s = json.loads(linea)
+                if traza is None or s["trace_id"] == traza:
+                    spans.setdefault(s["trace_id"], []).append(s)
+    for traza_id, lista in spans.items():
+        ids = {s["span_id"] for s in lista}
+        hijos: Dict[Optional[str], List[Dict]] = {}
+        for s in sorted(lista, key=lambda s: s["start_ns"]):
+            hijos.setdefault(s["parent_id"] if s["parent_id"] in ids else None, []).append(s)
+        print(f"traza {traza_id}")
+
+        def imprimir(s: Dict, nivel: int):
+            detalle = " ".join(str(s["attributes"].get("db.statement", "")).split())
+            error = f"  ERROR {s['error']}" if s.get("error") else ""
+            print(f"{'  ' * nivel}{s['duration_ms']:>10.2f} ms  {s['name']}  {detalle[:80]}{error}")
+            for hijo in hijos.get(s["span_id"], []):
+                imprimir(hijo, nivel + 1)
+
+        for raiz in hijos.get(None, []):
+            imprimir(raiz, 1)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Herramientas de trazas")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+    recolector = subcomandos.add_parser("recolector", help="Colector OTLP/JSON local que escribe en un archivo")
+    recolector.add_argument("--puerto", type=int, default=4318)
+    recolector.add_argument("--archivo", default=ARCHIVO)
+    arbol = subcomandos.add_parser("arbol", help="Mostrar las trazas de un archivo como árbol")
+    arbol.add_argument("archivo", nargs="?", default=ARCHIVO)
+    arbol.add_argument("--traza", help="Solo esta traza (trace id)")
+    args = parser.parse_args(argv)
+
+    if args.comando == "recolector":
+        _recolector(args.puerto, args.archivo)
+    else:
+        _arbol(args.archivo, args.traza)
+
+if __name__ == "__main__":
+    main()
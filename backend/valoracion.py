@@ -0,0 +1,208 @@
+"""
+Valoración del inventario en una fecha pasada
+Los saldos se reconstruyen hacia atrás desde cantidad_actual restando las variaciones
+posteriores a la fecha, leídas por rango sobre los índices de fecha:
+- asientos del libro de stock (todas las variaciones desde que existe el libro)
+- historial anterior al libro: movimientos, salidas y descuentos por producción
+  ocurridos antes del asiento de apertura de cada item, incluido el archivo frío
+"""
+from datetime import datetime
+from typing import Dict, Optional
+from sqlalchemy import (
+    select, insert, func, case, literal, union_all, and_, Table, MetaData, Column, Integer, Float, String
+)
+from sqlalchemy.orm import Session
+
+from models import (
+    MateriaPrima, ProductoTerminado, Producto, AsientoStock, MovimientoMateriaPrima,
+    MovimientoProducto, RegistroSalida, HistorialDescuentoMateriaPrima
+)
+from libro_stock import MATERIA_PRIMA, PRODUCTO_TERMINADO
+from vencimientos import unidad_negocio
+import archivo_historial
+
+def _signo(tipo, cantidad):
+    return case((tipo == "entrada", cantidad), else_=-cantidad)
+
+def _variaciones_historial(fecha: datetime):
+    """Variaciones registradas en las tablas de historial después de `fecha`"""
+    return union_all(
+        select(
+            literal(MATERIA_PRIMA).label("tipo_item"),
+            MovimientoMateriaPrima.materia_prima_id.label("item_id"),
+            _signo(MovimientoMateriaPrima.tipo, MovimientoMateriaPrima.cantidad).label("delta"),
+            MovimientoMateriaPrima.created_at.label("fecha")
+        ).where(MovimientoMateriaPrima.created_at > fecha),
+        select(
+            literal(PRODUCTO_TERMINADO),
+            MovimientoProducto.producto_id,
+            _signo(MovimientoProducto.tipo, MovimientoProducto.cantidad),
+            MovimientoProducto.created_at
+        ).where(MovimientoProducto.created_at > fecha),
+        select(
+            RegistroSalida.tipo_item,
+            func.coalesce(RegistroSalida.materia_prima_id, RegistroSalida.producto_terminado_id),
+            -RegistroSalida.cantidad_salida,
+            RegistroSalida.created_at
+        ).where(RegistroSalida.created_at > fecha),
+        select(
+            literal(MATERIA_PRIMA),
+            HistorialDescuentoMateriaPrima.materia_prima_id,
+            -HistorialDescuentoMateriaPrima.cantidad_descontada,
+            HistorialDescuentoMateriaPrima.fecha_descuento
+        ).where(HistorialDescuentoMateriaPrima.fecha_descuento > fecha)
+    ).subquery("historial")
+
+_archivadas = Table(
+    "variaciones_archivadas", MetaData(),
+    Column("tipo_item", String(50)),
+    Column("item_id", Integer),
+    Column("delta", Float),
+    prefixes=["TEMPORARY"]
+)
+
+def _variaciones_archivadas(db: Session, fecha: datetime):
+    """
+    Variaciones del archivo frío posteriores a `fecha` y anteriores a la apertura de cada item.
+    Se cargan en una tabla temporal de la conexión actual; None si no hay nada archivado
+    después de `fecha`.
+    """
+    ultimas = [archivo_historial.ultima_fecha_archivada(tabla) for tabla in archivo_historial.TABLAS]
+    if not any(ultima is not None and ultima > fecha for ultima in ultimas):
+        return None
+
+    aperturas = {MATERIA_PRIMA: {}, PRODUCTO_TERMINADO: {}}
+    for tipo, item_id, abierto_en in db.execute(
+        select(AsientoStock.tipo_item, AsientoStock.item_id, func.min(AsientoStock.created_at))
+        .where(AsientoStock.origen == "apertura")
+        .group_by(AsientoStock.tipo_item, AsientoStock.item_id)
+    ):
+        aperturas[tipo][item_id] = abierto_en
+
+    # (tipo, tabla, columna del item, columna de cantidad, columna de tipo de movimiento)
+    fuentes = [
+        (MATERIA_PRIMA, "historial_descuentos_materias_primas", "materia_prima_id", "cantidad_descontada", None),
+        (MATERIA_PRIMA, "registros_salidas", "materia_prima_id", "cantidad_salida", None),
+        (PRODUCTO_TERMINADO, "registros_salidas", "producto_terminado_id", "cantidad_salida", None),
+        (MATERIA_PRIMA, "movimientos_materia_prima", "materia_prima_id", "cantidad", "tipo"),
+        (PRODUCTO_TERMINADO, "movimientos_productos", "producto_id", "cantidad", "tipo"),
+    ]
+    filas = []
+    for tipo, tabla, columna_id, columna_cantidad, columna_tipo in fuentes:
+        sumas = archivo_historial.sumar_archivo(
+            tabla, columna_id, columna_cantidad, fecha, aperturas[tipo], columna_tipo
+        )
+        # Salidas y descuentos restan; los movimientos ya vienen con signo
+        signo = 1 if columna_tipo else -1
+        filas.extend({"tipo_item": tipo, "item_id": item_id, "delta": signo * total} for item_id, total in sumas.items())
+    if not filas:
+        return None
+
+    conexion = db.connection()
+    _archivadas.drop(conexion, checkfirst=True)
+    _archivadas.create(conexion)
+    conexion.execute(insert(_archivadas), filas)
+    return select(_archivadas.c.tipo_item, _archivadas.c.item_id, _archivadas.c.delta)
+
+def variaciones_posteriores(fecha: datetime, archivadas=None):
+    """
+    Subconsulta (tipo_item, item_id, total) con la suma de variaciones posteriores a `fecha`.
+    Lo anterior a la apertura del libro se toma del historial; lo demás, del libro.
+    """
+    apertura = select(
+        AsientoStock.tipo_item,
+        AsientoStock.item_id,
+        func.min(AsientoStock.created_at).label("abierto_en")
+    ).where(AsientoStock.origen == "apertura").group_by(
+        AsientoStock.tipo_item, AsientoStock.item_id
+    ).subquery("apertura")
+
+    historial = _variaciones_historial(fecha)
+    previas_al_libro = select(historial.c.tipo_item, historial.c.item_id, historial.c.delta).join(
+        apertura,
+        and_(apertura.c.tipo_item == historial.c.tipo_item, apertura.c.item_id == historial.c.item_id)
+    ).where(historial.c.fecha < apertura.c.abierto_en)
+
+    libro = select(AsientoStock.tipo_item, AsientoStock.item_id, AsientoStock.delta).where(
+        AsientoStock.created_at > fecha,
+        AsientoStock.origen != "apertura"
+    )
+
+    partes = [libro, previas_al_libro] + ([archivadas] if archivadas is not None else [])
+    variaciones = union_all(*partes).subquery("variaciones")
+    return select(
+        variaciones.c.tipo_item,
+        variaciones.c.item_id,
+        func.sum(variaciones.c.delta).label("total")
+    ).group_by(variaciones.c.tipo_item, variaciones.c.item_id).subquery("posteriores")
+
+def valorar_inventario(db: Session, fecha: Optional[datetime] = None) -> Dict:
+    """
+    Existencias y valor a una fecha. Los productos terminados se valoran a precio de
+    producción y de venta y se agrupan por unidad de negocio; las materias primas no
+    tienen precio y se reportan solo en cantidad por inventario y unidad de medida.
+    """
+    fecha = fecha or datetime.utcnow()
+    archivadas = _variaciones_archivadas(db, fecha)
+    posteriores = variaciones_posteriores(fecha, archivadas)
+
+    # Productos terminados
+    pt = select(
+        unidad_negocio.label("unidad_negocio"),
+        (ProductoTerminado.cantidad_actual - func.coalesce(posteriores.c.total, 0)).label("saldo"),
+        ProductoTerminado.precio_produccion,
+        func.coalesce(ProductoTerminado.precio_venta, 0).label("precio_venta")
+    ).select_from(ProductoTerminado).outerjoin(
+        posteriores,
+        and_(posteriores.c.tipo_item == PRODUCTO_TERMINADO, posteriores.c.item_id == ProductoTerminado.id)
+    ).outerjoin(
+        Producto, Producto.codigo == ProductoTerminado.codigo
+    ).where(ProductoTerminado.created_at <= fecha).subquery("saldos_pt")
+
+    productos = [
+        dict(row._mapping)
+        for row in db.execute(
+            select(
+                pt.c.unidad_negocio,
+                func.count().label("lotes"),
+                func.sum(pt.c.saldo).label("cantidad"),
+                func.sum(pt.c.saldo * pt.c.precio_produccion).label("valor_produccion"),
+                func.sum(pt.c.saldo * pt.c.precio_venta).label("valor_venta")
+            ).where(pt.c.saldo > 0).group_by(pt.c.unidad_negocio).order_by(pt.c.unidad_negocio)
+        )
+    ]
+
+    # Materias primas
+    mp = select(
+        MateriaPrima.tipo_inventario,
+        MateriaPrima.unidad_medida,
+        (MateriaPrima.cantidad_actual - func.coalesce(posteriores.c.total, 0)).label("saldo")
+    ).select_from(MateriaPrima).outerjoin(
+        posteriores,
+        and_(posteriores.c.tipo_item == MATERIA_PRIMA, posteriores.c.item_id == MateriaPrima.id)
+    ).where(MateriaPrima.created_at <= fecha).subquery("saldos_mp")
+
+    materias = [
+        dict(row._mapping)
+        for row in db.execute(
+            select(
+                mp.c.tipo_inventario,
+                mp.c.unidad_medida,
+                func.count().label("lotes"),
+                func.sum(mp.c.saldo).label("cantidad")
+            ).where(mp.c.saldo > 0).group_by(
+                mp.c.tipo_inventario, mp.c.unidad_medida
+            ).order_by(mp.c.tipo_inventario, mp.c.unidad_medida)
+        )
+    ]
+
+    if archivadas is not None:
+        _archivadas.drop(db.connection())
+
+    return {
+        "fecha": fecha,
+        "productos_terminados": productos,
+        "total_valor_produccion": sum(p["valor_produccion"] or 0 for p in productos),
+        "total_valor_venta": sum(p["valor_venta"] or 0 for p in productos),
+        "materias_primas": materias
+    }
@@ -0,0 +1,103 @@
+"""
+Servicio de vencimientos de productos terminados
+Consultas indexadas por fecha de vencimiento y escáner que mantiene
+la tabla precalculada de alertas (alertas_vencimiento)
+"""
+import os
+from datetime import datetime, timedelta
+from typing import List, Dict
+from sqlalchemy import func, select, insert, delete, literal
+from sqlalchemy.orm import Session
+
+from models import ProductoTerminado, Producto, AlertaVencimiento
+
+HORIZONTE_DIAS = int(os.getenv("VENCIMIENTOS_HORIZONTE_DIAS", "30"))
+INTERVALO_ESCANEO = int(os.getenv("VENCIMIENTOS_INTERVALO_SEGUNDOS", "3600"))
+
+SIN_UNIDAD_NEGOCIO = "Sin unidad de negocio"
+SIN_UBICACION = "Sin ubicación"
+
+# ProductoTerminado no guarda la unidad de negocio: se toma del Producto con el mismo código
+unidad_negocio = func.coalesce(Producto.unidad_negocio, SIN_UNIDAD_NEGOCIO)
+valor_en_riesgo = ProductoTerminado.cantidad_actual * ProductoTerminado.precio_produccion
+
+def _filtro_horizonte(stmt, dias: int, incluir_vencidos: bool = True):
+    """Aplica el rango de fechas sobre el índice de fecha_vencimiento"""
+    ahora = datetime.utcnow()
+    stmt = stmt.where(
+        ProductoTerminado.fecha_vencimiento <= ahora + timedelta(days=dias),
+        ProductoTerminado.cantidad_actual > 0
+    )
+    if not incluir_vencidos:
+        stmt = stmt.where(ProductoTerminado.fecha_vencimiento >= ahora)
+    return stmt
+
+def _select_lotes():
+    return select(
+        ProductoTerminado.id.label("producto_terminado_id"),
+        ProductoTerminado.codigo,
+        ProductoTerminado.nombre,
+        ProductoTerminado.lote,
+        ProductoTerminado.ubicacion,
+        unidad_negocio.label("unidad_negocio"),
+        ProductoTerminado.fecha_vencimiento,
+        ProductoTerminado.cantidad_actual.label("cantidad"),
+        valor_en_riesgo.label("valor_en_riesgo")
+    ).select_from(ProductoTerminado).outerjoin(
+        Producto, Producto.codigo == ProductoTerminado.codigo
+    )
+
+def lotes_por_vencer(
+    db: Session,
+    dias: int = HORIZONTE_DIAS,
+    incluir_vencidos: bool = True,
+    skip: int = 0,
+    limit: int = 100
+) -> List[Dict]:
+    """Lotes con existencias que vencen dentro del horizonte, del más próximo al más lejano"""
+    stmt = _filtro_horizonte(_select_lotes(), dias, incluir_vencidos)
+    stmt = stmt.order_by(ProductoTerminado.fecha_vencimiento).offset(skip).limit(limit)
+    return [dict(row._mapping) for row in db.execute(stmt)]
+
+def resumen_por_vencer(
+    db: Session,
+    dias: int = HORIZONTE_DIAS,
+    agrupar_por: str = "ubicacion",
+    incluir_vencidos: bool = True
+) -> List[Dict]:
+    """Agrupa los lotes por vencer por ubicación o unidad de negocio; el valor se suma en la BD"""
+    if agrupar_por == "unidad_negocio":
+        grupo = unidad_negocio
+    else:
+        grupo = func.coalesce(ProductoTerminado.ubicacion, SIN_UBICACION)
+
+    stmt = select(
+        grupo.label("grupo"),
+        func.count(ProductoTerminado.id).label("lotes"),
+        func.sum(ProductoTerminado.cantidad_actual).label("cantidad"),
+        func.sum(valor_en_riesgo).label("valor_en_riesgo"),
+        func.min(ProductoTerminado.fecha_vencimiento).label("proximo_vencimiento")
+    ).select_from(ProductoTerminado).outerjoin(
+        Producto, Producto.codigo == ProductoTerminado.codigo
+    )
+    stmt = _filtro_horizonte(stmt, dias, incluir_vencidos)
+    stmt = stmt.group_by(grupo).order_by(func.sum(valor_en_riesgo).desc())
+    return [dict(row._mapping) for row in db.execute(stmt)]
+
+def escanear_vencimientos(db: Session, dias: int = HORIZONTE_DIAS) -> int:
+    """
+    Recalcula la tabla de alertas de vencimiento con un INSERT ... SELECT
+    El dashboard solo necesita una lectura indexada sobre alertas_vencimiento
+    """
+    stmt = _filtro_horizonte(_select_lotes(), dias)
+    stmt = stmt.add_columns(literal(datetime.utcnow()).label("escaneado_en"))
+    columnas = [
+        "producto_terminado_id", "codigo", "nombre", "lote", "ubicacion",
+        "unidad_negocio", "fecha_vencimiento", "cantidad", "valor_en_riesgo",
+        "escaneado_en"
+    ]
+
+    db.execute(delete(AlertaVencimiento))
+    resultado = db.execute(insert(AlertaVencimiento).from_select(columnas, stmt))
+    db.commit()
+    return resultado.rowcount
@@ -1,10 +1,6 @@
 import { useEffect, useState } from 'react'
 import { useAuthStore } from '../store/authStore'
-import { 
-  materiasPrimasService, 
-  productosService, 
-  gastosService 
-} from '../services/api'
+import { dashboardService, suscribirEventos } from '../services/api'
 import { 
   Package, 
   ShoppingCart, 
@@ -27,31 +23,29 @@ const Dashboard = () => {
 
   useEffect(() => {
     loadDashboardData()
+    // Recargar el resumen cuando un item cruza su stock mínimo
+    return suscribirEventos('/notificaciones/stock-bajo', {
+      stock_bajo: () => loadDashboardData(),
+    })
   }, [])
 
   const loadDashboardData = async () => {
     try {
-      const [materiasRes, productosRes, gastosRes, alertasMateriasRes, alertasProductosRes] = await Promise.all([
-        materiasPrimasService.getAll(),
-        productosService.getAll(),
-        gastosService.getAll(),
-        materiasPrimasService.getStockBajo(),
-        productosService.getStockBajo()
-      ])
-
-      const gastosTotal = gastosRes.data.reduce((sum, gasto) => sum + gasto.monto, 0)
+      // Un solo resumen precalculado en el servidor
+      const { data } = await dashboardService.getResumen()
 
       setStats({
-        materiasPrimas: materiasRes.data.length,
-        productos: productosRes.data.length,
-        gastosTotal,
-        alertas: alertasMateriasRes.data.length + alertasProductosRes.data.length
+        materiasPrimas: data.materias_primas.total,
+        productos: data.productos_terminados.total,
+        gastosTotal: data.gasto_mes.total,
+        alertas: data.materias_primas.stock_bajo + data.productos_terminados.stock_bajo
       })
 
-      setAlertas([
-        ...alertasMateriasRes.data.map(m => ({ tipo: 'Materia Prima', nombre: m.nombre, cantidad: m.cantidad_actual })),
-        ...alertasProductosRes.data.map(p => ({ tipo: 'Producto', nombre: p.nombre, cantidad: p.cantidad_actual }))
-      ])
+      setAlertas(data.alertas_stock_bajo.map(item => ({
+        tipo: item.tipo_item === 'materia_prima' ? 'Materia Prima' : 'Producto',
+        nombre: item.nombre,
+        cantidad: item.cantidad_actual
+      })))
     } catch (error) {
       console.error('Error cargando dashboard:', error)
     } finally {
@@ -79,7 +73,7 @@ const Dashboard = () => {
       shadowColor: 'shadow-green-500/20'
     },
     {
-      title: 'Gastos Totales',
+      title: 'Gastos del Mes',
       value: formatCurrency(stats.gastosTotal),
       icon: DollarSign,
       gradient: 'from-purple-500 to-pink-500',
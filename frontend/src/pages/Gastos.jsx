@@ -44,7 +44,8 @@ const Gastos = () => {
   const handleSave = async (formData) => {
     try {
       if (selectedGasto) {
-        await gastosService.update(selectedGasto.id, formData)
+        // La versión leída permite al servidor rechazar (409) la edición si otro usuario lo cambió
+        await gastosService.update(selectedGasto.id, { ...formData, version: selectedGasto.version })
       } else {
         await gastosService.create(formData)
       }
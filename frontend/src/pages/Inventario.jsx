@@ -1,4 +1,5 @@
-import { useEffect, useState } from 'react'
+import { useEffect, useRef, useState } from 'react'
+import { suscribirEventos } from '../services/api'
 import { useAuthStore } from '../store/authStore'
 import { PERMISOS, hasPermission } from '../utils/permissions'
 import { Package, ShoppingCart, ChevronLeft, Search, History } from 'lucide-react'
@@ -23,10 +24,47 @@ const Inventario = () => {
     }
   }, [tipoInventario, filtroTipo, token])
 
+  // Ids de la lista mostrada, para decidir fuera del updater si un delta trae un item nuevo
+  const idsMostrados = useRef(new Set())
+  useEffect(() => {
+    idsMostrados.current = new Set(materiasPrimas.map(item => item.id))
+  }, [materiasPrimas])
+
+  // Aplicar los cambios de otros usuarios sin recargar la lista completa
+  useEffect(() => {
+    if (!tipoInventario) return
+    const tipoItem = tipoInventario === 'materias_primas' ? 'materia_prima' : 'producto_terminado'
+    const recargar = () => (tipoItem === 'materia_prima' ? loadMateriasPrimas() : loadProductosTerminados())
+    return suscribirEventos('/notificaciones/inventario', {
+      inventario: (cambio) => {
+        if (cambio.tipo_item !== tipoItem) return
+        if (cambio.eliminado) {
+          setMateriasPrimas(items => items.filter(item => item.id !== cambio.item_id))
+          return
+        }
+        if (!idsMostrados.current.has(cambio.item_id)) {
+          // Item nuevo: se recarga solo si pertenece a la lista filtrada que se muestra
+          if (tipoItem === 'materia_prima' && cambio.tipo_inventario !== filtroTipo) return
+          idsMostrados.current.add(cambio.item_id)
+          recargar()
+          return
+        }
+        setMateriasPrimas(items => items.map(item => (
+          item.id === cambio.item_id
+            ? { ...item, cantidad_actual: cambio.saldo, version: cambio.version_item ?? item.version }
+            : item
+        )))
+      },
+      recargar,
+    })
+  }, [tipoInventario, filtroTipo])
+
   const loadMateriasPrimas = async () => {
     setLoading(true)
     try {
-      const response = await fetch('/api/materias-primas', {
+      // El filtro por tipo de inventario se aplica en el servidor
+      const params = new URLSearchParams({ tipo_inventario: filtroTipo })
+      const response = await fetch(`/api/materias-primas?${params}`, {
         headers: {
           'Authorization': `Bearer ${token}`,
           'Content-Type': 'application/json',
@@ -34,9 +72,7 @@ const Inventario = () => {
       })
       if (response.ok) {
         const data = await response.json()
-        // Filtrar por tipo de inventario
-        const filtered = data.filter(mp => mp.tipo_inventario === filtroTipo)
-        setMateriasPrimas(filtered)
+        setMateriasPrimas(data)
       }
     } catch (error) {
       console.error('Error cargando materias primas:', error)
@@ -319,7 +355,7 @@ const DetalleMateriaPrima = ({ materia, token, onBack }) => {
 
   const loadHistorialSalidas = async () => {
     try {
-      const response = await fetch(`/api/salidas/historial?tipo_item=materia_prima`, {
+      const response = await fetch(`/api/salidas/historial?tipo_item=materia_prima&materia_prima_id=${materia.id}`, {
         headers: {
           'Authorization': `Bearer ${token}`,
           'Content-Type': 'application/json',
@@ -327,9 +363,7 @@ const DetalleMateriaPrima = ({ materia, token, onBack }) => {
       })
       if (response.ok) {
         const data = await response.json()
-        // Filtrar salidas de esta materia prima específica
-        const filtered = data.filter(s => s.codigo_item === materia.codigo)
-        setHistorialSalidas(filtered)
+        setHistorialSalidas(data)
       }
     } catch (error) {
       console.error('Error cargando historial de salidas:', error)
@@ -9,6 +9,7 @@ const MateriasPrimas = () => {
   const [materias, setMaterias] = useState([])
   const [loading, setLoading] = useState(true)
   const [searchTerm, setSearchTerm] = useState('')
+  const [coincidencias, setCoincidencias] = useState(null)
   const [showModal, setShowModal] = useState(false)
   const [selectedMateria, setSelectedMateria] = useState(null)
   const [formData, setFormData] = useState({
@@ -35,6 +36,32 @@ const MateriasPrimas = () => {
     loadMaterias()
   }, [])
 
+  // Búsqueda difusa en el servidor (tolera errores de tipeo), con espera mientras se escribe
+  useEffect(() => {
+    const termino = searchTerm.trim()
+    if (termino.length < 2) {
+      setCoincidencias(null)
+      return
+    }
+    const temporizador = setTimeout(async () => {
+      try {
+        const params = new URLSearchParams({ q: termino, tipos: 'materia_prima', limit: '100' })
+        const response = await fetch(`/api/busqueda/?${params}`, {
+          headers: {
+            'Authorization': `Bearer ${token}`,
+          },
+        })
+        if (response.ok) {
+          const data = await response.json()
+          setCoincidencias(data.items.map(item => item.id))
+        }
+      } catch (error) {
+        console.error('Error buscando materias primas:', error)
+      }
+    }, 250)
+    return () => clearTimeout(temporizador)
+  }, [searchTerm, token])
+
   const loadMaterias = async () => {
     try {
       const response = await fetch('/api/materias-primas', {
@@ -166,10 +193,12 @@ const MateriasPrimas = () => {
     resetForm()
   }
 
-  const filteredMaterias = materias.filter(m =>
-    m.nombre.toLowerCase().includes(searchTerm.toLowerCase()) ||
-    m.codigo.toLowerCase().includes(searchTerm.toLowerCase())
-  )
+  const filteredMaterias = coincidencias
+    ? coincidencias.map(id => materias.find(m => m.id === id)).filter(Boolean)
+    : materias.filter(m =>
+      m.nombre.toLowerCase().includes(searchTerm.toLowerCase()) ||
+      m.codigo.toLowerCase().includes(searchTerm.toLowerCase())
+    )
 
   if (loading) {
     return <div className="flex justify-center items-center h-64">Cargando...</div>
@@ -195,7 +224,7 @@ const MateriasPrimas = () => {
         <Search size={20} className="absolute left-3 top-3 text-gray-400" />
         <input
           type="text"
-          placeholder="Buscar por código o nombre..."
+          placeholder="Buscar por código, nombre, proveedor o lote..."
           value={searchTerm}
           onChange={(e) => setSearchTerm(e.target.value)}
           className="w-full pl-10 pr-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500"
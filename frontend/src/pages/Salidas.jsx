@@ -1,8 +1,9 @@
-import { useEffect, useState } from 'react'
+import { useEffect, useRef, useState } from 'react'
 import { useAuthStore } from '../store/authStore'
 import { PERMISOS, hasPermission } from '../utils/permissions'
 import { Plus, Search, History, ChevronLeft, AlertCircle, CheckCircle2 } from 'lucide-react'
 import { formatNumber, formatDate } from '../utils/formatters'
+import { crearControlIdempotencia } from '../utils/idempotency'
 
 const Salidas = () => {
   const { user, token } = useAuthStore()
@@ -22,6 +23,7 @@ const Salidas = () => {
   const [filtroTipo, setFiltroTipo] = useState('')
   const [filtroMotivo, setFiltroMotivo] = useState('')
   const [searchHistorial, setSearchHistorial] = useState('')
+  const idempotencia = useRef(crearControlIdempotencia())
 
   const canView = hasPermission(user?.role, PERMISOS.VER_INVENTARIO)
 
@@ -166,9 +168,14 @@ const Salidas = () => {
         headers: {
           'Authorization': `Bearer ${token}`,
           'Content-Type': 'application/json',
+          'Idempotency-Key': idempotencia.current.clavePara(payload),
         },
         body: JSON.stringify(payload),
       })
+      // 409: la solicitud original sigue en proceso, conservar la clave para reintentar
+      if (response.status !== 409) {
+        idempotencia.current.reiniciar()
+      }
 
       if (response.ok) {
         const result = await response.json()
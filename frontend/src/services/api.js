@@ -4,6 +4,9 @@ const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000/api'
 
 const api = axios.create({
   baseURL: API_URL,
+  // La API está en otro origen: sin esto el navegador no guarda ni envía la cookie
+  // lectura_primaria y después de escribir se podría leer de una réplica atrasada
+  withCredentials: true,
   headers: {
     'Content-Type': 'application/json',
   },
@@ -87,4 +90,87 @@ export const productosService = {
   getStockBajo: () => api.get('/productos-terminados/alertas/stock-bajo'),
 }
 
+// Eventos en vivo (Server-Sent Events). EventSource no permite enviar el header
+// Authorization, por eso se lee el flujo con fetch. Se guarda el último id recibido (la
+// versión) y al reconectar se pide lo perdido con ?desde=. Retorna una función para cancelar.
+export const suscribirEventos = (ruta, manejadores) => {
+  const controlador = new AbortController()
+  let ultimaVersion = null
+
+  const url = () => {
+    if (ultimaVersion === null) return `${API_URL}${ruta}`
+    const separador = ruta.includes('?') ? '&' : '?'
+    return `${API_URL}${ruta}${separador}desde=${ultimaVersion}`
+  }
+
+  const conectar = async () => {
+    while (!controlador.signal.aborted) {
+      try {
+        const { state } = JSON.parse(localStorage.getItem('auth-storage') || '{}')
+        const response = await fetch(url(), {
+          headers: { Authorization: `Bearer ${state?.token}` },
+          signal: controlador.signal,
+        })
+        if (response.status === 401) {
+          // Igual que el interceptor de axios: la sesión expiró
+          localStorage.removeItem('auth-storage')
+          window.location.href = '/login'
+          return
+        }
+        if (!response.ok) {
+          // Otros 4xx (sin permiso, ruta inválida) no se resuelven reintentando
+          if (response.status < 500) {
+            console.error(`Eventos ${ruta} rechazados: ${response.status}`)
+            return
+          }
+          throw new Error(`HTTP ${response.status}`)
+        }
+        const lector = response.body.pipeThrough(new TextDecoderStream()).getReader()
+        let pendiente = ''
+        for (;;) {
+          const { value, done } = await lector.read()
+          if (done) break
+          pendiente += value
+          const bloques = pendiente.split('\n\n')
+          pendiente = bloques.pop()
+          for (const bloque of bloques) {
+            let evento = 'message'
+            let datos = ''
+            let id = null
+            for (const linea of bloque.split('\n')) {
+              if (linea.startsWith('event:')) evento = linea.slice(6).trim()
+              else if (linea.startsWith('data:')) datos += linea.slice(5).trim()
+              else if (linea.startsWith('id:')) id = linea.slice(3).trim()
+            }
+            if (!datos) continue
+            const carga = JSON.parse(datos)
+            // La versión viene en el id del evento; el evento inicial la trae en los datos
+            if (id && /^\d+$/.test(id)) ultimaVersion = Number(id)
+            else if (Number.isInteger(carga?.version)) ultimaVersion = carga.version
+            if (manejadores[evento]) manejadores[evento](carga)
+          }
+        }
+      } catch (error) {
+        if (controlador.signal.aborted) return
+        console.error(`Error en eventos ${ruta}:`, error)
+      }
+      // Reconexión tras un corte
+      await new Promise(resolve => setTimeout(resolve, 3000))
+    }
+  }
+
+  conectar()
+  return () => controlador.abort()
+}
+
+// Dashboard
+export const dashboardService = {
+  getResumen: () => api.get('/dashboard/summary'),
+}
+
+// Búsqueda
+export const busquedaService = {
+  buscar: (q, params) => api.get('/busqueda', { params: { q, ...params } }),
+}
+
 export default api
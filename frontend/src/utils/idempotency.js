@@ -0,0 +1,32 @@
+// Claves para el encabezado Idempotency-Key de los POST que modifican stock.
+// La misma clave se reutiliza mientras se reintenta el mismo cuerpo, así un
+// reintento por red inestable no descuenta el inventario dos veces.
+
+const generarClave = () => {
+  if (window.crypto?.randomUUID) {
+    return window.crypto.randomUUID()
+  }
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`
+}
+
+export const crearControlIdempotencia = () => {
+  let ultimoCuerpo = null
+  let clave = null
+
+  return {
+    // Clave para este cuerpo: nueva si el cuerpo cambió desde el último intento
+    clavePara: (cuerpo) => {
+      const serializado = JSON.stringify(cuerpo)
+      if (serializado !== ultimoCuerpo || !clave) {
+        ultimoCuerpo = serializado
+        clave = generarClave()
+      }
+      return clave
+    },
+    // Descartar la clave cuando el servidor ya respondió
+    reiniciar: () => {
+      ultimoCuerpo = null
+      clave = null
+    },
+  }
+}
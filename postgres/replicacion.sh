@@ -0,0 +1,4 @@
+#!/bin/sh
+# Permitir conexiones de replicación desde la red de docker (solo en la primera inicialización del volumen)
+set -e
+echo "host replication all all scram-sha-256" >> "$PGDATA/pg_hba.conf"